@@ -50,9 +50,13 @@ INSTALLED_APPS = [
     'wishes',  # Your custom 'wishes' app
     'djmoney',
     'djmoney.contrib.exchange',
+    'rest_framework',
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover everything below; inactive unless
+    # WISHES_INSTRUMENTATION is set (see "Instrumentation" below).
+    'wishes.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,13 +68,22 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'mywishlist_project.urls'
 
+_TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         # DIRS is for project-wide templates (e.g., base.html if not in an app's templates)
         'DIRS': [BASE_DIR / 'mywishlist_project' / 'templates'], # Added project-level templates directory
-        'APP_DIRS': True, # Allows Django to find templates within app's 'templates' directories
+        # Templates are found in DIRS and in each app's 'templates' directory
+        # (the loaders below). In production parsed templates are kept in
+        # memory by the cached loader instead of being re-read per render.
+        'APP_DIRS': False,
         'OPTIONS': {
+            'loaders': _TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', _TEMPLATE_LOADERS)],
             'context_processors': [
                 'django.template.context_processors.debug', # Good for development
                 'django.template.context_processors.request',
@@ -89,12 +102,171 @@ WSGI_APPLICATION = 'mywishlist_project.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 # ==============================================================================
 
-DATABASES = {
+# SQLite by default. For production set DJANGO_DB_ENGINE=postgresql and the
+# DJANGO_DB_NAME / _USER / _PASSWORD / _HOST / _PORT variables.
+DB_ENGINE = os.environ.get('DJANGO_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DJANGO_DB_NAME', 'mywishlist'),
+            'USER': os.environ.get('DJANGO_DB_USER', ''),
+            'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DJANGO_DB_HOST', ''),
+            'PORT': os.environ.get('DJANGO_DB_PORT', ''),
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('DJANGO_DB_POOL', '') == '1':
+        # Django's native pool (requires psycopg 3: pip install "psycopg[binary,pool]").
+        # Pooled connections are returned after each request, so CONN_MAX_AGE must be 0.
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DJANGO_DB_POOL_MIN', 2)),
+            'max_size': int(os.environ.get('DJANGO_DB_POOL_MAX', 10)),
+            'timeout': int(os.environ.get('DJANGO_DB_POOL_TIMEOUT', 10)),
+        }
+    else:
+        # Persistent connections: each worker thread reuses its connection for
+        # up to CONN_MAX_AGE seconds and checks it is alive before reusing it.
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 60))
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Seconds a writer waits for the lock before "database is locked"
+                'timeout': int(os.environ.get('DJANGO_SQLITE_TIMEOUT', 20)),
+                # Take the write lock at BEGIN, so concurrent transactions queue
+                # up on the busy timeout instead of failing when upgrading a read lock.
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# PRAGMAs applied to every new SQLite connection (see wishes/db.py). WAL lets
+# readers run alongside the single writer; synchronous=NORMAL is safe with WAL
+# and avoids an fsync per commit.
+WISHES_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,  # ms
+    'cache_size': -20000,  # KiB (20 MB) of page cache per connection
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+# ==============================================================================
+# Caching
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# ==============================================================================
+
+# Local-memory cache works out of the box but is per-process. When running
+# several gunicorn workers, point every worker at a shared backend so page
+# invalidation reaches all of them, e.g.:
+#   DJANGO_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   DJANGO_CACHE_LOCATION=/var/tmp/mywishlist_cache
+# or django.core.cache.backends.redis.RedisCache with a redis:// location.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'mywishlist'),
     }
 }
+# The local-memory and file caches evict beyond MAX_ENTRIES (300 by default),
+# too few to hold the wish cards of one long list next to the cached pages.
+if CACHES['default']['BACKEND'].endswith(('LocMemCache', 'FileBasedCache')):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('DJANGO_CACHE_MAX_ENTRIES', 20000))}
+
+# Seconds a rendered anonymous public page (main feed, public lists and
+# details) stays cached. Entries are invalidated on every wish/tag change
+# regardless; 0 disables storing pages (ETag/Last-Modified still apply).
+WISHES_PAGE_CACHE_TIMEOUT = int(os.environ.get('WISHES_PAGE_CACHE_TIMEOUT', 600))
+
+# Seconds a rendered wish card stays cached (see wishes/templatetags/wish_cards.py).
+# Cards are keyed by the wish's updated_at, so edits never show stale cards;
+# 0 disables the card cache.
+WISHES_CARD_CACHE_TIMEOUT = int(os.environ.get('WISHES_CARD_CACHE_TIMEOUT', 24 * 3600))
+
+
+# ==============================================================================
+# Sessions and the logged-in user
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/#configuring-the-session-engine
+# ==============================================================================
+
+# cached_db reads sessions from the cache and only falls back to the
+# database on a miss (writes go to both), so a request carrying a session
+# cookie usually costs no session query. Alternatives:
+#   django.contrib.sessions.backends.db             - a SELECT per request
+#   django.contrib.sessions.backends.signed_cookies - no storage at all; the
+#     (signed, not encrypted) session lives in the cookie and can't be
+#     revoked server-side before it expires
+SESSION_ENGINE = os.environ.get('DJANGO_SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
+# Loads request.user through the cache (see wishes/auth.py).
+AUTHENTICATION_BACKENDS = ['wishes.auth.CachedModelBackend']
+
+# Seconds the logged-in user stays cached. Saving or deleting the user drops
+# the entry, but only in the cache the saving process sees: with a
+# per-process cache (local memory, the default) other workers would keep
+# accepting a deactivated user or a pre-password-change session, so the
+# user is only cached by default with a shared cache backend.
+# 0 looks the user up on every request.
+_PER_PROCESS_CACHE = CACHES['default']['BACKEND'].endswith(('LocMemCache', 'DummyCache'))
+WISHES_USER_CACHE_TIMEOUT = int(os.environ.get('WISHES_USER_CACHE_TIMEOUT', 0 if _PER_PROCESS_CACHE else 300))
+
+
+# ==============================================================================
+# Instrumentation
+# ==============================================================================
+
+# Per-request wall/DB/template time, query counts and page cache hits,
+# aggregated per URL name at /metrics/ (staff only). Off by default.
+WISHES_INSTRUMENTATION = os.environ.get('WISHES_INSTRUMENTATION', '') == '1'
+if WISHES_INSTRUMENTATION:
+    # The Django template backend, timing each render.
+    TEMPLATES[0]['BACKEND'] = 'wishes.instrumentation.InstrumentedDjangoTemplates'
+# Requests at least this slow are logged as warnings by the `wishes` logger
+WISHES_SLOW_REQUEST_MS = int(os.environ.get('WISHES_SLOW_REQUEST_MS', 500))
+# Send the numbers in a Server-Timing header (visible to every client)
+WISHES_SERVER_TIMING = os.environ.get('WISHES_SERVER_TIMING', '') == '1'
+
+
+# ==============================================================================
+# Currencies
+# ==============================================================================
+
+# Prices are also stored converted to BASE_CURRENCY (Wish.price_base) so
+# lists mixing currencies can be sorted and filtered by price. Rates come
+# from djmoney's exchange backend; the default reads a local JSON file, so
+# `python manage.py update_rates` works offline.
+BASE_CURRENCY = os.environ.get('WISHES_BASE_CURRENCY', 'USD')
+EXCHANGE_BACKEND = 'wishes.currency.FileExchangeBackend'
+WISHES_RATES_FILE = os.environ.get('WISHES_RATES_FILE', str(BASE_DIR / 'wishes' / 'rates.json'))
+WISHES_RATES_CACHE_SECONDS = 300 # How long a process keeps rates in memory
+
+
+# ==============================================================================
+# REST API
+# https://www.django-rest-framework.org/api-guide/settings/
+# ==============================================================================
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticatedOrReadOnly',
+    ],
+}
+
+# GET /api/wishes/changes/ (see wishes/changes.py)
+WISHES_CHANGES_LAG_SECONDS = int(os.environ.get('WISHES_CHANGES_LAG_SECONDS', 2)) # Changes younger than this wait for the next poll
+WISHES_TOMBSTONE_DAYS = int(os.environ.get('WISHES_TOMBSTONE_DAYS', 30)) # How long deletions are kept for the feed
 
 
 # ==============================================================================
@@ -138,13 +310,81 @@ USE_TZ = True # Enable timezone support
 # ==============================================================================
 
 STATIC_URL = 'static/'
-# STATIC_ROOT is used by collectstatic for deployment.
-# In development, Django serves static files from app directories.
-# STATIC_ROOT = BASE_DIR / 'staticfiles' # Uncomment for production deployment
+# collectstatic copies the static files here for deployment.
+# In development, runserver serves them from the app directories.
+STATIC_ROOT = Path(os.environ.get('DJANGO_STATIC_ROOT', BASE_DIR / 'staticfiles'))
 
 MEDIA_URL = '/media/' # URL path for user-uploaded media files
 MEDIA_ROOT = BASE_DIR / 'media' # Files will be stored here on the server
 
+# Outside DEBUG, collectstatic writes content-hashed file names plus .gz/.br
+# copies (see wishes/staticfiles.py), so they can be cached for a year.
+WISHES_STATIC_MANIFEST = os.environ.get('WISHES_STATIC_MANIFEST', '0' if DEBUG else '1') == '1'
+
+# Media files are stored once per distinct content, named after its hash
+# (see wishes/storage.py), and deleted once no wish uses them (wishes/blobs.py).
+# For an S3-compatible bucket (AWS S3, MinIO, ...), pip install
+# django-storages[s3] and set WISHES_MEDIA_STORAGE=wishes.s3storage.ContentAddressedS3Storage
+# along with WISHES_S3_BUCKET (and WISHES_S3_ENDPOINT_URL for non-AWS services);
+# credentials come from the usual AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY.
+WISHES_MEDIA_STORAGE = os.environ.get('WISHES_MEDIA_STORAGE', 'wishes.storage.ContentAddressedFileSystemStorage')
+_MEDIA_STORAGE_OPTIONS = {}
+if WISHES_MEDIA_STORAGE.endswith('S3Storage'):
+    _MEDIA_STORAGE_OPTIONS = {
+        'bucket_name': os.environ.get('WISHES_S3_BUCKET'),
+        'endpoint_url': os.environ.get('WISHES_S3_ENDPOINT_URL'),
+        'region_name': os.environ.get('WISHES_S3_REGION'),
+        # Page and card caches keep image URLs for hours: they must not expire,
+        # so the bucket (or WISHES_S3_CUSTOM_DOMAIN in front of it) has to be public.
+        'querystring_auth': False,
+        'custom_domain': os.environ.get('WISHES_S3_CUSTOM_DOMAIN'),
+    }
+STORAGES = {
+    'default': {
+        'BACKEND': WISHES_MEDIA_STORAGE,
+        'OPTIONS': _MEDIA_STORAGE_OPTIONS,
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'wishes.staticfiles.CompressedManifestStaticFilesStorage' if WISHES_STATIC_MANIFEST
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
+
+# Django serves /static/ (from STATIC_ROOT) and /media/ itself, with range
+# and conditional requests (see wishes/serving.py). On by default only with
+# DEBUG; set to 1 to serve them in production without nginx.
+WISHES_SERVE_FILES = os.environ.get('WISHES_SERVE_FILES', '1' if DEBUG else '0') == '1'
+WISHES_STATIC_MAX_AGE = 3600 # Browser cache lifetime of static files without a content hash
+WISHES_MEDIA_MAX_AGE = 24 * 3600 # Browser cache lifetime of uploaded images saved under their own names
+
+# Seconds an unused media file is kept after it was last written or reused,
+# so saves in flight can still reference it (`manage.py collect_blobs`).
+WISHES_BLOB_GRACE_SECONDS = int(os.environ.get('WISHES_BLOB_GRACE_SECONDS', 3600))
+
+# Uploads are streamed to a temporary file in chunks instead of being read
+# into memory when small; storages then hash and copy them chunk by chunk.
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+
+# Images given by URL are downloaded in the background by
+# `python manage.py process_image_tasks` (see wishes/tasks.py).
+WISHES_IMAGE_MAX_BYTES = 5 * 1024 * 1024 # Largest image body accepted
+WISHES_IMAGE_FETCH_TIMEOUT = 10 # Seconds per connection attempt
+WISHES_IMAGE_FETCH_ATTEMPTS = 3 # Tries before a download is marked as failed
+WISHES_IMAGE_FETCH_RETRY_DELAY = 30 # Seconds before the first retry, doubled after each failure
+
+# Downloads share keep-alive connections and a response cache (see
+# wishes/fetching.py): a URL fetched again within WISHES_FETCH_CACHE_TTL
+# seconds (unless the server's Cache-Control says otherwise) isn't requested
+# again, and later it's only downloaded again when it changed.
+WISHES_FETCH_CACHE_DIR = Path(os.environ.get('WISHES_FETCH_CACHE_DIR', BASE_DIR / 'fetch_cache'))
+WISHES_FETCH_CACHE_MAX_BYTES = int(os.environ.get('WISHES_FETCH_CACHE_MAX_BYTES', 256 * 1024 * 1024)) # 0 disables the cache
+WISHES_FETCH_CACHE_ENTRIES = 1000 # Entries indexed in memory per process
+WISHES_FETCH_CACHE_TTL = 600
+WISHES_FETCH_MAX_PER_HOST = 4 # Concurrent connections to one host
+WISHES_FETCH_MAX_CONNECTIONS = 16 # Concurrent connections overall, per process
+
 
 # ==============================================================================
 # Authentication URLs
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Wish, Tag
+from .models import Wish, Tag, ImageFetchTask, MediaBlob, WishlistStats, WishTombstone
 
 admin.site.register(Wish)
-admin.site.register(Tag)
\ No newline at end of file
+admin.site.register(Tag)
+admin.site.register(ImageFetchTask)
+admin.site.register(WishTombstone)
+admin.site.register(MediaBlob)
+admin.site.register(WishlistStats)
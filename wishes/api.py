@@ -0,0 +1,224 @@
+# wishes/api.py
+"""
+REST API for wishes and tags (mounted under /api/).
+
+List endpoints use cursor pagination and a fixed number of queries
+(wishes + one tag prefetch); `?fields=` trims the payload and skips the
+tag prefetch when tags aren't requested. `POST /api/wishes/bulk/` applies
+many creates/updates/deletes in one transaction, and
+`GET /api/wishes/changes/?since=` streams what changed since a previous
+call (see wishes/changes.py).
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotAuthenticated, ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from . import caching
+from .bulk import insert_wishes
+from .changes import MAX_PAGE_SIZE, PAGE_SIZE, UPSERT, ChangesExpired, changes_since, encode_since, parse_since
+from .models import Tag, User, Wish
+from .serializers import BulkWishSerializer, TagSerializer, WishSerializer, resolve_payload_tags
+from .tags import parse_tag_names
+
+logger = logging.getLogger('wishes')
+
+
+class WishCursorPagination(CursorPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class TagCursorPagination(CursorPagination):
+    ordering = 'name'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class IsOwnerOrReadOnly(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        return request.method in permissions.SAFE_METHODS or obj.user_id == request.user.id
+
+
+class WishViewSet(viewsets.ModelViewSet):
+    """
+    Public wishes plus the requesting user's own (private) ones.
+    Filters: ?user=<username>, ?tag=<name>, ?completed=true|false, ?mine=true
+    """
+    serializer_class = WishSerializer
+    pagination_class = WishCursorPagination
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+
+    def get_queryset(self):
+        user = self.request.user
+        visible = Q(private=False)
+        if user.is_authenticated:
+            visible |= Q(user=user)
+        qs = Wish.objects.filter(visible).select_related('user')
+
+        params = self.request.query_params
+        if self._wants('tags'):
+            qs = qs.prefetch_related('tags')
+        if params.get('mine') == 'true' and user.is_authenticated:
+            qs = qs.filter(user=user)
+        if params.get('user'):
+            qs = qs.filter(user__username=params['user'])
+        if params.get('tag'):
+            qs = qs.filter(tags__name=params['tag'])
+        if params.get('completed') in ('true', 'false'):
+            qs = qs.filter(completed=params['completed'] == 'true')
+        return qs
+
+    def _wants(self, field):
+        requested = self.request.query_params.get('fields')
+        return not requested or field in {name.strip() for name in requested.split(',')}
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk(self, request):
+        """
+        {"create": [{...}], "update": [{"id": 1, ...}], "delete": [2, 3]}
+        All-or-nothing: any invalid item rejects the whole request.
+        """
+        payload = BulkWishSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        creates, updates, deletes = (payload.validated_data[key] for key in ('create', 'update', 'delete'))
+
+        owned = (
+            Wish.objects.filter(user=request.user, pk__in=[item['id'] for item in updates])
+            .select_related('user')
+            .prefetch_related('tags')
+            .in_bulk()
+        )
+        context = self.get_serializer_context()
+        create_serializers = [WishSerializer(data=item, context=context) for item in creates]
+        update_serializers = [
+            WishSerializer(owned.get(item['id']), data=item, partial=True, context=context)
+            for item in updates
+        ]
+
+        errors = {}
+        for key, items in (('create', create_serializers), ('update', update_serializers)):
+            item_errors = {}
+            for index, serializer in enumerate(items):
+                if serializer.instance is None and key == 'update':
+                    item_errors[index] = {'id': ["Not found."]}
+                elif not serializer.is_valid():
+                    item_errors[index] = serializer.errors
+            if item_errors:
+                errors[key] = item_errors
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            context['resolved_tags'] = resolve_payload_tags(creates, updates)
+            created = self._bulk_create(create_serializers, context['resolved_tags'])
+            updated = [serializer.save() for serializer in update_serializers]
+            deleted = list(
+                Wish.objects.filter(user=request.user, pk__in=deletes).values_list('pk', flat=True)
+            )
+            if deleted:
+                Wish.objects.filter(pk__in=deleted).delete()
+
+        logger.info(
+            f"Bulk API by {request.user.username}: {len(created)} created, "
+            f"{len(updated)} updated, {len(deleted)} deleted.")
+        return Response({
+            'created': WishSerializer(created, many=True, context=context).data,
+            'updated': WishSerializer(updated, many=True, context=context).data,
+            'deleted': deleted,
+        })
+
+    @action(detail=False)
+    def changes(self, request):
+        """
+        What changed after `?since=` (the `since` of the previous response,
+        or an ISO 8601 timestamp; omit it to start from the beginning),
+        oldest first, at most `?limit=` changes:
+        {"changes": [{"op": "upsert", "id": 1, "at": ..., "wish": {...}},
+                     {"op": "delete", "id": 2, "at": ...}],
+         "since": <token for the next call>, "more": <another page is ready>}
+        Public wishes by default (?user=<username> for one user's), all of
+        your own with ?mine=true. 410 Gone means `since` is older than the
+        kept deletions and the client must fetch its list again.
+        """
+        params = request.query_params
+        mine = params.get('mine') == 'true'
+        if mine and not request.user.is_authenticated:
+            raise NotAuthenticated()
+        owner = request.user if mine else None
+        if not mine and params.get('user'):
+            owner = get_object_or_404(User, username=params['user'])
+        try:
+            position = parse_since(params.get('since'))
+            limit = max(1, min(int(params.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE))
+        except ValueError as exc:
+            raise ValidationError({'detail': str(exc)})
+
+        try:
+            page, next_position, more = changes_since(
+                position, owner, include_private=mine, limit=limit, tags=self._wants('tags'),
+            )
+        except ChangesExpired:
+            return Response(
+                {'detail': "'since' is too old; fetch the full list and start over."},
+                status=status.HTTP_410_GONE,
+            )
+
+        upserts = [change.obj for change in page if change.op == UPSERT]
+        wish_data = iter(WishSerializer(upserts, many=True, context=self.get_serializer_context()).data)
+        items = []
+        for change in page:
+            item = {'op': change.op, 'id': change.id, 'at': change.at}
+            if change.op == UPSERT:
+                item['wish'] = next(wish_data)
+            items.append(item)
+        return Response({'changes': items, 'since': encode_since(next_position), 'more': more})
+
+    def _bulk_create(self, create_serializers, resolved_tags):
+        """
+        Inserts new wishes and their tag links with one bulk INSERT each
+        (see bulk.insert_wishes); page caches are bumped once for the owner.
+        """
+        if not create_serializers:
+            return []
+        user = self.request.user
+        wishes, tag_lists, image_urls = [], [], []
+        for serializer in create_serializers:
+            data = dict(serializer.validated_data)
+            tag_lists.append([resolved_tags[name] for name in parse_tag_names(data.pop('tags_input', ''))])
+            image_urls.append(data.pop('image_url', None))
+            wishes.append(Wish(user=user, **data))
+        insert_wishes(wishes, tag_lists, image_urls)
+        caching.bump_owner(user.username)
+        return list(
+            Wish.objects.filter(pk__in=[wish.pk for wish in wishes])
+            .select_related('user')
+            .prefetch_related('tags')
+        )
+
+
+class TagViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    All tags, alphabetically. ?q=<prefix> narrows the list.
+    """
+    serializer_class = TagSerializer
+    pagination_class = TagCursorPagination
+
+    def get_queryset(self):
+        qs = Tag.objects.all()
+        prefix = self.request.query_params.get('q')
+        if prefix:
+            qs = qs.filter(name__istartswith=prefix)
+        return qs
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class WishesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wishes'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401  (connects signal handlers)
+        from .db import configure_sqlite
+
+        connection_created.connect(configure_sqlite, dispatch_uid='wishes_configure_sqlite')
@@ -0,0 +1,55 @@
+# wishes/auth.py
+"""
+Authentication backend caching the logged-in user between requests.
+
+AuthenticationMiddleware loads request.user from the database on every
+authenticated request. CachedModelBackend keeps the user in the cache for
+WISHES_USER_CACHE_TIMEOUT seconds instead; the entry is dropped whenever
+the user is saved or deleted (see signals.py), so renames, password
+changes (which end other sessions) and deactivation apply at once - in
+every worker only if they share the cache, which is why the user is not
+cached by default with the per-process local-memory cache. Changes made
+with QuerySet.update() bypass the signals and show up when the entry
+expires.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_cache_key(user_id):
+    return f'wishes:user:{user_id}'
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user()/aget_user() read through the cache.
+    """
+
+    def get_user(self, user_id):
+        timeout = settings.WISHES_USER_CACHE_TIMEOUT
+        if not timeout:
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, timeout)
+        return user
+
+    async def aget_user(self, user_id):
+        timeout = settings.WISHES_USER_CACHE_TIMEOUT
+        if not timeout:
+            return await super().aget_user(user_id)
+        key = user_cache_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(key, user, timeout)
+        return user
@@ -0,0 +1,260 @@
+# wishes/benchmarks.py
+"""
+View benchmarks driven through the Django test client.
+
+Each scenario is requested `iterations` times after a warm-up request.
+For every scenario we record latency percentiles, the number of SQL
+queries of one request and the peak Python memory allocated while
+serving it. ``manage.py run_benchmarks`` runs them against a freshly
+seeded test database and writes the results as JSON, so runs on
+different commits can be compared (``--compare old.json``).
+
+run_card_render() measures the "My Wishes" page of one large list with
+and without the wish card fragment cache.
+
+run_concurrency() fires the same anonymous pages with N requests in
+flight, once through the WSGI handler (a thread per request, as under
+gunicorn's gthread workers) and once through the ASGI handler (one event
+loop, as under uvicorn), and reports the throughput of each.
+"""
+import asyncio
+import gc
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .models import Wish
+
+
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile of `samples` (pct in 0..100).
+    """
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Scenario:
+    """
+    A named request: `prepare()` is called once and returns the
+    (method, url, data) to send on every iteration.
+    """
+
+    def __init__(self, name, prepare, login=None):
+        self.name = name
+        self.prepare = prepare
+        self.login = login
+
+
+def default_scenarios(user, wish):
+    """
+    The pages users hit most, for `user` and one of their public wishes.
+    """
+    counter = iter(range(10 ** 9))
+    return [
+        Scenario('main_feed', lambda: ('get', reverse('main_feed'), None)),
+        Scenario('main_feed_search', lambda: ('get', reverse('main_feed'), {'q': wish.title.split()[-1]})),
+        Scenario('wish_list', lambda: ('get', reverse('wish_list'), None), login=user),
+        Scenario('public_wish_list', lambda: ('get', reverse('public_wish_list', args=[user.username]), None)),
+        Scenario(
+            'public_wish_detail',
+            lambda: ('get', reverse('public_wish_detail', args=[user.username, wish.pk]), None),
+        ),
+        Scenario(
+            'add_wish',
+            lambda: ('post', reverse('add_wish'), lambda: {
+                'title': f'Benchmark wish {next(counter)}',
+                'tags_input': 'benchmark, load-test',
+            }),
+            login=user,
+        ),
+    ]
+
+
+def _send(client, method, url, data):
+    if callable(data):
+        data = data()
+    response = getattr(client, method)(url, data)
+    if response.status_code >= 400:
+        raise RuntimeError(f"{method.upper()} {url} returned {response.status_code}")
+    return response
+
+
+def run_scenario(scenario, iterations=50):
+    client = Client()
+    if scenario.login is not None:
+        client.force_login(scenario.login)
+    method, url, data = scenario.prepare()
+
+    _send(client, method, url, data)  # warm-up: template loading, first-hit caches
+
+    with CaptureQueriesContext(connection) as queries:
+        _send(client, method, url, data)
+    # Read it now: the capture is a view on the query log, which the next request resets.
+    query_count = len(queries)
+
+    gc.collect()
+    tracemalloc.start()
+    _send(client, method, url, data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        _send(client, method, url, data)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': query_count,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run(scenarios, iterations=50, only=None):
+    """
+    Runs `scenarios` (all, or those named in `only`) and returns
+    {scenario name: result}.
+    """
+    return {
+        scenario.name: run_scenario(scenario, iterations)
+        for scenario in scenarios
+        if not only or scenario.name in only
+    }
+
+
+def run_card_render(user, iterations=50):
+    """
+    Times `user`'s "My Wishes" page with the wish card cache disabled and
+    then warm (run_scenario's warm-up request fills it). Returns
+    {'uncached': result, 'cached': result, 'p50_reduction': share of the
+    uncached p50 saved}.
+    """
+    scenario = Scenario('wish_list', lambda: ('get', reverse('wish_list'), None), login=user)
+    with override_settings(WISHES_CARD_CACHE_TIMEOUT=0):
+        uncached = run_scenario(scenario, iterations)
+    with override_settings(WISHES_CARD_CACHE_TIMEOUT=3600):
+        cached = run_scenario(scenario, iterations)
+    return {
+        'uncached': uncached,
+        'cached': cached,
+        'p50_reduction': round(1 - cached['p50_ms'] / uncached['p50_ms'], 3) if uncached['p50_ms'] else None,
+    }
+
+
+def concurrency_urls(user, wish):
+    """
+    Anonymous read-only pages served by async views.
+    """
+    return {
+        'main_feed': reverse('main_feed'),
+        'public_wish_list': reverse('public_wish_list', args=[user.username]),
+        'public_wish_detail': reverse('public_wish_detail', args=[user.username, wish.pk]),
+    }
+
+
+def _throughput(timings, elapsed):
+    return {
+        'requests': len(timings),
+        'requests_per_s': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+    }
+
+
+def _wsgi_burst(url, concurrency, requests):
+    def worker(count):
+        client = Client()
+        timings = []
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                _send(client, 'get', url, None)
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            connections.close_all()  # this thread's connections
+        return timings
+
+    shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = [t for result in pool.map(worker, shares) for t in result]
+    return _throughput(timings, time.perf_counter() - start)
+
+
+async def _asgi_burst(url, concurrency, requests):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(url)
+            if response.status_code >= 400:
+                raise RuntimeError(f"GET {url} returned {response.status_code}")
+            timings.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return _throughput(timings, time.perf_counter() - start)
+
+
+def run_concurrency(urls, concurrency=10, requests=100):
+    """
+    Returns {page: {'wsgi': stats, 'asgi': stats}} for `requests` requests
+    per page with `concurrency` of them in flight.
+    """
+    results = {}
+    for name, url in urls.items():
+        _send(Client(), 'get', url, None)  # warm-up
+        results[name] = {
+            'wsgi': _wsgi_burst(url, concurrency, requests),
+            'asgi': async_to_sync(_asgi_burst)(url, concurrency, requests),
+        }
+    return results
+
+
+def pick_targets(username_prefix='seed'):
+    """
+    Picks the newest seeded public wish with an image, and its owner.
+    """
+    wish = (
+        Wish.objects.filter(user__username__startswith=f'{username_prefix}_user_', private=False, has_image=True)
+        .select_related('user')
+        .order_by('-created_at')
+        .first()
+    )
+    if wish is None:
+        raise RuntimeError("No seeded public wish with an image to benchmark against.")
+    return wish.user, wish
+
+
+def compare(current, previous):
+    """
+    Returns {scenario: {metric: relative change}} for the metrics present in both runs.
+    """
+    changes = {}
+    for name, result in current.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        changes[name] = {
+            metric: round((result[metric] - before[metric]) / before[metric], 3) if before[metric] else None
+            for metric in ('p50_ms', 'p95_ms', 'queries', 'peak_memory_kb')
+            if metric in before
+        }
+    return changes
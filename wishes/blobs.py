@@ -0,0 +1,139 @@
+# wishes/blobs.py
+"""
+Reference counting and garbage collection of content-addressed media files.
+
+With wishes.storage, wishes holding the same image share one file, so a
+file can only go once no wish uses it. Each file has a MediaBlob row
+counting the wish images and derivatives that point at it: the signal
+handlers call retain() and release() when a wish's files change or the
+wish is deleted, and bulk writers (seeding, build_image_derivatives) call
+them directly. Files left unused are deleted by collect(), right after a
+wish deletion commits and by `manage.py collect_blobs`, which also removes
+orphans: files that were stored but never recorded, e.g. by a failed save.
+
+A file is only deleted once it hasn't been written or reused (saving
+existing bytes touches the file) for WISHES_BLOB_GRACE_SECONDS, so a save
+that is about to reference it again keeps it.
+Files saved before content addressing keep their names and aren't counted.
+"""
+import logging
+import posixpath
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+
+from .models import MediaBlob
+from .storage import BLOB_DIR, is_blob
+
+logger = logging.getLogger('wishes')
+
+
+def wish_files(image_name, derivatives):
+    """
+    The content-addressed files used by a wish with the given image and derivatives.
+    """
+    names = [image_name] + [name for formats in (derivatives or {}).values() for name in formats.values()]
+    return [name for name in names if is_blob(name)]
+
+
+def _adjust(names, sign):
+    by_count = defaultdict(list)
+    for name, count in Counter(names).items():
+        by_count[count].append(name)
+    for count, group in by_count.items():
+        MediaBlob.objects.filter(name__in=group).update(references=F('references') + sign * count)
+
+
+def retain(names):
+    """
+    Adds a reference to each of `names` (once per occurrence).
+    """
+    names = [name for name in names if is_blob(name)]
+    if names:
+        MediaBlob.objects.bulk_create([MediaBlob(name=name) for name in set(names)], ignore_conflicts=True)
+        _adjust(names, +1)
+
+
+def release(names):
+    """
+    Drops a reference to each of `names` (once per occurrence). Files left
+    unused are deleted by the next collect().
+    """
+    names = [name for name in names if is_blob(name)]
+    if names:
+        _adjust(names, -1)
+
+
+def _recently_used(storage, name, cutoff):
+    try:
+        return storage.get_modified_time(name) >= cutoff
+    except (OSError, NotImplementedError):
+        return False
+
+
+def collect(names=None, grace=None, storage=default_storage):
+    """
+    Deletes the unused files (of `names` only, if given) that weren't used
+    for `grace` seconds (WISHES_BLOB_GRACE_SECONDS by default). Returns the
+    number of files deleted.
+    """
+    grace = settings.WISHES_BLOB_GRACE_SECONDS if grace is None else grace
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    unused = MediaBlob.objects.filter(references__lte=0)
+    if names is not None:
+        unused = unused.filter(name__in=names)
+    deleted = 0
+    for name in unused.values_list('name', flat=True):
+        if _recently_used(storage, name, cutoff):
+            continue
+        # The row, not the file, decides: a wish may have retained it since.
+        if MediaBlob.objects.filter(name=name, references__lte=0).delete()[0]:
+            storage.delete(name)
+            deleted += 1
+    if deleted:
+        logger.info(f"Deleted {deleted} unused media file(s).")
+    return deleted
+
+
+def _walk(storage, path):
+    try:
+        directories, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for file_name in files:
+        yield posixpath.join(path, file_name)
+    for directory in directories:
+        yield from _walk(storage, posixpath.join(path, directory))
+
+
+def collect_orphans(grace=None, storage=default_storage, batch_size=500):
+    """
+    Deletes stored files that no MediaBlob records (and left-over partial
+    writes) older than `grace` seconds. Returns the number of files deleted.
+    """
+    grace = settings.WISHES_BLOB_GRACE_SECONDS if grace is None else grace
+    cutoff = timezone.now() - timedelta(seconds=grace)
+
+    def delete_unrecorded(batch):
+        known = set(MediaBlob.objects.filter(name__in=batch).values_list('name', flat=True))
+        count = 0
+        for name in batch:
+            if name not in known and not _recently_used(storage, name, cutoff):
+                storage.delete(name)
+                count += 1
+        return count
+
+    deleted, batch = 0, []
+    for name in _walk(storage, BLOB_DIR):
+        batch.append(name)
+        if len(batch) >= batch_size:
+            deleted += delete_unrecorded(batch)
+            batch = []
+    deleted += delete_unrecorded(batch)
+    if deleted:
+        logger.info(f"Deleted {deleted} orphaned media file(s).")
+    return deleted
@@ -0,0 +1,46 @@
+# wishes/bulk.py
+"""
+Batched creation of wishes, shared by the bulk API and the importer.
+
+bulk_create() sends no signals, so the denormalized data that the signal
+handlers normally maintain (tag facets, wishlist stats, the search index)
+is updated here with one statement per batch (per owner, for the stats).
+Page caches are left to the caller, which usually bumps them once after
+all batches.
+"""
+from collections import Counter
+
+from . import facets, search, stats
+from .currency import to_base
+from .models import Wish
+from .tasks import enqueue_image_fetches
+
+
+def insert_wishes(wishes, tag_lists, image_urls, batch_size=None):
+    """
+    Inserts unsaved `wishes` with their tags (`tag_lists`, a list of Tag
+    objects per wish) and queues their `image_urls` (a URL or None per
+    wish) for download. Costs a fixed number of queries per batch,
+    whatever the number of wishes. Call it inside a transaction.
+    """
+    if not wishes:
+        return wishes
+    for wish in wishes:
+        # What Wish.save() would have filled in.
+        wish.has_image = bool(wish.image)
+        wish.price_base = to_base(wish.price)
+    Wish.objects.bulk_create(wishes, batch_size=batch_size)
+
+    through = Wish.tags.through
+    links, deltas = [], Counter()
+    for wish, tags in zip(wishes, tag_lists):
+        for tag in tags:
+            links.append(through(wish_id=wish.pk, tag_id=tag.pk))
+            for scope, owner_id in facets.scopes_for(wish):
+                deltas[scope, owner_id, tag.pk] += 1
+    through.objects.bulk_create(links, ignore_conflicts=True, batch_size=batch_size)
+    facets.adjust_many(deltas)
+    stats.adjust_many(wishes)
+    search.index_wishes([wish.pk for wish in wishes])
+    enqueue_image_fetches(zip(wishes, image_urls))
+    return wishes
@@ -0,0 +1,170 @@
+# wishes/caching.py
+"""
+Versioned response caching for the anonymous public pages.
+
+Every cached page depends on a few *version* counters stored in the cache:
+
+* ``global`` - bumped when tags change (they are shown on every page)
+* ``feed``   - bumped on any change to any wish (the main feed)
+* ``owner:<username>`` - bumped on any change to that user's wishes/profile
+
+A page's cache key embeds the current values of its versions, so bumping a
+version makes all dependent entries unreachable at once - nothing is ever
+served stale and nothing has to be deleted. Versions are bumped when the
+writing transaction commits, never before. Versions are nanosecond
+timestamps, which doubles as the page's Last-Modified date; the ETag is
+derived from the key, so conditional requests are answered with a 304
+without rendering (or even reading) the page.
+"""
+import hashlib
+import time
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import instrumentation
+
+GLOBAL = 'global'
+FEED = 'feed'
+
+
+def owner_version(username):
+    return f'owner:{username.lower()}'
+
+
+def _version_key(name):
+    return f'wishes:version:{name}'
+
+
+def bump(*names):
+    """
+    Invalidates every cached page depending on any of the given versions,
+    once the current transaction commits (at once outside one). Bumped
+    earlier, a page rendered from the old rows in the meantime would be
+    cached under the new versions.
+    """
+    def set_versions():
+        now = time.time_ns()
+        cache.set_many({_version_key(name): now for name in names}, timeout=None)
+
+    transaction.on_commit(set_versions, robust=True)
+
+
+def bump_owner(username):
+    bump(FEED, owner_version(username))
+
+
+def get_versions(names):
+    keys = {_version_key(name): name for name in names}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def _is_cacheable(request, user):
+    """
+    Only anonymous GET/HEAD requests without pending flash messages share pages.
+    """
+    return (
+        request.method in ('GET', 'HEAD')
+        and not user.is_authenticated
+        and 'messages' not in request.COOKIES
+    )
+
+
+def _page_validators(view_name, request, values):
+    """
+    Returns (cache key, ETag, Last-Modified timestamp) of the page for the given version values.
+    """
+    raw_key = ':'.join([view_name, request.get_full_path(), *map(str, values)])
+    digest = hashlib.md5(raw_key.encode(), usedforsecurity=False).hexdigest()
+    return f'wishes:page:{view_name}:{digest}', quote_etag(digest), max(values) // 1_000_000_000
+
+
+def _finish(response, etag, last_modified):
+    response.headers.setdefault('ETag', etag)
+    response.headers.setdefault('Last-Modified', http_date(last_modified))
+    # Browsers must revalidate, and shared caches must not mix
+    # anonymous and logged-in variants.
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def versioned_page(view_name, versions):
+    """
+    Decorator caching a view's anonymous responses under versioned keys.
+    `versions(request, **kwargs)` returns the version names the page depends on.
+    Works on both sync and async views.
+    """
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                if not _is_cacheable(request, await request.auser()):
+                    return await view_func(request, *args, **kwargs)
+
+                values = await sync_to_async(get_versions)([GLOBAL, *versions(request, **kwargs)])
+                key, etag, last_modified = _page_validators(view_name, request, values)
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is not None:
+                    instrumentation.note_cache(hit=True)  # answered with a 304
+                    return _finish(response, etag, last_modified)
+
+                cached = await cache.aget(key)
+                instrumentation.note_cache(hit=cached is not None)
+                if cached is not None:
+                    content, content_type = cached
+                    return _finish(HttpResponse(content, content_type=content_type), etag, last_modified)
+
+                response = await view_func(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                if settings.WISHES_PAGE_CACHE_TIMEOUT:
+                    await cache.aset(
+                        key, (response.content, response['Content-Type']), settings.WISHES_PAGE_CACHE_TIMEOUT
+                    )
+                return _finish(response, etag, last_modified)
+
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable(request, request.user):
+                return view_func(request, *args, **kwargs)
+
+            values = get_versions([GLOBAL, *versions(request, **kwargs)])
+            key, etag, last_modified = _page_validators(view_name, request, values)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                instrumentation.note_cache(hit=True)  # answered with a 304
+                return _finish(response, etag, last_modified)
+
+            cached = cache.get(key)
+            instrumentation.note_cache(hit=cached is not None)
+            if cached is not None:
+                content, content_type = cached
+                return _finish(HttpResponse(content, content_type=content_type), etag, last_modified)
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if settings.WISHES_PAGE_CACHE_TIMEOUT:
+                cache.set(key, (response.content, response['Content-Type']), settings.WISHES_PAGE_CACHE_TIMEOUT)
+            return _finish(response, etag, last_modified)
+
+        return wrapper
+
+    return decorator
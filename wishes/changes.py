@@ -0,0 +1,137 @@
+# wishes/changes.py
+"""
+Incremental change feed of wishes (GET /api/wishes/changes/?since=).
+
+A feed merges two sources ordered by (time, id): the wishes whose
+updated_at moved past the client's position, sent as upserts, and
+WishTombstone rows, sent as deletes. Every page ends with a token for its
+last change; passing it back as `since` returns only what happened after
+it, so clients and caches can stay in sync without refetching whole lists.
+Each source is one index range scan per page (see the *_changes_idx and
+tombstone_*_idx indexes).
+
+updated_at is set before the transaction commits, so a slow transaction
+can commit a change that sorts before one already served. Changes younger
+than WISHES_CHANGES_LAG_SECONDS are held back to give such transactions
+time to finish.
+"""
+import heapq
+from collections import namedtuple
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q, prefetch_related_objects
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Wish, WishTombstone
+from .pagination import decode_cursor, encode_position
+
+PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+UPSERT = 'upsert'
+DELETE = 'delete'
+
+# `obj` is the Wish for upserts and the WishTombstone for deletes.
+Change = namedtuple('Change', ['at', 'id', 'op', 'obj'])
+
+
+class ChangesExpired(Exception):
+    """
+    `since` is older than the kept tombstones; the client must resync.
+    """
+
+
+def parse_since(value):
+    """
+    Returns the (datetime, id) position of a `since` token or ISO 8601
+    timestamp, or None when `value` is empty (the feed starts from the
+    beginning). Raises ValueError when it's neither.
+    """
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        moment = None
+    if moment is not None:
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment, dt_timezone.utc)
+        return moment, 0
+    position = decode_cursor(value)
+    if position is None or timezone.is_naive(position[0]):
+        raise ValueError(f"Invalid 'since': {value!r}")
+    return position
+
+
+def encode_since(position):
+    return encode_position(*position)
+
+
+def _after(queryset, time_field, id_field, position, until):
+    queryset = queryset.filter(**{f'{time_field}__lte': until})
+    if position is not None:
+        moment, pk = position
+        queryset = queryset.filter(
+            Q(**{f'{time_field}__gt': moment}) | Q(**{time_field: moment, f'{id_field}__gt': pk})
+        )
+    return queryset.order_by(time_field, id_field)
+
+
+def changes_since(position, owner=None, include_private=False, limit=PAGE_SIZE, tags=True):
+    """
+    Returns (changes, next_position, more) for the feed after `position`:
+    at most `limit` Change tuples, the position to resume from and whether
+    more changes are ready.
+
+    With `include_private`, the feed is everything `owner` does to their
+    own wishes. Otherwise it's the public wishes (of `owner` only, if
+    given), and wishes made private are sent as deletes.
+    Raises ChangesExpired when `position` predates the kept tombstones.
+    """
+    now = timezone.now()
+    if position is not None and position[0] < now - timedelta(days=settings.WISHES_TOMBSTONE_DAYS):
+        raise ChangesExpired
+    until = now - timedelta(seconds=settings.WISHES_CHANGES_LAG_SECONDS)
+
+    if include_private:
+        wishes = Wish.objects.filter(user=owner)
+        tombstones = WishTombstone.objects.filter(user=owner, kind=WishTombstone.DELETED)
+    else:
+        wishes = Wish.objects.filter(private=False)
+        tombstones = WishTombstone.objects.filter(public=True)
+        if owner is not None:
+            wishes = wishes.filter(user=owner)
+            tombstones = tombstones.filter(user=owner)
+
+    wishes = list(_after(wishes, 'updated_at', 'id', position, until).select_related('user')[:limit + 1])
+    tombstones = list(_after(tombstones, 'deleted_at', 'wish_id', position, until)[:limit + 1])
+    merged = list(heapq.merge(
+        (Change(wish.updated_at, wish.pk, UPSERT, wish) for wish in wishes),
+        (Change(tombstone.deleted_at, tombstone.wish_id, DELETE, tombstone) for tombstone in tombstones),
+        key=lambda change: (change.at, change.id),
+    ))
+    changes = merged[:limit]
+    if tags:
+        prefetch_related_objects([change.obj for change in changes if change.op == UPSERT], 'tags')
+
+    if changes:
+        next_position = (changes[-1].at, changes[-1].id)
+    else:
+        # Nothing new: move up to `until` so the next call scans less.
+        next_position = max(position, (until, 0)) if position is not None else (until, 0)
+    return changes, next_position, len(merged) > limit
+
+
+def purge_tombstones(days=None):
+    """
+    Deletes tombstones older than `days` (WISHES_TOMBSTONE_DAYS by default)
+    and returns how many were removed. Feeds asking for changes from before
+    then get ChangesExpired.
+    """
+    if days is None:
+        days = settings.WISHES_TOMBSTONE_DAYS
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = WishTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
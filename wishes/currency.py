@@ -0,0 +1,143 @@
+# wishes/currency.py
+"""
+Prices converted to the base currency (settings.BASE_CURRENCY).
+
+Wish.price_base holds each price in the base currency, so lists that mix
+USD, EUR and RUB can be sorted and filtered by price with an index. It is
+computed on save from exchange rates kept in process memory, and refreshed
+for all wishes at once (one UPDATE per currency) when the rates change.
+
+Rates are djmoney's (djmoney.contrib.exchange). The default backend,
+FileExchangeBackend, reads them from settings.WISHES_RATES_FILE, so
+`python manage.py update_rates` needs no network and also refreshes
+price_base. After updating rates with another backend, run
+`python manage.py refresh_base_prices`.
+"""
+import json
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Round
+from django.utils import timezone
+from djmoney import settings as money_settings
+from djmoney.contrib.exchange.backends.base import BaseExchangeBackend
+from djmoney.contrib.exchange.models import Rate, get_default_backend_name
+
+from . import caching
+
+logger = logging.getLogger('wishes')
+
+CENT = Decimal('0.01')
+
+_lock = threading.Lock()
+_cache = {'rates': None, 'loaded_at': 0.0}
+
+
+def _load_rates():
+    rows = list(
+        Rate.objects.filter(backend=get_default_backend_name())
+        .values_list('currency', 'value', 'backend__base_currency')
+    )
+    if not rows:
+        return {}
+    rates = {currency: value for currency, value, _ in rows}
+    rates[rows[0][2]] = Decimal(1)
+    # The backend may quote against another base: rebase onto ours.
+    pivot = rates.get(money_settings.BASE_CURRENCY)
+    if not pivot:
+        return {}
+    return {currency: value / pivot for currency, value in rates.items()}
+
+
+def get_rates():
+    """
+    Returns {currency: units per 1 base currency}, loaded from the database
+    at most once per WISHES_RATES_CACHE_SECONDS in each process.
+    """
+    with _lock:
+        expired = time.monotonic() - _cache['loaded_at'] > settings.WISHES_RATES_CACHE_SECONDS
+        if _cache['rates'] is None or expired:
+            _cache['rates'] = _load_rates()
+            _cache['loaded_at'] = time.monotonic()
+        return _cache['rates']
+
+
+def clear_cache():
+    with _lock:
+        _cache['rates'] = None
+
+
+def to_base(price):
+    """
+    Returns the Money `price` as a Decimal amount in the base currency,
+    or None without a price or a rate for its currency.
+    """
+    if price is None:
+        return None
+    currency = str(price.currency)
+    if currency == money_settings.BASE_CURRENCY:
+        return price.amount.quantize(CENT)
+    rate = get_rates().get(currency)
+    if not rate:
+        return None
+    return (price.amount / rate).quantize(CENT)
+
+
+def refresh_base_prices():
+    """
+    Recomputes Wish.price_base from the current rates with one UPDATE per
+    currency in use, touching only the wishes whose value changes. Returns
+    the number of wishes updated.
+    """
+    from .models import Wish  # models imports this module
+
+    clear_cache()
+    rates = get_rates()
+    base = money_settings.BASE_CURRENCY
+    updated, now = 0, timezone.now()
+    with transaction.atomic():
+        currencies = (
+            Wish.objects.filter(price__isnull=False)
+            .order_by().values_list('price_currency', flat=True).distinct()
+        )
+        for currency in list(currencies):
+            wishes = Wish.objects.filter(price__isnull=False, price_currency=currency)
+            rate = Decimal(1) if currency == base else rates.get(currency)
+            if rate:
+                value = Round(F('price') / Value(rate, output_field=DecimalField()), 2)
+                # Only the prices that change: updated_at retires cached cards
+                # and puts the wish in the change feed.
+                changed = wishes.alias(new_base=value).exclude(price_base=F('new_base'))
+                updated += changed.update(price_base=value, updated_at=now)
+            else:
+                logger.warning(f"No exchange rate for {currency}: its prices can't be sorted or filtered.")
+                updated += wishes.filter(price_base__isnull=False).update(price_base=None, updated_at=now)
+    if updated:
+        caching.bump(caching.GLOBAL)
+    logger.info(f"Refreshed base-currency prices of {updated} wishes.")
+    return updated
+
+
+class FileExchangeBackend(BaseExchangeBackend):
+    """
+    Exchange rates from a local JSON file (settings.WISHES_RATES_FILE):
+    {"base": "USD", "rates": {"EUR": "0.85", ...}}
+    """
+    name = 'file'
+
+    def get_rates(self, base_currency=money_settings.BASE_CURRENCY, **kwargs):
+        with open(settings.WISHES_RATES_FILE, encoding='utf-8') as f:
+            data = json.load(f, parse_float=Decimal)
+        rates = {currency: Decimal(str(value)) for currency, value in data['rates'].items()}
+        rates[data['base']] = Decimal(1)
+        pivot = rates[base_currency]
+        return {currency: (value / pivot).quantize(Decimal('0.000001')) for currency, value in rates.items()}
+
+    def update_rates(self, base_currency=money_settings.BASE_CURRENCY, **kwargs):
+        super().update_rates(base_currency=base_currency, **kwargs)
+        refresh_base_prices()
@@ -0,0 +1,100 @@
+# wishes/export.py
+"""
+Streaming export of wishes as CSV or JSON Lines (NDJSON).
+
+Wishes are read with a chunked iterator, tags are prefetched once per
+chunk, and every row is encoded and sent as soon as it is read, so memory
+use stays flat however long the list is. Under ASGI the async iterator
+is used, so the response streams there too instead of being buffered.
+"""
+import csv
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+FIELDS = [
+    'id', 'title', 'description', 'price', 'price_currency', 'shop_link', 'image_url',
+    'tags', 'private', 'completed', 'created_at',
+]
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+CHUNK_SIZE = 500
+
+# Spreadsheet apps evaluate cells starting with these as formulas.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Echo:
+    """
+    A file-like object whose write() returns the value, so csv.writer
+    produces one encoded line per row instead of buffering.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _row(wish, request):
+    return {
+        'id': wish.pk,
+        'title': wish.title,
+        'description': wish.description or '',
+        'price': wish.price.amount if wish.price is not None else None,
+        'price_currency': str(wish.price_currency),
+        'shop_link': wish.shop_link or '',
+        'image_url': request.build_absolute_uri(wish.image.url) if wish.image else '',
+        'tags': [tag.name for tag in wish.tags.all()],
+        'private': wish.private,
+        'completed': wish.completed,
+        'created_at': wish.created_at,
+    }
+
+
+def _csv_cell(value):
+    if isinstance(value, list):
+        value = ', '.join(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _encode(fmt, writer, row):
+    if fmt == 'csv':
+        return writer.writerow([_csv_cell(row[field]) for field in FIELDS])
+    return json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def _stream(queryset, request, fmt):
+    writer = csv.writer(Echo())
+    if fmt == 'csv':
+        yield writer.writerow(FIELDS)
+    for wish in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield _encode(fmt, writer, _row(wish, request))
+
+
+async def _astream(queryset, request, fmt):
+    writer = csv.writer(Echo())
+    if fmt == 'csv':
+        yield writer.writerow(FIELDS)
+    async for wish in queryset.aiterator(chunk_size=CHUNK_SIZE):
+        yield _encode(fmt, writer, _row(wish, request))
+
+
+def export_response(request, queryset, filename, fmt='csv'):
+    """
+    Returns a StreamingHttpResponse with `queryset`'s wishes in `fmt`
+    ('csv' or 'ndjson'), offered as a download named `filename`.<ext>.
+    """
+    if fmt not in FORMATS:
+        fmt = 'csv'
+    queryset = queryset.prefetch_related('tags').order_by('-created_at', '-id')
+    stream = _astream if isinstance(request, ASGIRequest) else _stream
+    response = StreamingHttpResponse(stream(queryset, request, fmt), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
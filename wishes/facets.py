@@ -0,0 +1,126 @@
+# wishes/facets.py
+"""
+Tag facet counts per (scope, owner, tag).
+
+Each wish contributes +1 to the facet of every tag it carries, in every
+scope it is visible in:
+
+* ``feed``    - the global main feed (public, active, with an image)
+* ``public``  - its owner's public list (public, with an image)
+* ``private`` - its owner's own list (every wish)
+
+Counts are kept up to date by the signal handlers in wishes.signals and can
+be recomputed from scratch with ``manage.py rebuild_tag_facets``.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Tag, TagFacet, Wish
+
+
+def wish_scopes(private, completed, has_image, user_id):
+    """
+    Returns the set of (scope, owner_id) pairs a wish with the given
+    visibility attributes is counted in.
+    """
+    scopes = {(TagFacet.SCOPE_PRIVATE, user_id)}
+    if not private and has_image:
+        scopes.add((TagFacet.SCOPE_PUBLIC, user_id))
+        if not completed:
+            scopes.add((TagFacet.SCOPE_FEED, None))
+    return scopes
+
+
+def scopes_for(wish):
+    return wish_scopes(wish.private, wish.completed, wish.has_image, wish.user_id)
+
+
+def adjust(scopes, tag_ids, delta):
+    """
+    Adds `delta` to the facet counts of `tag_ids` in each of `scopes`,
+    creating missing rows and dropping rows that fall to zero.
+    All scopes are written together: two queries whatever their number.
+    """
+    tag_ids = list(tag_ids)
+    if not tag_ids or not scopes or not delta:
+        return
+
+    in_scopes = Q()
+    for scope, owner_id in scopes:
+        in_scopes |= Q(scope=scope, owner_id=owner_id)
+    facets = TagFacet.objects.filter(in_scopes, tag_id__in=tag_ids)
+    # No savepoint: inside a signal handler the wish's own transaction
+    # already rolls back as a whole.
+    with transaction.atomic(savepoint=False):
+        if delta > 0:
+            TagFacet.objects.bulk_create(
+                [
+                    TagFacet(scope=scope, owner_id=owner_id, tag_id=tag_id)
+                    for scope, owner_id in scopes for tag_id in tag_ids
+                ],
+                ignore_conflicts=True,
+            )
+        else:
+            # Rows that would drop to zero (or below, if drifted) are
+            # removed; the rest are decremented.
+            facets.filter(count__lte=-delta).delete()
+        facets.update(count=F('count') + delta)
+
+
+def adjust_many(deltas):
+    """
+    Applies a {(scope, owner_id, tag_id): delta} mapping, e.g. collected for a
+    bulk_create() that sent no signals, grouping rows that share an update.
+    """
+    groups = defaultdict(list)
+    for (scope, owner_id, tag_id), delta in deltas.items():
+        groups[scope, owner_id, delta].append(tag_id)
+    for (scope, owner_id, delta), tag_ids in groups.items():
+        adjust({(scope, owner_id)}, tag_ids, delta)
+
+
+def tags_for_scope(scope, owner=None, order='name'):
+    """
+    Tags present in a scope, annotated with `wish_count`.
+    `order` is either 'name' (alphabetical) or 'popular' (most used first).
+    """
+    tags = Tag.objects.filter(
+        facets__scope=scope,
+        facets__owner=owner,
+    ).annotate(wish_count=F('facets__count'))
+    if order == 'popular':
+        return tags.order_by('-wish_count', 'name')
+    return tags.order_by('name')
+
+
+def rebuild():
+    """
+    Recomputes every facet count from Wish/Wish.tags.
+    Returns the number of facet rows written.
+    """
+    through = Wish.tags.through
+    rows = []
+    scope_filters = [
+        (TagFacet.SCOPE_PRIVATE, {}, True),
+        (TagFacet.SCOPE_PUBLIC, {'wish__private': False, 'wish__has_image': True}, True),
+        (TagFacet.SCOPE_FEED, {'wish__private': False, 'wish__has_image': True, 'wish__completed': False}, False),
+    ]
+    for scope, filters, per_owner in scope_filters:
+        group_by = ['tag_id', 'wish__user_id'] if per_owner else ['tag_id']
+        counts = through.objects.filter(**filters).values(*group_by).annotate(n=Count('wish_id'))
+        rows.extend(
+            TagFacet(
+                scope=scope,
+                owner_id=row['wish__user_id'] if per_owner else None,
+                tag_id=row['tag_id'],
+                count=row['n'],
+            )
+            for row in counts.order_by()
+        )
+
+    with transaction.atomic():
+        TagFacet.objects.all().delete()
+        TagFacet.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,477 @@
+# wishes/fetching.py
+"""
+Shared HTTP client for downloading images given by URL (see wishes.tasks).
+
+- Connections are kept alive and reused per host (scheme, host, port), at
+  most WISHES_FETCH_MAX_PER_HOST at a time per host and
+  WISHES_FETCH_MAX_CONNECTIONS overall; further requests wait for a slot,
+  so one worker with many tasks can't flood a shop's server.
+- Bodies are cached on disk in WISHES_FETCH_CACHE_DIR, keyed by URL, with
+  the response's ETag/Last-Modified. An entry is reused without a request
+  while fresh (Cache-Control max-age / Expires, or WISHES_FETCH_CACHE_TTL
+  when the server doesn't say), then revalidated with If-None-Match /
+  If-Modified-Since: a 304 reuses the cached body. The most recently used
+  entries are indexed in memory (WISHES_FETCH_CACHE_ENTRIES); the disk is
+  trimmed to WISHES_FETCH_CACHE_MAX_BYTES, least recently used first.
+
+Bodies are streamed to disk in chunks with a size cap and never held in
+memory. Only the standard library is used (http.client).
+"""
+import hashlib
+import http.client
+import json
+import logging
+import os
+import ssl
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger('wishes')
+
+CHUNK_SIZE = 64 * 1024
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+# Idle connections older than this are likely closed by the server already.
+IDLE_TIMEOUT = 30
+USER_AGENT = 'mywishlist-image-fetcher'
+
+# `file` is open for reading at its start; the caller must close it.
+Fetched = namedtuple('Fetched', ['file', 'content_type', 'from_cache'])
+CacheEntry = namedtuple('CacheEntry', ['url', 'etag', 'last_modified', 'content_type', 'size', 'expires_at'])
+
+
+class TooManyRedirects(ValueError):
+    """
+    The URL redirects in a loop (or through more than MAX_REDIRECTS hops).
+    A ValueError, so image tasks treat it as permanent.
+    """
+
+
+class ProtocolError(OSError):
+    """
+    A truncated or malformed response (http.client.HTTPException, e.g.
+    IncompleteRead or BadStatusLine). An OSError: worth retrying.
+    """
+
+
+class ResponseTooLarge(Exception):
+    """
+    The body is (or is declared) larger than the caller's `max_bytes`.
+    """
+
+
+def _origin(parts):
+    scheme = parts.scheme.lower()
+    if scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError(f"Unsupported URL: {parts.geturl()!r}")
+    return scheme, parts.hostname, parts.port or (443 if scheme == 'https' else 80)
+
+
+def _freshness(headers, default_ttl):
+    """
+    Seconds a response stays fresh, or None when it must not be stored.
+    """
+    directives = {}
+    for part in headers.get('Cache-Control', '').lower().split(','):
+        name, _, value = part.strip().partition('=')
+        directives[name] = value.strip('"')
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0
+    if directives.get('max-age', '').isdigit():
+        return int(directives['max-age'])
+    if headers.get('Expires'):
+        try:
+            return max(parsedate_to_datetime(headers['Expires']).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            return 0  # an invalid Expires means "already expired"
+    return default_ttl
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections per origin, with per-origin and overall limits.
+    """
+
+    def __init__(self, max_per_host=4, max_connections=16):
+        self.max_per_host = max_per_host
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(self.max_per_host))
+        self._idle = defaultdict(list)  # origin -> [(connection, returned at)]
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+
+    @contextmanager
+    def slot(self, origin, timeout):
+        """
+        Holds one of the connections allowed for `origin` (waiting up to
+        `timeout` seconds for one).
+        """
+        with self._lock:
+            host_slots = self._host_slots[origin]
+        if not host_slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No free connection to {origin[1]} within {timeout}s")
+        try:
+            if not self._slots.acquire(timeout=timeout):
+                raise TimeoutError(f"No free connection within {timeout}s")
+            try:
+                yield
+            finally:
+                self._slots.release()
+        finally:
+            host_slots.release()
+
+    def checkout(self, origin, timeout):
+        """
+        Returns (connection, reused): an idle connection to `origin`, or a new one.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle[origin]
+            while idle:
+                connection, returned_at = idle.pop()
+                if now - returned_at < IDLE_TIMEOUT:
+                    connection.timeout = timeout
+                    if connection.sock is not None:
+                        connection.sock.settimeout(timeout)
+                    return connection, True
+                connection.close()
+        scheme, host, port = origin
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl_context), False
+        return http.client.HTTPConnection(host, port, timeout=timeout), False
+
+    def checkin(self, origin, connection):
+        with self._lock:
+            self._idle[origin].append((connection, time.monotonic()))
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for connection, _ in idle:
+                    connection.close()
+            self._idle.clear()
+
+
+class ResponseCache:
+    """
+    Response bodies on disk under `directory`, with an in-memory LRU index.
+    """
+
+    def __init__(self, directory, max_bytes, max_entries=1000):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._index = OrderedDict()  # key -> CacheEntry, least recently used first
+        self._disk_bytes = None  # counted on first store
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _paths(self, key):
+        base = self.directory / key[:2] / key
+        return base.with_suffix('.json'), base.with_suffix('.body')
+
+    def get(self, url):
+        key = self.key(url)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None:
+                self._index.move_to_end(key)
+        meta_path = self._paths(key)[0]
+        if entry is None:
+            try:
+                entry = CacheEntry(**json.loads(meta_path.read_text()))
+            except (OSError, ValueError, TypeError):
+                return None
+            if entry.url != url:
+                return None
+            self._remember(key, entry)
+        try:
+            os.utime(meta_path)  # for least-recently-used trimming
+        except OSError:
+            return None
+        return entry
+
+    def open(self, url):
+        return open(self._paths(self.key(url))[1], 'rb')
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._index[key] = entry
+            self._index.move_to_end(key)
+            while len(self._index) > self.max_entries:
+                self._index.popitem(last=False)
+
+    def temporary_file(self):
+        """
+        An open file to download a body into, on the same filesystem as the
+        cache so that store() can rename it into place.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=self.directory, prefix='.download-', delete=False)
+
+    def store(self, entry, tmp_path):
+        """
+        Moves the downloaded body at `tmp_path` into the cache for `entry.url`.
+        """
+        key = self.key(entry.url)
+        meta_path, body_path = self._paths(key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, body_path)
+        meta_tmp = meta_path.with_suffix('.json.tmp')
+        meta_tmp.write_text(json.dumps(entry._asdict()))
+        os.replace(meta_tmp, meta_path)
+        self._remember(key, entry)
+        self._add_bytes(entry.size)
+
+    def update(self, entry):
+        """
+        Saves new validators/freshness for an entry whose body didn't change.
+        """
+        key = self.key(entry.url)
+        meta_path = self._paths(key)[0]
+        meta_tmp = meta_path.with_suffix('.json.tmp')
+        meta_tmp.write_text(json.dumps(entry._asdict()))
+        os.replace(meta_tmp, meta_path)
+        self._remember(key, entry)
+
+    def _add_bytes(self, size):
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(path.stat().st_size for path in self.directory.glob('*/*.body'))
+            else:
+                self._disk_bytes += size
+            over = self._disk_bytes > self.max_bytes
+        if over:
+            self.trim()
+
+    def trim(self):
+        """
+        Deletes the least recently used entries until the bodies take at
+        most 80% of `max_bytes`.
+        """
+        entries = []
+        for meta_path in self.directory.glob('*/*.json'):
+            body_path = meta_path.with_suffix('.body')
+            try:
+                entries.append((meta_path.stat().st_mtime, meta_path, body_path, body_path.stat().st_size))
+            except OSError:
+                continue
+        total = sum(size for *_, size in entries)
+        for _, meta_path, body_path, size in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes * 0.8:
+                break
+            for path in (meta_path, body_path):
+                path.unlink(missing_ok=True)
+            with self._lock:
+                self._index.pop(meta_path.stem, None)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+
+class HTTPClient:
+    """
+    GETs URLs through a ConnectionPool and, if given, a ResponseCache.
+    """
+
+    def __init__(self, pool, cache=None, default_ttl=600):
+        self.pool = pool
+        self.cache = cache
+        self.default_ttl = default_ttl
+
+    def fetch(self, url, timeout=10, max_bytes=None, validate=None):
+        """
+        Returns a Fetched body of `url`, following redirects. `validate`, if
+        given, is called with (content type, first bytes of the body) of a
+        downloaded body and may raise to reject it; rejected bodies aren't
+        cached. Raises ResponseTooLarge, HTTPError for error statuses,
+        ValueError for unsupported or invalid URLs and redirect loops
+        (TooManyRedirects) and OSError for network failures, including
+        broken responses (ProtocolError).
+        """
+        entry = self.cache.get(url) if self.cache else None
+        if entry is not None and max_bytes and entry.size > max_bytes:
+            raise ResponseTooLarge(f"{entry.size} bytes")
+        cached = None
+        if entry is not None:
+            try:
+                # Opened now: the body stays readable if a refresh replaces it.
+                cached = self.cache.open(url)
+            except OSError:
+                entry = None
+        if entry is not None and entry.expires_at > time.time():
+            return Fetched(cached, entry.content_type, True)
+        try:
+            try:
+                return self._fetch(url, entry, cached, timeout, max_bytes, validate)
+            except http.client.InvalidURL as exc:
+                raise ValueError(f"Invalid URL {url!r}: {exc}") from exc
+            except http.client.HTTPException as exc:
+                # Not OSErrors, apart from RemoteDisconnected.
+                raise ProtocolError(f"{type(exc).__name__}: {exc}") from exc
+        except BaseException:
+            if cached is not None:
+                cached.close()
+            raise
+
+    def _fetch(self, url, entry, cached, timeout, max_bytes, validate):
+        headers = {'User-Agent': USER_AGENT, 'Accept-Encoding': 'identity'}
+        if entry is not None and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+
+        location = url
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(location)
+            origin = _origin(parts)
+            path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+            with self.pool.slot(origin, timeout):
+                connection, response = self._send(origin, path, headers, timeout)
+                if response.status == 200:
+                    if cached is not None:
+                        cached.close()
+                    return self._download(url, origin, connection, response, max_bytes, validate)
+                self._discard(origin, connection, response)
+            redirect = response.getheader('Location')
+            if response.status in REDIRECT_STATUSES and redirect:
+                location = urljoin(location, redirect)
+                continue
+            if response.status == 304 and entry is not None:
+                return self._revalidated(entry, cached, response)
+            raise HTTPError(location, response.status, response.reason, response.headers, None)
+        raise TooManyRedirects(f"More than {MAX_REDIRECTS} redirects from {url}")
+
+    def _send(self, origin, path, headers, timeout):
+        while True:
+            connection, reused = self.pool.checkout(origin, timeout)
+            try:
+                connection.request('GET', path, headers=headers)
+                return connection, connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if not reused:
+                    raise
+                # The server closed the idle connection: retry on a fresh one.
+            except BaseException:
+                connection.close()
+                raise
+
+    def _release(self, origin, connection, response):
+        if response.will_close:
+            connection.close()
+        else:
+            self.pool.checkin(origin, connection)
+
+    def _discard(self, origin, connection, response):
+        # Small error/redirect bodies are read so the connection can be reused.
+        if response.length is not None and response.length > CHUNK_SIZE:
+            connection.close()
+            return
+        try:
+            response.read()
+        except BaseException:
+            connection.close()
+            raise
+        self._release(origin, connection, response)
+
+    def _revalidated(self, entry, cached, response):
+        ttl = _freshness(response.headers, self.default_ttl)
+        entry = entry._replace(
+            etag=response.getheader('ETag') or entry.etag,
+            last_modified=response.getheader('Last-Modified') or entry.last_modified,
+            expires_at=time.time() + (ttl or 0),
+        )
+        self.cache.update(entry)
+        logger.debug(f"Revalidated cached {entry.url}.")
+        return Fetched(cached, entry.content_type, True)
+
+    def _download(self, url, origin, connection, response, max_bytes, validate):
+        declared = response.getheader('Content-Length')
+        if max_bytes and declared and declared.isdigit() and int(declared) > max_bytes:
+            connection.close()
+            raise ResponseTooLarge(f"{declared} bytes")
+        content_type = response.headers.get_content_type()
+        ttl = _freshness(response.headers, self.default_ttl) if self.cache else None
+
+        tmp = self.cache.temporary_file() if ttl is not None else tempfile.TemporaryFile()
+        try:
+            size, head = 0, b''
+            try:
+                while chunk := response.read(CHUNK_SIZE):
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise ResponseTooLarge(f"more than {max_bytes} bytes")
+                    if len(head) < 16:
+                        head += chunk[:16]
+                    tmp.write(chunk)
+            except BaseException:
+                connection.close()  # the rest of the body is still unread
+                raise
+            self._release(origin, connection, response)
+            if validate is not None:
+                validate(content_type, head)
+        except BaseException:
+            tmp.close()
+            if ttl is not None:
+                os.unlink(tmp.name)
+            raise
+
+        if ttl is None:
+            tmp.seek(0)
+            return Fetched(tmp, content_type, False)
+        tmp.close()
+        entry = CacheEntry(
+            url=url, etag=response.getheader('ETag'), last_modified=response.getheader('Last-Modified'),
+            content_type=content_type, size=size, expires_at=time.time() + ttl,
+        )
+        self.cache.store(entry, tmp.name)
+        return Fetched(self.cache.open(url), content_type, False)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The process-wide HTTPClient configured by the WISHES_FETCH_* settings.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            cache = None
+            if settings.WISHES_FETCH_CACHE_MAX_BYTES:
+                cache = ResponseCache(
+                    settings.WISHES_FETCH_CACHE_DIR, settings.WISHES_FETCH_CACHE_MAX_BYTES,
+                    settings.WISHES_FETCH_CACHE_ENTRIES,
+                )
+            pool = ConnectionPool(settings.WISHES_FETCH_MAX_PER_HOST, settings.WISHES_FETCH_MAX_CONNECTIONS)
+            _client = HTTPClient(pool, cache, settings.WISHES_FETCH_CACHE_TTL)
+        return _client
+
+
+@receiver(setting_changed)
+def reset_client(setting, **kwargs):
+    global _client
+    if setting.startswith('WISHES_FETCH_'):
+        with _client_lock:
+            if _client is not None:
+                _client.pool.close()
+            _client = None
@@ -1,13 +1,14 @@
-import os
 import re
 from urllib.parse import urlsplit
-from urllib.request import urlopen
 
 from django import forms
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.db import transaction
 
-from .models import Wish, Tag
+from .images import generate_derivatives
+from .models import Wish
+from .tags import parse_tag_names, set_wish_tags
+from .tasks import cancel_image_fetch, enqueue_image_fetch
 
 User = get_user_model()
 
@@ -58,6 +59,8 @@ class WishForm(forms.ModelForm):
         """
         Save the Wish instance, handle image source (upload or URL),
         and persist tags from the tags_input field.
+        An image URL is not fetched here: the download is queued and the
+        wish is saved immediately with a pending image.
         """
         instance = super().save(commit=False)
         image_file = self.cleaned_data.get("image_file")
@@ -65,36 +68,24 @@ class WishForm(forms.ModelForm):
 
         if image_file:
             instance.image = image_file
-        elif image_url:
-            try:
-                with urlopen(image_url, timeout=5) as resp:
-                    data = resp.read()
-                    url_path = urlsplit(image_url).path
-                    base_name = os.path.basename(url_path) or "image"
-                    if "." not in base_name:
-                        # Infer extension from content-type when URL path has no extension
-                        get_ct = getattr(resp.headers, "get_content_type", None)
-                        content_type = get_ct() if callable(get_ct) else resp.headers.get("Content-Type", "")
-                        ext_map = {
-                            "image/jpeg": ".jpg",
-                            "image/png": ".png",
-                            "image/gif": ".gif",
-                            "image/webp": ".webp",
-                        }
-                        base_name += ext_map.get(content_type, ".jpg")
-                    instance.image.save(base_name, ContentFile(data), save=False)
-            except Exception:
-                # If fetching fails, skip attaching the image; clean() already validates URL format.
-                pass
+            if instance.image_status == Wish.IMAGE_PENDING:
+                instance.image_status = ''
 
         def _save_m2m():
             # Preserve default M2M behavior (if any) and then handle tags_input
-            forms.ModelForm.save_m2m(self)
+            forms.ModelForm._save_m2m(self)
             self._save_tags(instance)
+            # Queue the download (or drop a stale one) now that the wish has a pk
+            if image_url:
+                enqueue_image_fetch(instance, image_url)
+            elif image_file:
+                cancel_image_fetch(instance)
+                generate_derivatives(instance)
 
         if commit:
-            instance.save()
-            _save_m2m()
+            with transaction.atomic():
+                instance.save()
+                _save_m2m()
         else:
             # Defer M2M/tag saving until the caller invokes form.save_m2m()
             self.save_m2m = _save_m2m
@@ -104,20 +95,22 @@ class WishForm(forms.ModelForm):
     def _save_tags(self, wish_instance):
         """
         Helper to process and save tags from the tags_input field.
-        Clears existing tags and re-attaches based on current input.
+        Only the difference to the wish's current tags is written.
+        Callers of save(commit=False) must save the wish and call
+        save_m2m() in one transaction: the tags don't bump updated_at.
         """
-        tags_data = self.cleaned_data.get('tags_input', '')
-        # Clear existing tags to prevent duplicates or orphaned tags
-        wish_instance.tags.clear()
-
-        if tags_data:
-            tag_names = [tag.strip() for tag in tags_data.split(',') if tag.strip()]
-            tags = []
-            for tag_name in tag_names:
-                tag, _ = Tag.objects.get_or_create(name=tag_name)
-                tags.append(tag)
-            if tags:
-                wish_instance.tags.add(*tags)
+        set_wish_tags(wish_instance, parse_tag_names(self.cleaned_data.get('tags_input', '')), touch=False)
+
+
+class ImportForm(forms.Form):
+    """
+    Upload of a CSV or JSON file of wishes (see wishes/importing.py).
+    """
+    file = forms.FileField(
+        label="File",
+        help_text="CSV or JSON with the columns of the export: title, description, price, "
+                  "price_currency, shop_link, image_url, tags, private, completed",
+    )
 
 
 class ProfileForm(forms.ModelForm):
@@ -0,0 +1,106 @@
+# wishes/images.py
+"""
+Resized derivatives of wish images.
+
+Cards never display the original upload: the feed shows a 64px avatar and
+list pages a ~480px wide cover. For each wish image we pre-render every size
+in DERIVATIVE_SPECS as JPEG and WebP next to the original (under
+``wish_avatars/derived/``) and record their storage names in
+``Wish.derivatives``, e.g. ``{"thumb": {"jpeg": "...", "webp": "..."}}``.
+Templates pick them up through the ``wish_picture`` tag. With the
+content-addressed media storage (wishes.storage) the names are those of
+their content instead, so wishes with the same image share derivatives.
+"""
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .storage import is_blob
+
+logger = logging.getLogger('wishes')
+
+# name -> (width, height); images are center-cropped to the exact box.
+DERIVATIVE_SPECS = {
+    'thumb': (64, 64),
+    'thumb2x': (128, 128),
+    'card': (480, 360),
+    'card2x': (960, 720),
+}
+
+FORMATS = {
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+DERIVED_DIR = 'wish_avatars/derived'
+
+
+def render_derivatives(image_name, storage=default_storage):
+    """
+    Renders every derivative of the stored image `image_name`.
+    Touches only the storage, never the database, so it can run in a worker
+    process. Returns the mapping to store in Wish.derivatives.
+    """
+    with storage.open(image_name, 'rb') as source:
+        original = Image.open(source)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ('RGB', 'L'):
+        # Flatten transparency onto white; JPEG has no alpha channel.
+        background = Image.new('RGB', original.size, 'white')
+        background.paste(original.convert('RGBA'), mask=original.convert('RGBA').getchannel('A'))
+        original = background
+    else:
+        original = original.convert('RGB')
+
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    derivatives = {}
+    for spec, size in DERIVATIVE_SPECS.items():
+        resized = ImageOps.fit(original, size, Image.Resampling.LANCZOS)
+        derivatives[spec] = {}
+        for fmt, (pil_format, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, pil_format, **options)
+            ext = 'jpg' if fmt == 'jpeg' else fmt
+            name = storage.save(f'{DERIVED_DIR}/{stem}_{spec}.{ext}', ContentFile(buffer.getvalue()))
+            derivatives[spec][fmt] = name
+    return derivatives
+
+
+def delete_derivatives(derivatives, storage=default_storage):
+    """
+    Deletes derivatives stored under their own names. Content-addressed
+    ones may be shared and are left to wishes.blobs.
+    """
+    for formats in (derivatives or {}).values():
+        for name in formats.values():
+            if not is_blob(name):
+                storage.delete(name)
+
+
+def generate_derivatives(wish):
+    """
+    (Re)builds the derivatives of `wish.image` and saves them on the wish.
+    Failures are logged and leave the wish showing its original image.
+    """
+    old = wish.derivatives
+    new = {}
+    if wish.image:
+        try:
+            new = render_derivatives(wish.image.name)
+        except (OSError, ValueError, Image.DecompressionBombError) as exc:
+            logger.warning(f"Could not build image derivatives for wish {wish.pk}: {exc}")
+    if new == old:
+        return
+    wish.derivatives = new
+    wish.save(update_fields=['derivatives'])
+    delete_derivatives(old)
+
+
+def derivative_url(wish, spec, fmt='jpeg', storage=default_storage):
+    name = (wish.derivatives or {}).get(spec, {}).get(fmt)
+    return storage.url(name) if name else None
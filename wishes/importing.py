@@ -0,0 +1,221 @@
+# wishes/importing.py
+"""
+Bulk import of wishes from CSV or JSON (an array, or one object per line).
+
+The file is parsed as a stream, one record at a time, and every record is
+validated with WishForm, so imported wishes obey exactly the rules of the
+"Add wish" page. Valid records are written in batches: each batch resolves
+its tags in bulk and inserts wishes and tag links with bulk_create() inside
+its own transaction (see bulk.insert_wishes), so the number of queries
+grows with the number of batches, not rows. Image URLs are queued for the
+background worker instead of being downloaded during the import.
+
+The columns match the export (see export.FIELDS); `id` and `created_at`
+are ignored, so an export can be imported back as new wishes.
+"""
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+
+from django.db import transaction
+
+from . import caching
+from .bulk import insert_wishes
+from .export import FORMULA_PREFIXES
+from .forms import WishForm
+from .models import Wish
+from .tags import parse_tag_names, resolve_tags
+
+logger = logging.getLogger('wishes')
+
+FORMATS = ('csv', 'json')
+EXTENSIONS = {'.csv': 'csv', '.json': 'json', '.ndjson': 'json', '.jsonl': 'json'}
+
+BATCH_SIZE = 500
+# Only the first errors are kept for the report; the rest are just counted.
+MAX_REPORTED_ERRORS = 100
+READ_SIZE = 64 * 1024
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+DEFAULT_CURRENCY = Wish._meta.get_field('price').default_currency
+
+
+class ImportFormatError(ValueError):
+    """
+    The file can't be parsed at all (as opposed to a single invalid record).
+    """
+
+
+class ImportResult:
+    """
+    Counts of valid and created wishes, plus the errors of invalid records.
+    """
+
+    def __init__(self):
+        self.valid = 0
+        self.created = 0
+        self.invalid = 0
+        self.errors = []  # (record number, {field: [messages]}), at most MAX_REPORTED_ERRORS
+
+    def add_error(self, number, errors):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((number, errors))
+
+
+def guess_format(filename):
+    """
+    'json' for .json/.ndjson/.jsonl files, 'csv' otherwise.
+    """
+    return EXTENSIONS.get(os.path.splitext(filename or '')[1].lower(), 'csv')
+
+
+def _iter_json_array(buffer, text):
+    """
+    Yields the items of a JSON array whose beginning is `buffer` (after the
+    opening bracket), reading the rest of `text` piece by piece.
+    """
+    decoder = json.JSONDecoder()
+    pos, eof = 0, False
+    while True:
+        buffer = buffer[pos:].lstrip().lstrip(',').lstrip()
+        pos = 0
+        if buffer.startswith(']'):
+            return
+        try:
+            if not buffer:
+                raise json.JSONDecodeError("Expecting value", buffer, 0)
+            item, pos = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as exc:
+            # Most likely the item continues in the next piece.
+            if eof:
+                raise ImportFormatError(f"Invalid JSON: {exc}") from exc
+            chunk = text.read(READ_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+
+
+def _iter_json_lines(head, text):
+    lines = head.splitlines(keepends=True)
+    if lines and not lines[-1].endswith('\n'):
+        lines[-1] += text.readline()
+    for line in itertools.chain(lines, text):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield exc
+
+
+def read_records(stream, fmt='csv'):
+    """
+    Yields the records of the binary file `stream` one at a time: dicts
+    for CSV, decoded values for JSON. A JSON line that can't be parsed is
+    yielded as its JSONDecodeError so it's reported like an invalid record.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            yield from csv.DictReader(text)
+            return
+        head = text.read(READ_SIZE).lstrip()
+        if head.startswith('['):
+            yield from _iter_json_array(head[1:], text)
+        else:
+            yield from _iter_json_lines(head, text)
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise ImportFormatError(f"Can't read the file: {exc}") from exc
+    finally:
+        text.detach()  # leave `stream` open for its owner
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    value = str(value).strip()
+    # Undo the export's protection against spreadsheet formulas.
+    if value.startswith("'") and value[1:2] and value[1:2] in FORMULA_PREFIXES:
+        return value[1:]
+    return value
+
+
+def _form_data(record):
+    """
+    Maps an exported/imported record onto WishForm's POST data.
+    """
+    tags = record.get('tags')
+    if isinstance(tags, list):
+        tags = ', '.join(str(tag) for tag in tags)
+    data = {
+        'title': _cell(record.get('title')),
+        'description': _cell(record.get('description')),
+        'price_0': _cell(record.get('price')),
+        'price_1': _cell(record.get('price_currency')) or DEFAULT_CURRENCY,
+        'shop_link': _cell(record.get('shop_link')),
+        'image_url': _cell(record.get('image_url')),
+        'tags_input': _cell(tags),
+    }
+    for flag in ('private', 'completed'):
+        value = record.get(flag)
+        if value is True or _cell(value).lower() in TRUE_VALUES:
+            data[flag] = 'on'
+    return data
+
+
+def _write_batch(batch):
+    with transaction.atomic():
+        resolved = resolve_tags({name for _, names, _ in batch for name in names})
+        insert_wishes(
+            [wish for wish, _, _ in batch],
+            [[resolved[name] for name in names] for _, names, _ in batch],
+            [url for _, _, url in batch],
+        )
+    return len(batch)
+
+
+def import_wishes(user, stream, fmt='csv', batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Creates wishes for `user` from the binary file `stream` in `fmt`
+    ('csv' or 'json') and returns an ImportResult. Invalid records are
+    skipped and reported by their number (the first record is 1); with
+    `dry_run` everything is validated but nothing is written.
+    Raises ImportFormatError when the file can't be parsed.
+    """
+    if fmt not in FORMATS:
+        raise ImportFormatError(f"Unknown format '{fmt}', expected one of: {', '.join(FORMATS)}.")
+    result = ImportResult()
+    batch = []
+    for number, record in enumerate(read_records(stream, fmt), start=1):
+        if isinstance(record, json.JSONDecodeError):
+            result.add_error(number, {'__all__': [f"Invalid JSON: {record}"]})
+            continue
+        if not isinstance(record, dict):
+            result.add_error(number, {'__all__': ["Expected an object."]})
+            continue
+        form = WishForm(data=_form_data(record))
+        if not form.is_valid():
+            result.add_error(number, {field: list(messages) for field, messages in form.errors.items()})
+            continue
+        data = form.cleaned_data
+        wish = Wish(
+            user=user, title=data['title'], price=data['price'], shop_link=data['shop_link'],
+            description=data['description'], private=data['private'], completed=data['completed'],
+        )
+        result.valid += 1
+        batch.append((wish, parse_tag_names(data['tags_input']), data['image_url'] or None))
+        if len(batch) >= batch_size:
+            result.created += 0 if dry_run else _write_batch(batch)
+            batch = []
+    if batch and not dry_run:
+        result.created += _write_batch(batch)
+    if result.created:
+        caching.bump_owner(user.username)
+    logger.info(
+        f"Import by {user.username}: {result.created} wishes created, {result.invalid} invalid records"
+        f"{' (dry run)' if dry_run else ''}.")
+    return result
@@ -0,0 +1,242 @@
+# wishes/instrumentation.py
+"""
+Opt-in per-request instrumentation (set WISHES_INSTRUMENTATION = True).
+
+For every request InstrumentationMiddleware records the wall time, the
+number and total time of SQL queries (through an execute wrapper added to
+each connection once instrumentation is on, idle outside instrumented
+requests), the time spent rendering templates (through the
+InstrumentedDjangoTemplates backend, which settings.py selects when
+instrumentation is on) and page cache hits/misses. The middleware runs
+natively in sync and async stacks, so async views stay async while being
+measured. Requests slower than WISHES_SLOW_REQUEST_MS are logged through
+the `wishes` logger, per-URL-name histograms are served to staff at
+/metrics/, and with WISHES_SERVER_TIMING the numbers are sent back in a
+Server-Timing header.
+
+Aggregates live in process memory: each gunicorn worker keeps its own.
+"""
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template as DjangoBackendTemplate, reraise
+
+logger = logging.getLogger('wishes')
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open.
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_current = contextvars.ContextVar('wishes_request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_ms', 'template_ms', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def note_cache(hit):
+    """
+    Counts a page cache hit or miss against the current request, if instrumented.
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+def _time_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_ms += (time.perf_counter() - start) * 1000
+
+
+def _time_queries(connection):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _time_queries(connection)
+
+
+class TimedTemplate(DjangoBackendTemplate):
+    """
+    Adds its render time to the current request's metrics. Only top-level
+    renders come through here: {% include %} uses the engine's Template,
+    so nested time isn't counted twice.
+    """
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_ms += (time.perf_counter() - start) * 1000
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, with renders timed by TimedTemplate.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class Stats:
+    """
+    Thread-safe per-URL-name aggregates for the metrics endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, name, total_ms, metrics):
+        with self._lock:
+            view = self._views.get(name)
+            if view is None:
+                view = self._views[name] = {
+                    'requests': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'db_ms': 0.0, 'template_ms': 0.0,
+                    'queries': 0, 'max_queries': 0, 'cache_hits': 0, 'cache_misses': 0,
+                    'histogram': [0] * (len(BUCKETS_MS) + 1),
+                }
+            view['requests'] += 1
+            view['total_ms'] += total_ms
+            view['max_ms'] = max(view['max_ms'], total_ms)
+            view['db_ms'] += metrics.db_ms
+            view['template_ms'] += metrics.template_ms
+            view['queries'] += metrics.queries
+            view['max_queries'] = max(view['max_queries'], metrics.queries)
+            view['cache_hits'] += metrics.cache_hits
+            view['cache_misses'] += metrics.cache_misses
+            view['histogram'][bisect_left(BUCKETS_MS, total_ms)] += 1
+
+    def snapshot(self):
+        """
+        Returns {url name: summary} with averages and a labelled histogram.
+        """
+        labels = [f'<={bound}ms' for bound in BUCKETS_MS] + [f'>{BUCKETS_MS[-1]}ms']
+        with self._lock:
+            views = {name: dict(view, histogram=list(view['histogram'])) for name, view in self._views.items()}
+        summary = {}
+        for name, view in sorted(views.items()):
+            requests = view['requests']
+            summary[name] = {
+                'requests': requests,
+                'avg_ms': round(view['total_ms'] / requests, 2),
+                'max_ms': round(view['max_ms'], 2),
+                'avg_db_ms': round(view['db_ms'] / requests, 2),
+                'avg_template_ms': round(view['template_ms'] / requests, 2),
+                'avg_queries': round(view['queries'] / requests, 2),
+                'max_queries': view['max_queries'],
+                'cache_hits': view['cache_hits'],
+                'cache_misses': view['cache_misses'],
+                'histogram': dict(zip(labels, view['histogram'])),
+            }
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+stats = Stats()
+
+
+class InstrumentationMiddleware:
+    """
+    Measures each request; removed from the stack unless WISHES_INSTRUMENTATION is on.
+    Place it first in MIDDLEWARE so the timings cover the other middleware too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'WISHES_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # Async views query through connections of their sync_to_async
+        # threads, so every connection gets the (otherwise idle) wrapper.
+        for connection in connections.all(initialized_only=True):
+            _time_queries(connection)
+        connection_created.connect(_on_connection_created, dispatch_uid='wishes.instrumentation')
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, start)
+
+
+    def _finish(self, request, response, metrics, start):
+        total_ms = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        name = (match.view_name if match else None) or '<unresolved>'
+        stats.record(name, total_ms, metrics)
+
+        if total_ms >= settings.WISHES_SLOW_REQUEST_MS:
+            logger.warning(
+                f"Slow request {request.method} {request.get_full_path()} ({name}): {total_ms:.0f} ms, "
+                f"{metrics.queries} queries in {metrics.db_ms:.0f} ms, templates {metrics.template_ms:.0f} ms.")
+
+        if getattr(settings, 'WISHES_SERVER_TIMING', False):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.db_ms:.1f};desc="{metrics.queries} queries"',
+                f'tpl;dur={metrics.template_ms:.1f};desc="templates"',
+                f'cache;desc="{metrics.cache_hits} hit, {metrics.cache_misses} miss"',
+                f'total;dur={total_ms:.1f}',
+            ])
+        return response
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wishes import stylesheet
+
+
+class Command(BaseCommand):
+    help = "Build the purged CSS bundle (wishes/static/wishes/css/app.css) from the classes used in the templates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Don't write; fail if the bundle is out of date.")
+
+    def handle(self, *args, **options):
+        try:
+            css, used = stylesheet.build()
+        except stylesheet.UnknownClassError as exc:
+            raise CommandError(f"{exc}. Use a supported utility, or add it to wishes/stylesheet.py.")
+        if options['check']:
+            current = stylesheet.OUTPUT.read_text(encoding='utf-8') if stylesheet.OUTPUT.exists() else ''
+            if current != css:
+                raise CommandError(f"{stylesheet.OUTPUT} is out of date; run `python manage.py build_css`.")
+            self.stdout.write(self.style.SUCCESS("The CSS bundle is up to date."))
+            return
+        stylesheet.OUTPUT.parent.mkdir(parents=True, exist_ok=True)
+        stylesheet.OUTPUT.write_text(css, encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {stylesheet.OUTPUT} ({len(used)} utilities, {len(css.encode()) // 1024} KB)."))
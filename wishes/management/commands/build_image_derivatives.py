@@ -0,0 +1,73 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from wishes import blobs, caching
+from wishes.images import delete_derivatives, render_derivatives
+from wishes.models import Wish
+
+
+def _render(pk, image_name):
+    # Runs in a worker process: storage and Pillow only, no database access.
+    try:
+        return pk, render_derivatives(image_name), None
+    except Exception as exc:
+        return pk, None, f"{type(exc).__name__}: {exc}"
+
+
+class Command(BaseCommand):
+    help = "Build thumbnail/WebP derivatives for wish images, in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rebuild wishes that already have derivatives.")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count).")
+        parser.add_argument('--batch', type=int, default=200, help="Wishes written back per database update.")
+
+    def handle(self, *args, **options):
+        wishes = Wish.objects.filter(has_image=True)
+        if not options['all']:
+            wishes = wishes.filter(derivatives={})
+        jobs = list(wishes.values_list('pk', 'image', 'derivatives'))
+        if not jobs:
+            self.stdout.write("Nothing to do.")
+            return
+
+        old_derivatives = {pk: derivatives for pk, _, derivatives in jobs}
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+
+        done, failed, pending = 0, 0, []
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            futures = [pool.submit(_render, pk, image) for pk, image, _ in jobs]
+            for future in as_completed(futures):
+                pk, derivatives, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f"Wish {pk}: {error}")
+                    continue
+                # A new updated_at also retires the wish's cached card, which
+                # embeds the old derivatives' URLs.
+                pending.append(Wish(pk=pk, derivatives=derivatives, updated_at=timezone.now()))
+                if len(pending) >= options['batch']:
+                    done += self._write(pending, old_derivatives)
+                    pending = []
+        done += self._write(pending, old_derivatives)
+        # bulk_update() sends no signals; make cached pages pick up the new images.
+        caching.bump(caching.GLOBAL)
+        blobs.collect()
+
+        self.stdout.write(self.style.SUCCESS(f"Built derivatives for {done} wish(es), {failed} failed."))
+
+    def _write(self, wishes, old_derivatives):
+        Wish.objects.bulk_update(wishes, ['derivatives', 'updated_at'])
+        # bulk_update() doesn't count media references either.
+        blobs.retain(name for wish in wishes for name in blobs.wish_files(None, wish.derivatives))
+        blobs.release(
+            name for wish in wishes for name in blobs.wish_files(None, old_derivatives[wish.pk])
+        )
+        for wish in wishes:
+            delete_derivatives(old_derivatives[wish.pk])
+        return len(wishes)
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from wishes import blobs
+
+
+class Command(BaseCommand):
+    help = "Delete media files no wish uses anymore, and files stored but never recorded."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=settings.WISHES_BLOB_GRACE_SECONDS,
+                            help="Keep files written or reused within this many seconds.")
+        parser.add_argument('--no-orphans', action='store_true',
+                            help="Skip listing the storage for unrecorded files.")
+
+    def handle(self, *args, **options):
+        deleted = blobs.collect(grace=options['grace'])
+        orphans = 0 if options['no_orphans'] else blobs.collect_orphans(grace=options['grace'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unused and {orphans} orphaned media files."))
@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from wishes import importing
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Import wishes for a user from a CSV or JSON file (the format of the export)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=importing.FORMATS,
+                            help="File format; guessed from the extension by default.")
+        parser.add_argument('--batch-size', type=int, default=importing.BATCH_SIZE,
+                            help="Wishes written per transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Only validate the file.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named '{options['username']}'.")
+
+        fmt = options['format'] or importing.guess_format(options['path'])
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = importing.import_wishes(
+                    user, stream, fmt=fmt, batch_size=options['batch_size'], dry_run=options['dry_run'],
+                )
+        except (OSError, importing.ImportFormatError) as exc:
+            raise CommandError(str(exc))
+
+        for number, errors in result.errors:
+            details = '; '.join(f"{field}: {' '.join(messages)}" for field, messages in errors.items())
+            self.stderr.write(f"Record {number}: {details}")
+        if result.invalid > len(result.errors):
+            self.stderr.write(f"... and {result.invalid - len(result.errors)} more invalid records.")
+        verb = "Validated" if options['dry_run'] else "Imported"
+        count = result.valid if options['dry_run'] else result.created
+        self.stdout.write(self.style.SUCCESS(f"{verb} {count} wishes, skipped {result.invalid} invalid records."))
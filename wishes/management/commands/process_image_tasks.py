@@ -0,0 +1,32 @@
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+
+from wishes import tasks
+
+
+class Command(BaseCommand):
+    help = "Download images queued by URL. Runs as a worker loop unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Process due tasks once and exit.")
+        parser.add_argument('--batch', type=int, default=10, help="Tasks claimed per iteration.")
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help="Downloads in flight at once (asyncio); 1 processes tasks one by one.")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            if options['concurrency'] > 1:
+                processed = async_to_sync(tasks.aprocess_pending)(
+                    limit=options['batch'], concurrency=options['concurrency']
+                )
+            else:
+                processed = tasks.process_pending(limit=options['batch'])
+            if processed:
+                self.stdout.write(f"Processed {processed} image task(s).")
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
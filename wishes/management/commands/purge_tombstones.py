@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from wishes import changes
+
+
+class Command(BaseCommand):
+    help = "Delete the change feed's records of deleted wishes once they are older than WISHES_TOMBSTONE_DAYS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.WISHES_TOMBSTONE_DAYS,
+                            help="Keep tombstones this many days.")
+
+    def handle(self, *args, **options):
+        deleted = changes.purge_tombstones(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstones."))
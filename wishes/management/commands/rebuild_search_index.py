@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from wishes import search
+
+
+class Command(BaseCommand):
+    help = "Recreate the full-text search index of wishes (titles, descriptions, tag names)."
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} wishes."))
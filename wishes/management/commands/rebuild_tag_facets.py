@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from wishes import facets
+
+
+class Command(BaseCommand):
+    help = "Recompute all tag facet counts (feed, per-user public, per-user private) from scratch."
+
+    def handle(self, *args, **options):
+        written = facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} tag facet rows."))
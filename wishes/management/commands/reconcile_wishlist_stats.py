@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from wishes import stats
+
+
+class Command(BaseCommand):
+    help = "Recount every user's wishes and correct the wishlist stats that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', metavar='USER_ID',
+                            help="Only reconcile this user (repeatable).")
+
+    def handle(self, *args, **options):
+        corrected = stats.reconcile(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Corrected {corrected} wishlist stats rows."))
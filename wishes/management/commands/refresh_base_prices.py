@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from wishes import currency
+
+
+class Command(BaseCommand):
+    help = "Recompute the base-currency price of every wish from the stored exchange rates."
+
+    def handle(self, *args, **options):
+        updated = currency.refresh_base_prices()
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} wishes."))
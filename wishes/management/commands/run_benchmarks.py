@@ -0,0 +1,144 @@
+import json
+import logging
+import platform
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from wishes import benchmarks, seeding
+
+User = get_user_model()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and benchmark the main views through the test client. "
+        "Prints a summary and writes the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--wishes-per-user', type=int, default=100)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--iterations', type=int, default=50, help="Timed requests per scenario.")
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help="Run only this scenario (repeatable).")
+        parser.add_argument('--concurrency', type=int, default=0,
+                            help="Also compare WSGI vs ASGI throughput with this many requests in flight.")
+        parser.add_argument('--concurrent-requests', type=int, default=200,
+                            help="Requests per page for the --concurrency comparison.")
+        parser.add_argument('--card-wishes', type=int, default=500,
+                            help="Also time a list of this many wishes with and without cached cards (0 skips).")
+        parser.add_argument('--page-cache', action='store_true',
+                            help="Keep the anonymous page cache on (measures cache hits instead of rendering).")
+        parser.add_argument('--output', help="Write the JSON results to this file (default: stdout).")
+        parser.add_argument('--compare', help="A previous JSON result to report relative changes against.")
+
+    def handle(self, *args, **options):
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    previous = json.load(f)['results']
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f"Cannot read {options['compare']}: {exc}")
+
+        # DEBUG off, as in production and in the test runner: no per-query logging overhead.
+        setup_test_environment(debug=False)
+        if options['verbosity'] < 2:
+            logging.disable(logging.INFO)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        media_root = tempfile.TemporaryDirectory()
+        page_cache = {} if options['page_cache'] else {'WISHES_PAGE_CACHE_TIMEOUT': 0}
+        try:
+            with override_settings(MEDIA_ROOT=media_root.name, **page_cache):
+                cache.clear()
+                dataset = seeding.seed(
+                    users=options['users'], wishes_per_user=options['wishes_per_user'], tags=options['tags']
+                )
+                user, wish = benchmarks.pick_targets()
+                results = benchmarks.run(
+                    benchmarks.default_scenarios(user, wish),
+                    iterations=options['iterations'],
+                    only=options['scenarios'],
+                )
+                card_render = None
+                if options['card_wishes']:
+                    seeding.seed(users=1, wishes_per_user=options['card_wishes'], tags=options['tags'],
+                                 image_files=2, prefix='cards')
+                    card_render = benchmarks.run_card_render(
+                        User.objects.get(username='cards_user_0'), iterations=options['iterations'],
+                    )
+                concurrency = None
+                if options['concurrency']:
+                    concurrency = benchmarks.run_concurrency(
+                        benchmarks.concurrency_urls(user, wish),
+                        concurrency=options['concurrency'],
+                        requests=options['concurrent_requests'],
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            logging.disable(logging.NOTSET)
+            media_root.cleanup()
+
+        report = {
+            'commit': _git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'page_cache': options['page_cache'],
+            'dataset': dataset,
+            'results': results,
+        }
+        if card_render is not None:
+            report['card_render'] = dict(card_render, wishes=options['card_wishes'])
+        if concurrency is not None:
+            report['concurrency'] = {'in_flight': options['concurrency'], 'pages': concurrency}
+        if previous is not None:
+            report['changes'] = benchmarks.compare(results, previous)
+
+        for name, result in results.items():
+            change = report.get('changes', {}).get(name, {}).get('p50_ms')
+            delta = f" ({change:+.0%})" if change is not None else ''
+            self.stderr.write(
+                f"{name:<20} p50 {result['p50_ms']:>8.2f} ms{delta:<8} p95 {result['p95_ms']:>8.2f} ms  "
+                f"{result['queries']:>3} queries  {result['peak_memory_kb']:>8.1f} KB"
+            )
+
+        if card_render is not None:
+            self.stderr.write(
+                f"{'cards x' + str(options['card_wishes']):<20} p50 uncached {card_render['uncached']['p50_ms']:.2f} ms, "
+                f"cached {card_render['cached']['p50_ms']:.2f} ms ({card_render['p50_reduction']:.0%} less)"
+            )
+
+        for name, handlers in (concurrency or {}).items():
+            self.stderr.write(
+                f"{name:<20} x{options['concurrency']} in flight: "
+                f"WSGI {handlers['wsgi']['requests_per_s']:>7.1f} req/s  "
+                f"ASGI {handlers['asgi']['requests_per_s']:>7.1f} req/s"
+            )
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from wishes import seeding
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users, tags and wishes (with images) for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--wishes-per-user', type=int, default=50)
+        parser.add_argument('--tags', type=int, default=100, help="Size of the tag pool.")
+        parser.add_argument('--tags-per-wish', type=int, default=3, help="Average tags per wish.")
+        parser.add_argument('--image-ratio', type=float, default=0.8, help="Share of wishes with an image.")
+        parser.add_argument('--private-ratio', type=float, default=0.2)
+        parser.add_argument('--completed-ratio', type=float, default=0.15)
+        parser.add_argument('--image-files', type=int, default=10,
+                            help="Distinct image files generated and shared by the seeded wishes.")
+        parser.add_argument('--no-derivatives', action='store_true', help="Don't render thumbnails for the images.")
+        parser.add_argument('--prefix', default='seed', help="Prefix of the generated usernames and tag names.")
+        parser.add_argument('--password', default='password', help="Password of every generated user.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--random-seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        created = seeding.seed(
+            users=options['users'],
+            wishes_per_user=options['wishes_per_user'],
+            tags=options['tags'],
+            tags_per_wish=options['tags_per_wish'],
+            image_ratio=options['image_ratio'],
+            private_ratio=options['private_ratio'],
+            completed_ratio=options['completed_ratio'],
+            image_files=options['image_files'],
+            derivatives=not options['no_derivatives'],
+            prefix=options['prefix'],
+            password=options['password'],
+            batch_size=options['batch_size'],
+            random_seed=options['random_seed'],
+        )
+        summary = ', '.join(f"{count} {name.replace('_', ' ')}" for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary}."))
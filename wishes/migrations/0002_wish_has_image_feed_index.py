@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_has_image(apps, schema_editor):
+    Wish = apps.get_model('wishes', 'Wish')
+    Wish.objects.exclude(
+        models.Q(image__isnull=True) | models.Q(image='')
+    ).update(has_image=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wish',
+            name='has_image',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(backfill_has_image, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='wish',
+            index=models.Index(condition=models.Q(('completed', False), ('has_image', True), ('private', False)), fields=['-created_at', '-id'], name='wish_public_feed_idx'),
+        ),
+    ]
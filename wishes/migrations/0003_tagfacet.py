@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0002_wish_has_image_feed_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('feed', 'Public feed'), ('public', 'User public list'), ('private', 'User private list')], max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tag_facets', to=settings.AUTH_USER_MODEL)),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='wishes.tag')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('owner__isnull', False)), fields=('scope', 'owner', 'tag'), name='tagfacet_unique_owner_scope'), models.UniqueConstraint(condition=models.Q(('owner__isnull', True)), fields=('scope', 'tag'), name='tagfacet_unique_global_scope')],
+            },
+        ),
+    ]
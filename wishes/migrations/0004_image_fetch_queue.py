@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0003_tagfacet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wish',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('', 'No download'), ('pending', 'Image download pending'), ('failed', 'Image download failed')], default='', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='ImageFetchTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('wish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_tasks', to='wishes.wish')),
+            ],
+            options={
+                'ordering': ['run_after', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='imagefetch_queue_idx')],
+            },
+        ),
+    ]
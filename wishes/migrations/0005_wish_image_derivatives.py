@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0004_image_fetch_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wish',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
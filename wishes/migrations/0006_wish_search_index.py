@@ -0,0 +1,73 @@
+from django.db import migrations
+
+# The index contents as of this migration, a frozen copy of
+# wishes.search.DOCUMENT_SQL: migrations must not import app code.
+INDEX_SQL = {
+    'sqlite': """
+        INSERT INTO wishes_wish_fts (rowid, title, description, tags)
+        SELECT w.id, w.title, COALESCE(w.description, ''), COALESCE(GROUP_CONCAT(t.name, ' '), '')
+        FROM {wish} w
+        LEFT JOIN {wish_tags} wt ON wt.wish_id = w.id
+        LEFT JOIN {tag} t ON t.id = wt.tag_id
+        GROUP BY w.id
+    """,
+    'postgresql': """
+        INSERT INTO wishes_wish_search (wish_id, document)
+        SELECT w.id,
+               setweight(to_tsvector('simple', w.title), 'A')
+               || setweight(to_tsvector('simple', COALESCE(STRING_AGG(t.name, ' '), '')), 'B')
+               || setweight(to_tsvector('simple', COALESCE(w.description, '')), 'C')
+        FROM {wish} w
+        LEFT JOIN {wish_tags} wt ON wt.wish_id = w.id
+        LEFT JOIN {tag} t ON t.id = wt.tag_id
+        GROUP BY w.id
+    """,
+}
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS wishes_wish_fts "
+            "USING fts5(title, description, tags, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS wishes_wish_search ("
+            "wish_id bigint PRIMARY KEY REFERENCES wishes_wish (id) ON DELETE CASCADE "
+            "DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS wishes_wish_search_document_idx "
+            "ON wishes_wish_search USING gin (document)"
+        )
+    else:
+        return
+
+    Wish = apps.get_model('wishes', 'Wish')
+    schema_editor.execute(INDEX_SQL[connection.vendor].format(
+        wish=Wish._meta.db_table,
+        wish_tags=Wish.tags.through._meta.db_table,
+        tag=apps.get_model('wishes', 'Tag')._meta.db_table,
+    ))
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS wishes_wish_fts")
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS wishes_wish_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0005_wish_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
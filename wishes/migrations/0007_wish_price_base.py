@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_base_prices(apps, schema_editor):
+    from wishes import currency
+    currency.refresh_base_prices()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0006_wish_search_index'),
+        ('exchange', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wish',
+            name='price_base',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='wish',
+            index=models.Index(condition=models.Q(('completed', False), ('has_image', True), ('private', False)), fields=['price_base', 'id'], name='wish_public_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wish',
+            index=models.Index(fields=['user', 'price_base'], name='wish_owner_price_idx'),
+        ),
+        migrations.RunPython(fill_base_prices, migrations.RunPython.noop),
+    ]
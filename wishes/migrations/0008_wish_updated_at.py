@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+def start_at_created_at(apps, schema_editor):
+    Wish = apps.get_model('wishes', 'Wish')
+    Wish.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0007_wish_price_base'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wish',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(start_at_created_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0008_wish_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WishTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wish_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('deleted', 'Deleted'), ('hidden', 'Made private')], max_length=10)),
+                ('public', models.BooleanField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='wish',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='wish_owner_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wish',
+            index=models.Index(condition=models.Q(('private', False)), fields=['updated_at', 'id'], name='wish_public_changes_idx'),
+        ),
+        migrations.AddField(
+            model_name='wishtombstone',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='wishtombstone',
+            index=models.Index(fields=['user', 'deleted_at', 'wish_id'], name='tombstone_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wishtombstone',
+            index=models.Index(condition=models.Q(('public', True)), fields=['deleted_at', 'wish_id'], name='tombstone_public_idx'),
+        ),
+    ]
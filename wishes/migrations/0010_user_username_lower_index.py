@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+# Public URLs match usernames case-insensitively (see views.public_wish_detail),
+# which the user model's own unique index can't serve.
+USERNAME_INDEX = models.Index(Lower('username'), name='user_username_lower_idx')
+
+
+def add_username_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model(settings.AUTH_USER_MODEL), USERNAME_INDEX)
+
+
+def remove_username_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model(settings.AUTH_USER_MODEL), USERNAME_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0009_wish_changes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(add_username_index, remove_username_index),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_stats(apps, schema_editor):
+    # Counted once here; afterwards the signal handlers keep them current.
+    Wish = apps.get_model('wishes', 'Wish')
+    WishlistStats = apps.get_model('wishes', 'WishlistStats')
+    on_public_list = Q(private=False, has_image=True)
+    rows = Wish.objects.values('user_id').annotate(
+        active=Count('pk', filter=Q(completed=False)),
+        completed_count=Count('pk', filter=Q(completed=True)),
+        public_active=Count('pk', filter=on_public_list & Q(completed=False)),
+        public_completed=Count('pk', filter=on_public_list & Q(completed=True)),
+    ).order_by()
+    WishlistStats.objects.bulk_create(
+        [
+            WishlistStats(
+                user_id=row['user_id'], active=row['active'], completed=row['completed_count'],
+                public_active=row['public_active'], public_completed=row['public_completed'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('wishes', '0011_media_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WishlistStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='wishlist_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('active', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('public_active', models.IntegerField(default=0)),
+                ('public_completed', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'wishlist stats',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
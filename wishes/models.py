@@ -1,9 +1,12 @@
 # wishes/models.py
 
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import User
 from djmoney.models.fields import MoneyField
 
+from .currency import to_base
+
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
 
@@ -25,16 +28,54 @@ class Wish(models.Model):
         blank=True,
     )
 
+    # `price` converted to settings.BASE_CURRENCY, for sorting and filtering
+    # lists that mix currencies (see wishes.currency)
+    price_base = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, editable=False)
+
     shop_link = models.URLField(max_length=500, blank=True, null=True)
     description = models.TextField(blank=True, null=True)
     tags = models.ManyToManyField(Tag, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set on every change of the wish or its tags, including queryset
+    # updates made by the app; keys the cached wish cards.
+    updated_at = models.DateTimeField(auto_now=True)
     private = models.BooleanField(default=False)
     completed = models.BooleanField(default=False)
+    # Denormalized `bool(image)` so the public feed predicate can be served
+    # from a partial index instead of an `image IS NULL OR image = ''` scan.
+    has_image = models.BooleanField(default=False, editable=False)
+
+    IMAGE_PENDING = 'pending'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = [
+        ('', 'No download'),
+        (IMAGE_PENDING, 'Image download pending'),
+        (IMAGE_FAILED, 'Image download failed'),
+    ]
+    # State of a background image-by-URL download (see wishes.tasks)
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, blank=True, default='')
+    # Storage names of resized JPEG/WebP copies of `image` (see wishes.images)
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.has_image = bool(self.image)
+        self.price_base = to_base(self.price)
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            update_fields = {*update_fields, 'updated_at'}
+            if 'image' in update_fields:
+                update_fields.add('has_image')
+            if {'price', 'price_currency'} & update_fields:
+                update_fields.add('price_base')
+            kwargs['update_fields'] = update_fields
+        # The signal handlers' denormalized counts (wishes.stats, tag
+        # facets) commit or roll back together with the row.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     @property
     def is_public(self) -> bool:
         return not self.private
@@ -42,3 +83,186 @@ class Wish(models.Model):
 
     class Meta:
         ordering = ['completed', '-created_at']
+        indexes = [
+            # Keyset pagination index for the public main feed: covers the
+            # feed predicate and the (created_at, id) cursor ordering.
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='wish_public_feed_idx',
+                condition=models.Q(private=False, completed=False, has_image=True),
+            ),
+            # Price-sorted / price-filtered feed and own list.
+            models.Index(
+                fields=['price_base', 'id'],
+                name='wish_public_price_idx',
+                condition=models.Q(private=False, completed=False, has_image=True),
+            ),
+            models.Index(fields=['user', 'price_base'], name='wish_owner_price_idx'),
+            # Change feed (see wishes.changes), ordered by (updated_at, id).
+            models.Index(fields=['user', 'updated_at', 'id'], name='wish_owner_changes_idx'),
+            models.Index(
+                fields=['updated_at', 'id'],
+                name='wish_public_changes_idx',
+                condition=models.Q(private=False),
+            ),
+        ]
+
+
+
+class TagFacet(models.Model):
+    """
+    Precomputed number of wishes carrying a tag within a scope,
+    so tag filter bars don't need a DISTINCT join over Wish.tags.
+    Maintained incrementally by wishes.signals; see wishes.facets.
+    """
+    SCOPE_FEED = 'feed'
+    SCOPE_PUBLIC = 'public'
+    SCOPE_PRIVATE = 'private'
+    SCOPE_CHOICES = [
+        (SCOPE_FEED, 'Public feed'),
+        (SCOPE_PUBLIC, 'User public list'),
+        (SCOPE_PRIVATE, 'User private list'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    # Empty for the global feed scope, the list owner otherwise
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='tag_facets')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='facets')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'owner', 'tag'],
+                condition=models.Q(owner__isnull=False),
+                name='tagfacet_unique_owner_scope',
+            ),
+            models.UniqueConstraint(
+                fields=['scope', 'tag'],
+                condition=models.Q(owner__isnull=True),
+                name='tagfacet_unique_global_scope',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.owner_id or '*'}:{self.tag_id}={self.count}"
+
+
+class ImageFetchTask(models.Model):
+    """
+    A queued download of a wish image from a URL, processed outside the
+    request by `manage.py process_image_tasks`.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    wish = models.ForeignKey(Wish, on_delete=models.CASCADE, related_name='image_tasks')
+    url = models.URLField(max_length=500)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='imagefetch_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.url} ({self.status})"
+
+
+class WishTombstone(models.Model):
+    """
+    Records that a wish left a change feed: it was deleted, or it was made
+    private and so disappeared from public feeds. Written by wishes.signals
+    and purged after WISHES_TOMBSTONE_DAYS (`manage.py purge_tombstones`).
+    """
+    DELETED = 'deleted'
+    HIDDEN = 'hidden'
+    KIND_CHOICES = [
+        (DELETED, 'Deleted'),
+        (HIDDEN, 'Made private'),
+    ]
+
+    wish_id = models.BigIntegerField()
+    # No database constraint: tombstones are written while a user's wishes
+    # are cascade-deleted along with the user.
+    user = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Whether the wish was in public feeds right before it went away
+    public = models.BooleanField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at', 'wish_id'], name='tombstone_owner_idx'),
+            models.Index(
+                fields=['deleted_at', 'wish_id'],
+                name='tombstone_public_idx',
+                condition=models.Q(public=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} wish {self.wish_id} at {self.deleted_at:%Y-%m-%d %H:%M:%S}"
+
+
+class MediaBlob(models.Model):
+    """
+    A content-addressed media file (see wishes.storage) and the number of
+    wish images and derivatives using it. Maintained by wishes.blobs; files
+    nothing uses are deleted on wish deletion or by `manage.py collect_blobs`.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    references = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='blob_unused_idx', condition=models.Q(references__lte=0)),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.references})"
+
+
+class WishlistStats(models.Model):
+    """
+    Number of wishes of a user, so list headers and the profile page read
+    one row instead of counting. "Public" counts the wishes shown on the
+    user's public list (public, with an image). Maintained by wishes.signals
+    with F() updates; see wishes.stats and `manage.py reconcile_wishlist_stats`.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='wishlist_stats')
+    active = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    public_active = models.IntegerField(default=0)
+    public_completed = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'wishlist stats'
+
+    def __str__(self):
+        return f"{self.user_id}: {self.active} active, {self.completed} completed"
+
+    @property
+    def total(self):
+        return self.active + self.completed
+
+    @property
+    def public_total(self):
+        return self.public_active + self.public_completed
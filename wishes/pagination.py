@@ -0,0 +1,76 @@
+# wishes/pagination.py
+"""
+Keyset (cursor) pagination helpers.
+
+Pages are addressed by the (created_at, id) of the last row already shown,
+so fetching page N costs the same index range scan as fetching page 1,
+no matter how deep the client scrolls.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_position(moment, pk):
+    """
+    Builds an opaque, URL-safe cursor from a (datetime, id) pair.
+    """
+    raw = f"{moment.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def encode_cursor(wish):
+    """
+    Builds an opaque, URL-safe cursor pointing just after `wish`.
+    """
+    return encode_position(wish.created_at, wish.pk)
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (datetime, id) pair encoded in `cursor`,
+    or None if the cursor is missing or malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def _page_queryset(queryset, cursor, page_size):
+    queryset = queryset.order_by('-created_at', '-id')
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    # Fetch one extra row to know whether another page exists.
+    return queryset[:page_size + 1]
+
+
+def _split_page(items, page_size):
+    next_cursor = encode_cursor(items[page_size - 1]) if len(items) > page_size else None
+    return items[:page_size], next_cursor
+
+
+def paginate_by_cursor(queryset, cursor=None, page_size=20):
+    """
+    Slices `queryset` newest-first starting after `cursor`.
+    Returns a tuple of (items, next_cursor); next_cursor is None on the last page.
+    """
+    return _split_page(list(_page_queryset(queryset, cursor, page_size)), page_size)
+
+
+async def apaginate_by_cursor(queryset, cursor=None, page_size=20):
+    """
+    Async version of paginate_by_cursor().
+    """
+    items = [item async for item in _page_queryset(queryset, cursor, page_size)]
+    return _split_page(items, page_size)
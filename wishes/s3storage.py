@@ -0,0 +1,34 @@
+# wishes/s3storage.py
+"""
+Content-addressed media storage in an S3-compatible bucket (AWS S3, MinIO,
+...), on top of django-storages: pip install django-storages[s3] and see
+WISHES_MEDIA_STORAGE in settings.py. Works like
+wishes.storage.ContentAddressedFileSystemStorage; uploads are streamed
+from the (temporary) file by boto3, in parts for large files.
+"""
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+from .storage import ContentAddressedMixin
+
+# An object's name is the hash of its bytes, so it never changes.
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class ContentAddressedS3Storage(ContentAddressedMixin, S3Storage):
+    """
+    Content-addressed storage in an S3 bucket.
+    """
+
+    def get_object_parameters(self, name):
+        return {'CacheControl': IMMUTABLE, **super().get_object_parameters(name)}
+
+    def touch(self, name):
+        # S3 can't change the modification time of an object in place; copying
+        # it onto itself does. The copy happens inside the bucket, and
+        # REPLACE (required for such a copy) needs the metadata again.
+        key = self._normalize_name(clean_name(name))
+        self.connection.meta.client.copy_object(
+            Bucket=self.bucket_name, Key=key, CopySource={'Bucket': self.bucket_name, 'Key': key},
+            MetadataDirective='REPLACE', **self._get_write_parameters(key),
+        )
@@ -0,0 +1,171 @@
+# wishes/search.py
+"""
+Full-text search over wish titles, descriptions and tag names.
+
+The index lives in a side table created by migration 0006:
+
+* SQLite: an FTS5 virtual table ``wishes_wish_fts`` (rowid = wish id),
+  ranked with bm25().
+* PostgreSQL: ``wishes_wish_search`` holding a weighted tsvector per wish
+  under a GIN index, ranked with ts_rank().
+
+Other databases fall back to (unindexed) icontains matching. The index is
+kept in sync by the signal handlers in wishes.signals; ``manage.py
+rebuild_search_index`` recreates it from scratch.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Wish
+
+FTS_TABLE = 'wishes_wish_fts'
+PG_TABLE = 'wishes_wish_search'
+
+# Relative weight of matches in title, description and tags
+WEIGHTS = (10.0, 2.0, 5.0)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """
+    Splits user input into plain word tokens, so no query syntax
+    (quotes, operators, column filters) ever reaches the FTS engine.
+    """
+    return TOKEN_RE.findall(query or '')[:10]
+
+
+# Rows to index, one per wish: id, title, description and space-joined tag names.
+DOCUMENT_SQL = {
+    'sqlite': """
+        SELECT w.id, w.title, COALESCE(w.description, ''), COALESCE(GROUP_CONCAT(t.name, ' '), '')
+        FROM wishes_wish w
+        LEFT JOIN wishes_wish_tags wt ON wt.wish_id = w.id
+        LEFT JOIN wishes_tag t ON t.id = wt.tag_id
+        {where}
+        GROUP BY w.id
+    """,
+    'postgresql': """
+        SELECT w.id,
+               setweight(to_tsvector('simple', w.title), 'A')
+               || setweight(to_tsvector('simple', COALESCE(STRING_AGG(t.name, ' '), '')), 'B')
+               || setweight(to_tsvector('simple', COALESCE(w.description, '')), 'C')
+        FROM wishes_wish w
+        LEFT JOIN wishes_wish_tags wt ON wt.wish_id = w.id
+        LEFT JOIN wishes_tag t ON t.id = wt.tag_id
+        {where}
+        GROUP BY w.id
+    """,
+}
+
+
+def index_wishes(wish_ids):
+    """
+    (Re)indexes the given wishes with one DELETE and one INSERT ... SELECT;
+    ids of wishes that no longer exist are simply dropped from the index.
+    """
+    wish_ids = list(wish_ids)
+    if not wish_ids or connection.vendor not in DOCUMENT_SQL:
+        return
+    placeholders = ', '.join(['%s'] * len(wish_ids))
+    select = DOCUMENT_SQL[connection.vendor].format(where=f'WHERE w.id IN ({placeholders})')
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', wish_ids)
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, title, description, tags) {select}', wish_ids)
+        else:
+            cursor.execute(f'DELETE FROM {PG_TABLE} WHERE wish_id IN ({placeholders})', wish_ids)
+            cursor.execute(f'INSERT INTO {PG_TABLE} (wish_id, document) {select}', wish_ids)
+
+
+def remove_wish(wish_id):
+    """
+    Drops a deleted wish from the index.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [wish_id])
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DELETE FROM {PG_TABLE} WHERE wish_id = %s', [wish_id])
+
+
+def rebuild_index():
+    """
+    Recreates the whole index from the wishes table in one statement.
+    Returns the number of wishes indexed.
+    """
+    if connection.vendor not in DOCUMENT_SQL:
+        return 0
+    select = DOCUMENT_SQL[connection.vendor].format(where='')
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, title, description, tags) {select}')
+        else:
+            cursor.execute(f'TRUNCATE {PG_TABLE}')
+            cursor.execute(f'INSERT INTO {PG_TABLE} (wish_id, document) {select}')
+        return cursor.rowcount
+
+
+# One ranked page of ids: the index is joined once to the ids of the
+# caller's queryset ({candidates}, selecting "pk") and ranked in the same scan.
+RANKED_IDS_SQL = {
+    'sqlite': f"""
+        SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE}
+        JOIN ({{candidates}}) AS candidates ON candidates.pk = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s
+        ORDER BY bm25({FTS_TABLE}, %s, %s, %s), {FTS_TABLE}.rowid DESC
+        LIMIT %s OFFSET %s
+    """,
+    'postgresql': f"""
+        SELECT {PG_TABLE}.wish_id FROM {PG_TABLE}
+        JOIN ({{candidates}}) AS candidates ON candidates.pk = {PG_TABLE}.wish_id,
+        to_tsquery('simple', %s) AS query
+        WHERE document @@ query
+        ORDER BY ts_rank(document, query) DESC, {PG_TABLE}.wish_id DESC
+        LIMIT %s OFFSET %s
+    """,
+}
+
+
+def _ranked_ids(tokens, queryset, limit, offset):
+    candidates, candidate_params = queryset.order_by().values('pk').query.sql_with_params()
+    sql = RANKED_IDS_SQL[connection.vendor].format(candidates=candidates)
+    if connection.vendor == 'sqlite':
+        # Every token must match, as a prefix ("lam" finds "lamp").
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        params = [*candidate_params, match, *WEIGHTS, limit, offset]
+    else:
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        params = [*candidate_params, tsquery, limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(query, queryset, limit=20, offset=0):
+    """
+    Ranks the wishes of `queryset` matching `query`, best first.
+    Returns (wishes, has_more). One query joins the FTS/GIN index to the
+    ids of `queryset` and ranks a page of them; a second loads those
+    wishes through `queryset`, so select_related and prefetch_related keep
+    working.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return [], False
+
+    if connection.vendor in RANKED_IDS_SQL:
+        ids = _ranked_ids(tokens, queryset, limit + 1, offset)
+        by_pk = {wish.pk: wish for wish in queryset.filter(pk__in=ids[:limit])} if ids else {}
+        return [by_pk[pk] for pk in ids[:limit] if pk in by_pk], len(ids) > limit
+
+    for token in tokens:
+        matching = Wish.objects.filter(
+            Q(title__icontains=token) | Q(description__icontains=token) | Q(tags__name__icontains=token)
+        )
+        queryset = queryset.filter(pk__in=matching.values('pk'))
+    wishes = list(queryset.order_by('-created_at', '-id')[offset:offset + limit + 1])
+    return wishes[:limit], len(wishes) > limit
@@ -0,0 +1,117 @@
+# wishes/seeding.py
+"""
+Synthetic data for load tests and benchmarks.
+
+Everything is inserted with bulk_create(), which sends no signals, so the
+denormalized data (tag facets, wishlist stats, search index, page cache
+versions) is rebuilt once at the end instead of per row.
+"""
+import io
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+
+from . import blobs, caching, facets, search, stats
+from .currency import to_base
+from .images import render_derivatives
+from .models import Tag, Wish
+
+User = get_user_model()
+
+SEED_IMAGE_DIR = 'wish_avatars/seed'
+
+WORDS = (
+    'lamp book mug chair camera bike guitar watch scarf kettle headphones tent '
+    'puzzle plant vinyl sneakers backpack telescope blender candle notebook pen '
+    'jacket keyboard drone lego coffee tea chess yoga'
+).split()
+ADJECTIVES = 'red vintage wooden small large electric cozy leather smart classic'.split()
+CURRENCIES = ('USD', 'EUR', 'GBP', 'RUB')
+
+
+def _seed_images(count, rng, derivatives=True):
+    """
+    Writes `count` small solid-colour images to storage. Seeded wishes share
+    them, so seeding cost doesn't grow with the number of wishes.
+    Returns a list of (image name, derivatives) pairs.
+    """
+    images = []
+    for i in range(count):
+        buffer = io.BytesIO()
+        colour = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', (640, 480), colour).save(buffer, 'JPEG', quality=85)
+        name = default_storage.save(f'{SEED_IMAGE_DIR}/seed_{i}.jpg', ContentFile(buffer.getvalue()))
+        images.append((name, render_derivatives(name) if derivatives else {}))
+    return images
+
+
+def seed(users=10, wishes_per_user=50, tags=100, tags_per_wish=3, image_ratio=0.8,
+         private_ratio=0.2, completed_ratio=0.15, image_files=10, derivatives=True,
+         prefix='seed', password='password', batch_size=1000, random_seed=0):
+    """
+    Creates `users` users with `wishes_per_user` wishes each, drawn from a
+    pool of `tags` tags. Users are named `<prefix>_user_<n>` and share
+    `password`; each wish gets 0..2*`tags_per_wish` tags (`tags_per_wish`
+    on average). Returns a dict with the number of rows created.
+    """
+    rng = random.Random(random_seed)
+    images = _seed_images(image_files, rng, derivatives) if image_ratio and image_files else []
+
+    with transaction.atomic():
+        hashed = make_password(password)  # hashing once keeps seeding fast
+        existing_users = User.objects.filter(username__startswith=f'{prefix}_user_').count()
+        new_users = User.objects.bulk_create(
+            [User(username=f'{prefix}_user_{existing_users + n}', password=hashed) for n in range(users)],
+            batch_size=batch_size,
+        )
+
+        tag_names = [f'{prefix}-{WORDS[n % len(WORDS)]}-{n}' for n in range(tags)]
+        Tag.objects.bulk_create([Tag(name=name) for name in tag_names], ignore_conflicts=True, batch_size=batch_size)
+        tag_ids = list(Tag.objects.filter(name__in=tag_names).values_list('pk', flat=True))
+
+        wishes = []
+        for user in new_users:
+            for _ in range(wishes_per_user):
+                title = f'{rng.choice(ADJECTIVES).capitalize()} {rng.choice(WORDS)}'
+                wish = Wish(
+                    user=user,
+                    title=title,
+                    description=' '.join(rng.choices(WORDS, k=rng.randint(0, 25))),
+                    price=rng.randint(5, 500) if rng.random() < 0.7 else None,
+                    price_currency=rng.choice(CURRENCIES),
+                    private=rng.random() < private_ratio,
+                    completed=rng.random() < completed_ratio,
+                )
+                if images and rng.random() < image_ratio:
+                    wish.image, wish.derivatives = rng.choice(images)
+                wish.has_image = bool(wish.image)
+                wish.price_base = to_base(wish.price)
+                wishes.append(wish)
+        Wish.objects.bulk_create(wishes, batch_size=batch_size)
+        # bulk_create() sends no signals: count the shared images' references here.
+        blobs.retain(name for wish in wishes for name in blobs.wish_files(wish.image.name, wish.derivatives))
+
+        through = Wish.tags.through
+        links = []
+        for wish in wishes:
+            for tag_id in rng.sample(tag_ids, min(rng.randint(0, tags_per_wish * 2), len(tag_ids))):
+                links.append(through(wish_id=wish.pk, tag_id=tag_id))
+        through.objects.bulk_create(links, batch_size=batch_size)
+
+        facets.rebuild()
+        stats.reconcile()
+        search.rebuild_index()
+    caching.bump(caching.GLOBAL)
+
+    return {
+        'users': len(new_users),
+        'wishes': len(wishes),
+        'tags': len(tag_ids),
+        'tag_links': len(links),
+        'image_files': len(images),
+    }
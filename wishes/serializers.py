@@ -1,46 +1,113 @@
 # wishes/serializers.py
+from django.db import transaction
 from rest_framework import serializers
-from djmoney.models.fields import MoneyField as DRFMoneyField # NEW: Import DRF MoneyField
+from djmoney.contrib.django_rest_framework import MoneyField
 from .models import Wish, Tag, User
+from .tags import parse_tag_names, resolve_tags, set_wish_tags
+from .tasks import enqueue_image_fetch
 
-class TagSerializer(serializers.ModelSerializer):
+
+class SparseFieldsetMixin:
+    """
+    Limits the serialized fields to those listed in `?fields=a,b,c` on GET requests.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request is not None else None
+        if requested and request.method == 'GET':
+            keep = {name.strip() for name in requested.split(',')}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+
+class TagSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ['id', 'name']
 
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username']
 
-class WishSerializer(serializers.ModelSerializer):
+
+class WishSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
-    tags_input = serializers.CharField(write_only=True, required=False)
-    # ИЗМЕНЕНО: Используем DRFMoneyField для поля 'price'
-    price = DRFMoneyField()
+    tags_input = serializers.CharField(write_only=True, required=False, allow_blank=True)
+    image_url = serializers.URLField(write_only=True, required=False, max_length=500)
+    price = MoneyField(max_digits=10, decimal_places=2, required=False, allow_null=True)
 
     class Meta:
         model = Wish
         fields = [
-            'id', 'user', 'title', 'image', 'price', 'shop_link',
-            'description', 'created_at', 'private', 'completed', 'tags', 'tags_input'
+            'id', 'user', 'title', 'image', 'image_url', 'image_status', 'price', 'price_currency',
+            'shop_link', 'description', 'created_at', 'updated_at', 'private', 'completed', 'tags',
+            'tags_input'
         ]
-        read_only_fields = ['created_at']
+        read_only_fields = ['created_at', 'updated_at', 'image_status']
+
+    def validate(self, attrs):
+        if attrs.get('image') and attrs.get('image_url'):
+            raise serializers.ValidationError("Choose only one option: either upload or URL.")
+        return attrs
 
     def create(self, validated_data):
         tags_input_data = validated_data.pop('tags_input', '')
-        wish = Wish.objects.create(**validated_data)
-        self._handle_tags(wish, tags_input_data)
+        image_url = validated_data.pop('image_url', None)
+        with transaction.atomic():
+            wish = Wish.objects.create(**validated_data)
+            self._handle_tags(wish, tags_input_data)
+        if image_url:
+            enqueue_image_fetch(wish, image_url)
         return wish
 
     def update(self, instance, validated_data):
         tags_input_data = validated_data.pop('tags_input', None)
+        image_url = validated_data.pop('image_url', None)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        with transaction.atomic():
+            instance.save()
+            if tags_input_data is not None:
+                self._handle_tags(instance, tags_input_data)
+        if image_url:
+            enqueue_image_fetch(instance, image_url)
+        return instance
+
+    def _handle_tags(self, wish, tags_input):
+        # Bulk requests pre-resolve every tag name once and share the result.
+        # Saved in the wish's transaction, so its save covers updated_at.
+        set_wish_tags(
+            wish, parse_tag_names(tags_input), resolved=self.context.get('resolved_tags'), touch=False,
+        )
+
+
+class BulkWishSerializer(serializers.Serializer):
+    """
+    Payload of the bulk endpoint: wishes to create, partial updates
+    (each with an `id`) and ids to delete, applied in one transaction.
+    """
+    create = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    update = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    def validate_update(self, items):
+        if any('id' not in item for item in items):
+            raise serializers.ValidationError("Every update needs an 'id'.")
+        return items
+
 
-        if tags_input_data is not None:
-            self._handle_tags(instance, tags_input_data)
-        return instance
\ No newline at end of file
+def resolve_payload_tags(*item_lists):
+    """
+    Resolves every tag named in the `tags_input` of the given items in one go.
+    """
+    names = set()
+    for items in item_lists:
+        for item in items:
+            names.update(parse_tag_names(item.get('tags_input')))
+    return resolve_tags(names)
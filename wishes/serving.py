@@ -0,0 +1,174 @@
+# wishes/serving.py
+"""
+Lightweight static and media file serving, for deployments where no
+front-end server (nginx) does it (WISHES_SERVE_FILES).
+
+Unlike django.views.static.serve, files are streamed with FileResponse
+(sendfile where the server supports it) and the views answer:
+- conditional requests: If-None-Match / If-Modified-Since get a 304;
+- byte ranges: a single `Range: bytes=...` (optionally guarded by
+  If-Range) gets a 206, so downloads resume and media can seek;
+- Accept-Encoding: the precompressed .br/.gz copies written by
+  wishes.staticfiles are sent for static files when the client takes them.
+Content-hashed static names and content-addressed media files (see
+wishes.storage) are cached by clients for a year as immutable; other files
+for WISHES_STATIC_MAX_AGE / WISHES_MEDIA_MAX_AGE seconds.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .storage import is_blob
+
+# ManifestStaticFilesStorage inserts the first 12 hex digits of the MD5.
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+BYTE_RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+CHUNK_SIZE = 64 * 1024
+
+
+def _stat(root, path):
+    try:
+        full_path = safe_join(root, path)
+        info = os.stat(full_path)
+    except (SuspiciousFileOperation, ValueError, OSError):
+        raise Http404("No such file.")
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404("No such file.")
+    return full_path, info
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.partition(';')
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def byte_range(header, size):
+    """
+    The inclusive (start, end) of a single `bytes=` range over `size` bytes;
+    None to send the whole file (multiple or malformed ranges), or False
+    when the range can't be satisfied.
+    """
+    match = BYTE_RANGE.fullmatch(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # `bytes=-N`: the last N bytes
+        if int(last) == 0 or size == 0:
+            return False
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _chunks(path, start, length):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, root, path, cache_control, precompressed=False):
+    """
+    Responds with the file at `path` under `root` (404 outside of it).
+    With `precompressed`, a .br/.gz copy next to it is sent instead to
+    clients that accept the encoding.
+    """
+    full_path, info = _stat(root, path)
+    filename = os.path.basename(full_path)
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    content_encoding = None
+    if precompressed:
+        accepted = _accepted_encodings(request)
+        for coding, suffix in ENCODINGS:
+            if coding in accepted and os.path.isfile(full_path + suffix):
+                full_path, info = full_path + suffix, os.stat(full_path + suffix)
+                content_encoding = coding
+                break
+
+    # Each variant has its own validators, as it has its own bytes.
+    etag = f'"{info.st_mtime_ns:x}-{info.st_size:x}"'
+    last_modified = int(info.st_mtime)  # HTTP dates have whole seconds
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        requested = None
+        if 'Range' in request.headers and _if_range_matches(request, etag, last_modified):
+            requested = byte_range(request.headers['Range'], info.st_size)
+        if requested is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{info.st_size}'
+        elif requested:
+            start, end = requested
+            response = StreamingHttpResponse(
+                _chunks(full_path, start, end - start + 1), status=206, content_type=content_type,
+            )
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{info.st_size}'
+        else:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type, filename=filename)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    if precompressed:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+@require_safe
+def static_file(request, path):
+    if HASHED_NAME.search(path):
+        cache_control = IMMUTABLE
+    else:
+        cache_control = f'public, max-age={settings.WISHES_STATIC_MAX_AGE}'
+    return serve_file(request, settings.STATIC_ROOT, path, cache_control, precompressed=True)
+
+
+@require_safe
+def media_file(request, path):
+    if is_blob(path):
+        cache_control = IMMUTABLE
+    else:
+        cache_control = f'public, max-age={settings.WISHES_MEDIA_MAX_AGE}'
+    return serve_file(request, settings.MEDIA_ROOT, path, cache_control)
@@ -0,0 +1,275 @@
+# wishes/signals.py
+"""
+Signal handlers keeping denormalized wish data in sync.
+Connected in WishesConfig.ready().
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import auth, blobs, caching, facets, search, stats
+from .models import Tag, Wish, WishTombstone
+
+User = get_user_model()
+
+
+@receiver(pre_save, sender=Wish)
+def remember_facet_scopes(sender, instance, raw=False, **kwargs):
+    """
+    Snapshots the scopes and counters the wish was counted in, whether it
+    was private and the media files it used, before this save.
+    """
+    instance._facet_scopes = set()
+    instance._was_private = None
+    instance._old_files = []
+    instance._old_counters = None
+    if raw or instance.pk is None:
+        return
+    # Locked until Wish.save()'s transaction commits: a concurrent save of
+    # the same wish waits here and then sees this one's result, so a change
+    # is never counted twice.
+    old = (
+        Wish.objects.select_for_update().filter(pk=instance.pk)
+        .values('private', 'completed', 'has_image', 'user_id', 'image', 'derivatives')
+        .first()
+    )
+    if old:
+        instance._old_files = blobs.wish_files(old.pop('image'), old.pop('derivatives'))
+        instance._facet_scopes = facets.wish_scopes(**old)
+        instance._was_private = old['private']
+        instance._old_counters = (
+            old['user_id'], stats.wish_counters(old['private'], old['completed'], old['has_image']),
+        )
+
+
+@receiver(post_save, sender=Wish)
+def update_counts_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Moves the wish between the WishlistStats counters and tag facet scopes
+    it is counted in.
+    """
+    if raw:
+        return
+    new_counters = stats.counters_for(instance)
+    old = getattr(instance, '_old_counters', None)
+    if created or old is None:
+        stats.adjust(instance.user_id, dict.fromkeys(new_counters, 1))
+    elif old[0] != instance.user_id:
+        # Given to another user.
+        stats.adjust(old[0], dict.fromkeys(old[1], -1))
+        stats.adjust(instance.user_id, dict.fromkeys(new_counters, 1))
+    else:
+        stats.move(instance.user_id, old[1], new_counters)
+
+    if created:
+        # A new wish has no tags yet; they arrive through m2m_changed.
+        return
+    old_scopes = getattr(instance, '_facet_scopes', set())
+    new_scopes = facets.scopes_for(instance)
+    if old_scopes == new_scopes:
+        return
+    tag_ids = list(instance.tags.values_list('pk', flat=True))
+    facets.adjust(old_scopes - new_scopes, tag_ids, -1)
+    facets.adjust(new_scopes - old_scopes, tag_ids, +1)
+
+
+@receiver(m2m_changed, sender=Wish.tags.through)
+def update_facets_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            instance._facet_cleared = list(instance.wish_set.all())
+        else:
+            instance._facet_cleared = list(instance.tags.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    delta = 1 if action == 'post_add' else -1
+    if not reverse:
+        tag_ids = pk_set if action != 'post_clear' else instance.__dict__.pop('_facet_cleared', [])
+        facets.adjust(facets.scopes_for(instance), tag_ids, delta)
+        return
+
+    # Reverse side (tag.wish_set.add/remove/clear): `instance` is the Tag.
+    if action == 'post_clear':
+        wishes = instance.__dict__.pop('_facet_cleared', [])
+    else:
+        wishes = Wish.objects.filter(pk__in=pk_set)
+    for wish in wishes:
+        facets.adjust(facets.scopes_for(wish), [instance.pk], delta)
+
+
+@receiver(pre_delete, sender=Wish)
+def remember_tags_on_delete(sender, instance, **kwargs):
+    # The through rows are cascade-deleted without m2m_changed being sent.
+    instance._facet_tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Wish)
+def update_counts_on_delete(sender, instance, **kwargs):
+    stats.adjust(instance.user_id, dict.fromkeys(stats.counters_for(instance), -1))
+    facets.adjust(facets.scopes_for(instance), getattr(instance, '_facet_tag_ids', []), -1)
+
+
+def _owner_username(wish):
+    if 'user' in wish._state.fields_cache:
+        return wish.user.username
+    return User.objects.filter(pk=wish.user_id).values_list('username', flat=True).first() or ''
+
+
+@receiver(post_save, sender=Wish)
+@receiver(post_delete, sender=Wish)
+def invalidate_pages_on_wish_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.bump_owner(_owner_username(instance))
+
+
+@receiver(m2m_changed, sender=Wish.tags.through)
+def invalidate_pages_on_tags_change(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # A tag was (un)linked from arbitrary wishes; invalidate everything.
+        caching.bump(caching.GLOBAL)
+    else:
+        caching.bump_owner(_owner_username(instance))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_pages_on_tag_change(sender, raw=False, **kwargs):
+    if not raw:
+        caching.bump(caching.GLOBAL)
+
+
+def _touches_username(update_fields):
+    # Saves such as update_last_login() can't rename the user.
+    return update_fields is None or 'username' in update_fields
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._cached_username = None
+    if not raw and instance.pk is not None and _touches_username(update_fields):
+        instance._cached_username = (
+            User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=User)
+def invalidate_pages_on_user_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not _touches_username(update_fields):
+        return
+    # Both the old and the new public URLs change meaning on a rename.
+    caching.bump_owner(instance.username)
+    old = getattr(instance, '_cached_username', None)
+    if old and old != instance.username:
+        caching.bump_owner(old)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # Any field may have changed: the password hash, is_active, the username.
+    auth.forget_user(instance.pk)
+
+
+SEARCHABLE_FIELDS = {'title', 'description'}
+
+
+@receiver(post_save, sender=Wish)
+def index_wish_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not SEARCHABLE_FIELDS & set(update_fields)):
+        return
+    search.index_wishes([instance.pk])
+
+
+@receiver(post_delete, sender=Wish)
+def remove_wish_from_index(sender, instance, **kwargs):
+    search.remove_wish(instance.pk)
+
+
+def _tags_changed(wish_ids, touch=True):
+    """
+    Reindexes the wishes whose tags changed and, if `touch`, marks them as
+    updated.
+    """
+    wish_ids = list(wish_ids)
+    search.index_wishes(wish_ids)
+    if wish_ids and touch:
+        Wish.objects.filter(pk__in=wish_ids).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Wish.tags.through)
+def index_wish_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._search_cleared = list(instance.wish_set.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        # set_wish_tags(touch=False): the wish is saved in the same
+        # transaction and that save's updated_at covers the change.
+        touch = getattr(instance, '_touch_on_tags_change', True)
+        _tags_changed([instance.pk], touch)
+        if touch:
+            instance.updated_at = timezone.now()
+    elif action == 'post_clear':
+        _tags_changed(instance.__dict__.pop('_search_cleared', []))
+    else:
+        _tags_changed(pk_set)
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_wishes_on_tag_delete(sender, instance, **kwargs):
+    instance._search_wish_ids = list(instance.wish_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def index_wishes_on_tag_change(sender, instance, created=False, raw=False, **kwargs):
+    # A renamed or deleted tag changes the indexed text of all its wishes.
+    if raw or created:
+        return
+    wish_ids = getattr(instance, '_search_wish_ids', None)
+    if wish_ids is None:
+        wish_ids = instance.wish_set.values_list('pk', flat=True)
+    _tags_changed(wish_ids)
+
+
+@receiver(post_save, sender=Wish)
+def record_hidden_wish(sender, instance, created, raw=False, **kwargs):
+    # Public change feeds must drop a wish that was just made private.
+    if not raw and not created and instance.private and getattr(instance, '_was_private', None) is False:
+        WishTombstone.objects.create(
+            wish_id=instance.pk, user_id=instance.user_id, kind=WishTombstone.HIDDEN, public=True,
+        )
+
+
+@receiver(post_delete, sender=Wish)
+def record_deleted_wish(sender, instance, **kwargs):
+    WishTombstone.objects.create(
+        wish_id=instance.pk, user_id=instance.user_id, kind=WishTombstone.DELETED, public=not instance.private,
+    )
+
+
+@receiver(post_save, sender=Wish)
+def count_media_references(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_old_files', [])
+    new = blobs.wish_files(instance.image.name, instance.derivatives)
+    if old != new:
+        blobs.retain(new)
+        blobs.release(old)
+        if old:
+            transaction.on_commit(lambda: blobs.collect(old), robust=True)
+
+
+@receiver(post_delete, sender=Wish)
+def release_media_on_delete(sender, instance, **kwargs):
+    files = blobs.wish_files(instance.image.name, instance.derivatives)
+    if files:
+        blobs.release(files)
+        transaction.on_commit(lambda: blobs.collect(files), robust=True)
@@ -0,0 +1,81 @@
+# wishes/staticfiles.py
+"""
+Static files storage for production (see STORAGES in settings.py).
+
+ManifestStaticFilesStorage gives every collected file a content-hashed
+name (app.3f2a1b9c8d7e.css) and rewrites {% static %} URLs and CSS
+references to it, so a URL always points at the same bytes and can be
+cached by browsers for a year. On top of that, collectstatic writes
+precompressed copies of each text file next to it: name.gz, and name.br
+when the optional `brotli` package is installed. nginx (gzip_static /
+brotli_static) or wishes.serving sends the smallest one a client accepts,
+without compressing on every request.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.xml', '.html', '.ico')
+# Smaller files gain too little to be worth a second variant.
+MIN_SIZE = 256
+# A variant is kept only if it's at most this share of the original.
+MAX_RATIO = 0.9
+
+
+def _gzip(content):
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def _brotli(content):
+    return brotli.compress(content, quality=11)
+
+
+def encoders():
+    """
+    (file suffix, compress function) of the available encodings, best first.
+    """
+    return ([('.br', _brotli)] if brotli is not None else []) + [('.gz', _gzip)]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also writes .br/.gz copies of text files.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        # Both names are served: the hashed one by {% static %}, the
+        # original one to pages cached before a deploy.
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                for variant in self.compress(name):
+                    yield name, variant, True
+
+    def compress(self, name):
+        """
+        Writes the compressed variants of `name` worth keeping and returns their names.
+        """
+        with self.open(name) as handle:
+            content = handle.read()
+        if len(content) < MIN_SIZE:
+            return []
+        written = []
+        for suffix, compress in encoders():
+            compressed = compress(content)
+            if len(compressed) > len(content) * MAX_RATIO:
+                continue
+            variant = name + suffix
+            if self.exists(variant):
+                self.delete(variant)
+            self._save(variant, ContentFile(compressed))
+            written.append(variant)
+        return written
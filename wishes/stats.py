@@ -0,0 +1,128 @@
+# wishes/stats.py
+"""
+Per-user wish counts (WishlistStats).
+
+Every wish counts towards `active` or `completed` of its owner and, while
+it is shown on the owner's public list (public, with an image), towards
+`public_active` or `public_completed`. The signal handlers in
+wishes.signals move a wish between counters with F() updates when it is
+saved or deleted, in the same transaction, so concurrent saves never
+overwrite each other's counts; bulk writers call adjust_many() themselves.
+
+Counts can drift when wishes change without signals (queryset update(),
+raw SQL, fixtures); `manage.py reconcile_wishlist_stats` recounts them.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Wish, WishlistStats
+
+COUNTERS = ('active', 'completed', 'public_active', 'public_completed')
+
+
+def wish_counters(private, completed, has_image):
+    """
+    Returns the set of counters a wish with the given attributes is counted in.
+    """
+    state = 'completed' if completed else 'active'
+    if not private and has_image:
+        return {state, f'public_{state}'}
+    return {state}
+
+
+def counters_for(wish):
+    return wish_counters(wish.private, wish.completed, wish.has_image)
+
+
+def adjust(user_id, deltas):
+    """
+    Adds a {counter: delta} mapping to the counts of `user_id`. The row is
+    only created when something is added: wishes removed along with their
+    owner must not bring back the owner's row.
+    """
+    deltas = {counter: delta for counter, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    rows = WishlistStats.objects.filter(user_id=user_id)
+    changes = {counter: F(counter) + delta for counter, delta in deltas.items()}
+    if not rows.update(**changes) and any(delta > 0 for delta in deltas.values()):
+        # The user's first wish. Another save may be creating the row too.
+        WishlistStats.objects.bulk_create([WishlistStats(user_id=user_id)], ignore_conflicts=True)
+        rows.update(**changes)
+
+
+def move(user_id, old_counters, new_counters):
+    """
+    Moves a wish of `user_id` from `old_counters` to `new_counters`.
+    """
+    deltas = Counter(dict.fromkeys(new_counters - old_counters, 1))
+    deltas.subtract(dict.fromkeys(old_counters - new_counters, 1))
+    adjust(user_id, deltas)
+
+
+def adjust_many(wishes, sign=1):
+    """
+    Counts (or, with sign=-1, uncounts) `wishes`, e.g. created with
+    bulk_create(), which sends no signals. One update per owner.
+    """
+    by_user = defaultdict(Counter)
+    for wish in wishes:
+        for counter in counters_for(wish):
+            by_user[wish.user_id][counter] += sign
+    for user_id, deltas in by_user.items():
+        adjust(user_id, deltas)
+
+
+def for_user(user):
+    """
+    The WishlistStats of `user`, or an unsaved all-zero one if the user
+    never had a wish. Uses the row cached by
+    select_related('wishlist_stats'), if any.
+    """
+    try:
+        return user.wishlist_stats
+    except WishlistStats.DoesNotExist:
+        return WishlistStats(user=user)
+
+
+def _counts(user_ids=None):
+    wishes = Wish.objects.all()
+    if user_ids is not None:
+        wishes = wishes.filter(user_id__in=user_ids)
+    on_public_list = Q(private=False, has_image=True)
+    rows = wishes.values('user_id').annotate(
+        n_active=Count('pk', filter=Q(completed=False)),
+        n_completed=Count('pk', filter=Q(completed=True)),
+        n_public_active=Count('pk', filter=on_public_list & Q(completed=False)),
+        n_public_completed=Count('pk', filter=on_public_list & Q(completed=True)),
+    ).order_by()
+    return {row['user_id']: tuple(row[f'n_{counter}'] for counter in COUNTERS) for row in rows}
+
+
+def reconcile(user_ids=None):
+    """
+    Recounts the wishes of `user_ids` (everyone by default) and corrects
+    the rows that drifted. Returns the number of rows corrected.
+    """
+    with transaction.atomic():
+        counts = _counts(user_ids)
+        stored = WishlistStats.objects.select_for_update()
+        if user_ids is not None:
+            stored = stored.filter(user_id__in=user_ids)
+        stored = {row.user_id: row for row in stored}
+
+        fixed, missing = [], []
+        for user_id in counts.keys() | stored.keys():
+            expected = counts.get(user_id, (0,) * len(COUNTERS))
+            row = stored.get(user_id)
+            if row is None:
+                missing.append(WishlistStats(user_id=user_id, **dict(zip(COUNTERS, expected))))
+            elif tuple(getattr(row, counter) for counter in COUNTERS) != expected:
+                for counter, value in zip(COUNTERS, expected):
+                    setattr(row, counter, value)
+                fixed.append(row)
+        WishlistStats.objects.bulk_create(missing, batch_size=1000)
+        WishlistStats.objects.bulk_update(fixed, COUNTERS, batch_size=1000)
+    return len(fixed) + len(missing)
@@ -0,0 +1,119 @@
+# wishes/storage.py
+"""
+Content-addressed media storage (see STORAGES in settings.py).
+
+Every file is stored under the SHA-256 of its bytes,
+blobs/3f/a1/3fa1...e9.jpg, whatever name it was saved with. The same
+product image uploaded or fetched by many users is therefore kept once:
+saving bytes that are already stored writes nothing and returns the
+existing name. Files are hashed and written chunk by chunk, so large
+uploads are never held in memory.
+
+Stored files are shared, so they must not be deleted when one wish stops
+using them: wishes.blobs counts the references and deletes unused files.
+Saving existing bytes refreshes the file's modification time, which that
+garbage collection uses to leave alone files that are being reused.
+
+ContentAddressedFileSystemStorage keeps the files under MEDIA_ROOT;
+wishes.s3storage has the S3-compatible variant.
+"""
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+BLOB_DIR = 'blobs'
+
+
+def is_blob(name):
+    """
+    Whether `name` is a content-addressed file (as opposed to one saved
+    before this storage was used, or by another storage).
+    """
+    return bool(name) and name.startswith(f'{BLOB_DIR}/')
+
+
+def blob_name(digest, ext=''):
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}'
+
+
+def content_digest(content):
+    """
+    The SHA-256 hex digest of `content` (a django File), read in chunks.
+    File.chunks() rewinds the file first, so it can be read again afterwards.
+    """
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedMixin(ABC):
+    """
+    Storage mixin naming files after their content. Subclasses implement
+    touch(name), which marks an existing file as just used.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        # Only the extension of the given name is kept, for content types.
+        name = blob_name(content_digest(content), os.path.splitext(name)[1])
+        if self.exists(name):
+            self.touch(name)
+            return name
+        return self._save(name, content)
+
+    def get_available_name(self, name, max_length=None):
+        # A name always holds the same bytes: never needs a new one.
+        return name
+
+    @abstractmethod
+    def touch(self, name):
+        """
+        Marks the existing file `name` as just used.
+        """
+
+
+class ContentAddressedFileSystemStorage(ContentAddressedMixin, FileSystemStorage):
+    """
+    Content-addressed storage on the local filesystem.
+    """
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            # As in FileSystemStorage: os.makedirs() doesn't apply the mode
+            # to intermediate directories, the umask does.
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        # Written next to its final name and renamed into place, so readers
+        # never see a partial file and concurrent saves of the same bytes
+        # simply replace each other.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    tmp.write(chunk)
+            os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
+
+    def touch(self, name):
+        os.utime(self.path(name))
@@ -0,0 +1,530 @@
+# wishes/stylesheet.py
+"""
+Builds the site's CSS bundle (wishes/static/wishes/css/app.css).
+
+The templates are styled with Tailwind utility classes. Instead of loading
+the Tailwind CDN script, which compiles styles in every visitor's browser,
+`python manage.py build_css` scans the templates for class names the way
+Tailwind's content scanner does, and writes CSS for
+only the utilities actually used (a "purged" build), after the base reset
+in wishes/assets/base.css. The generator covers the subset of Tailwind v3
+this project uses, with Tailwind's default theme values. A class in a
+template's class attribute that is neither a utility it can generate nor
+one of the app's HOOK_CLASSES fails the build (UnknownClassError), so a
+template never silently renders unstyled.
+
+Rebuild after changing classes in templates; the test suite fails while
+the committed bundle is stale.
+"""
+import re
+from pathlib import Path
+
+BASE_CSS = Path(__file__).resolve().parent / 'assets' / 'base.css'
+OUTPUT = Path(__file__).resolve().parent / 'static' / 'wishes' / 'css' / 'app.css'
+CONTENT_GLOBS = ('templates/**/*.html',)
+
+# Class names the templates use as markup hooks rather than for styling.
+HOOK_CLASSES = frozenset({
+    'active', 'button', 'button-danger', 'button-primary', 'button-secondary', 'button-warning',
+    'feed-more', 'form-group', 'search-form', 'tag', 'tag-filter', 'tag-link',
+    'wish-card', 'wish-card-content', 'wish-card-detail',
+    # Tailwind v2's opt-in to transforms; the scale-* utilities here set
+    # `transform` themselves.
+    'transform',
+})
+
+SCREENS = {'sm': 640, 'md': 768, 'lg': 1024, 'xl': 1280, '2xl': 1536}
+PSEUDO_CLASSES = {
+    'hover': ':hover', 'focus': ':focus', 'focus-within': ':focus-within',
+    'focus-visible': ':focus-visible', 'active': ':active', 'disabled': ':disabled',
+}
+
+COLORS = {
+    'gray': ['#f9fafb', '#f3f4f6', '#e5e7eb', '#d1d5db', '#9ca3af',
+             '#6b7280', '#4b5563', '#374151', '#1f2937', '#111827'],
+    'amber': ['#fffbeb', '#fef3c7', '#fde68a', '#fcd34d', '#fbbf24',
+              '#f59e0b', '#d97706', '#b45309', '#92400e', '#78350f'],
+    'red': ['#fef2f2', '#fee2e2', '#fecaca', '#fca5a5', '#f87171',
+            '#ef4444', '#dc2626', '#b91c1c', '#991b1b', '#7f1d1d'],
+    'yellow': ['#fefce8', '#fef9c3', '#fef08a', '#fde047', '#facc15',
+               '#eab308', '#ca8a04', '#a16207', '#854d0e', '#713f12'],
+    'green': ['#f0fdf4', '#dcfce7', '#bbf7d0', '#86efac', '#4ade80',
+              '#22c55e', '#16a34a', '#15803d', '#166534', '#14532d'],
+    'emerald': ['#ecfdf5', '#d1fae5', '#a7f3d0', '#6ee7b7', '#34d399',
+                '#10b981', '#059669', '#047857', '#065f46', '#064e3b'],
+    'blue': ['#eff6ff', '#dbeafe', '#bfdbfe', '#93c5fd', '#60a5fa',
+             '#3b82f6', '#2563eb', '#1d4ed8', '#1e40af', '#1e3a8a'],
+    'indigo': ['#eef2ff', '#e0e7ff', '#c7d2fe', '#a5b4fc', '#818cf8',
+               '#6366f1', '#4f46e5', '#4338ca', '#3730a3', '#312e81'],
+    'purple': ['#faf5ff', '#f3e8ff', '#e9d5ff', '#d8b4fe', '#c084fc',
+               '#a855f7', '#9333ea', '#7e22ce', '#6b21a8', '#581c87'],
+}
+SHADES = ['50', '100', '200', '300', '400', '500', '600', '700', '800', '900']
+SPECIAL_COLORS = {
+    'white': '#fff', 'black': '#000', 'transparent': 'transparent',
+    'current': 'currentColor', 'inherit': 'inherit',
+}
+
+FONT_SIZES = {
+    'xs': ('0.75rem', '1rem'), 'sm': ('0.875rem', '1.25rem'), 'base': ('1rem', '1.5rem'),
+    'lg': ('1.125rem', '1.75rem'), 'xl': ('1.25rem', '1.75rem'), '2xl': ('1.5rem', '2rem'),
+    '3xl': ('1.875rem', '2.25rem'), '4xl': ('2.25rem', '2.5rem'), '5xl': ('3rem', '1'),
+}
+FONT_WEIGHTS = {
+    'light': 300, 'normal': 400, 'medium': 500, 'semibold': 600, 'bold': 700, 'extrabold': 800,
+}
+LEADING = {'none': '1', 'tight': '1.25', 'snug': '1.375', 'normal': '1.5', 'relaxed': '1.625', 'loose': '2'}
+MAX_WIDTHS = {
+    'none': 'none', 'xs': '20rem', 'sm': '24rem', 'md': '28rem', 'lg': '32rem', 'xl': '36rem',
+    '2xl': '42rem', '3xl': '48rem', '4xl': '56rem', '5xl': '64rem', '6xl': '72rem', '7xl': '80rem',
+    'full': '100%', 'prose': '65ch',
+}
+RADII = {
+    'none': '0px', 'sm': '0.125rem', '': '0.25rem', 'md': '0.375rem', 'lg': '0.5rem',
+    'xl': '0.75rem', '2xl': '1rem', '3xl': '1.5rem', 'full': '9999px',
+}
+SHADOWS = {
+    'sm': '0 1px 2px 0 rgb(0 0 0 / 0.05)',
+    '': '0 1px 3px 0 rgb(0 0 0 / 0.1), 0 1px 2px -1px rgb(0 0 0 / 0.1)',
+    'md': '0 4px 6px -1px rgb(0 0 0 / 0.1), 0 2px 4px -2px rgb(0 0 0 / 0.1)',
+    'lg': '0 10px 15px -3px rgb(0 0 0 / 0.1), 0 4px 6px -4px rgb(0 0 0 / 0.1)',
+    'xl': '0 20px 25px -5px rgb(0 0 0 / 0.1), 0 8px 10px -6px rgb(0 0 0 / 0.1)',
+    '2xl': '0 25px 50px -12px rgb(0 0 0 / 0.25)',
+    'none': '0 0 #0000',
+}
+BLURS = {'sm': '4px', '': '8px', 'md': '12px', 'lg': '16px', 'xl': '24px'}
+EASINGS = {
+    'linear': 'linear', 'in': 'cubic-bezier(0.4, 0, 1, 1)', 'out': 'cubic-bezier(0, 0, 0.2, 1)',
+    'in-out': 'cubic-bezier(0.4, 0, 0.2, 1)',
+}
+TRANSITIONS = {
+    '': 'color, background-color, border-color, text-decoration-color, fill, stroke, opacity, '
+        'box-shadow, transform, filter, backdrop-filter',
+    'colors': 'color, background-color, border-color, text-decoration-color, fill, stroke',
+    'opacity': 'opacity',
+    'shadow': 'box-shadow',
+    'transform': 'transform',
+    'all': 'all',
+}
+SIDES = {
+    '': ('',), 'x': ('-left', '-right'), 'y': ('-top', '-bottom'),
+    't': ('-top',), 'r': ('-right',), 'b': ('-bottom',), 'l': ('-left',),
+}
+INSETS = {
+    'inset': ('top', 'right', 'bottom', 'left'), 'inset-x': ('left', 'right'), 'inset-y': ('top', 'bottom'),
+    'top': ('top',), 'right': ('right',), 'bottom': ('bottom',), 'left': ('left',),
+}
+ALIGN_ITEMS = {'start': 'flex-start', 'end': 'flex-end', 'center': 'center', 'baseline': 'baseline',
+               'stretch': 'stretch'}
+JUSTIFY = {'start': 'flex-start', 'end': 'flex-end', 'center': 'center', 'between': 'space-between',
+           'around': 'space-around', 'evenly': 'space-evenly'}
+DISPLAYS = {
+    'block': 'block', 'inline-block': 'inline-block', 'inline': 'inline', 'flex': 'flex',
+    'inline-flex': 'inline-flex', 'grid': 'grid', 'inline-grid': 'inline-grid', 'table': 'table',
+    'contents': 'contents', 'hidden': 'none',
+}
+STATIC = {
+    'sr-only': 'position: absolute; width: 1px; height: 1px; padding: 0; margin: -1px; overflow: hidden; '
+               'clip: rect(0, 0, 0, 0); white-space: nowrap; border-width: 0',
+    'not-sr-only': 'position: static; width: auto; height: auto; padding: 0; margin: 0; overflow: visible; '
+                   'clip: auto; white-space: normal',
+    'pointer-events-none': 'pointer-events: none',
+    'pointer-events-auto': 'pointer-events: auto',
+    'static': 'position: static', 'fixed': 'position: fixed', 'absolute': 'position: absolute',
+    'relative': 'position: relative', 'sticky': 'position: sticky',
+    'col-span-full': 'grid-column: 1 / -1',
+    'flex-1': 'flex: 1 1 0%', 'flex-auto': 'flex: 1 1 auto', 'flex-none': 'flex: none',
+    'flex-shrink-0': 'flex-shrink: 0', 'shrink-0': 'flex-shrink: 0',
+    'flex-grow': 'flex-grow: 1', 'grow': 'flex-grow: 1',
+    'cursor-pointer': 'cursor: pointer', 'cursor-default': 'cursor: default',
+    'flex-row': 'flex-direction: row', 'flex-col': 'flex-direction: column',
+    'flex-wrap': 'flex-wrap: wrap', 'flex-nowrap': 'flex-wrap: nowrap',
+    'overflow-hidden': 'overflow: hidden', 'overflow-auto': 'overflow: auto',
+    'overflow-x-auto': 'overflow-x: auto',
+    'truncate': 'overflow: hidden; text-overflow: ellipsis; white-space: nowrap',
+    'whitespace-nowrap': 'white-space: nowrap', 'whitespace-normal': 'white-space: normal',
+    'break-words': 'overflow-wrap: break-word',
+    'fill-current': 'fill: currentColor',
+    'object-cover': 'object-fit: cover', 'object-contain': 'object-fit: contain',
+    'text-left': 'text-align: left', 'text-center': 'text-align: center', 'text-right': 'text-align: right',
+    'align-top': 'vertical-align: top', 'align-middle': 'vertical-align: middle',
+    'align-bottom': 'vertical-align: bottom', 'align-baseline': 'vertical-align: baseline',
+    'italic': 'font-style: italic', 'not-italic': 'font-style: normal',
+    'uppercase': 'text-transform: uppercase',
+    'underline': 'text-decoration-line: underline', 'no-underline': 'text-decoration-line: none',
+    'line-through': 'text-decoration-line: line-through',
+}
+
+
+def _spacing(value):
+    if value == 'px':
+        return '1px'
+    if value == 'auto':
+        return 'auto'
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    if number < 0 or number > 96 or (number * 2) % 1:
+        return None
+    return '0px' if number == 0 else f'{number / 4:g}rem'
+
+
+def _size(value, screen_unit):
+    if value == 'full':
+        return '100%'
+    if value == 'screen':
+        return f'100{screen_unit}'
+    if value in ('auto', 'min', 'max', 'fit'):
+        return value if value == 'auto' else f'{value}-content'
+    if re.fullmatch(r'\d+/\d+', value):
+        numerator, denominator = map(int, value.split('/'))
+        return f'{numerator / denominator * 100:g}%' if denominator else None
+    return _spacing(value)
+
+
+def _color(value):
+    """
+    `gray-500`, `white`, `white/80`... as a CSS color, or None.
+    """
+    value, _, alpha = value.partition('/')
+    if value in SPECIAL_COLORS:
+        color = SPECIAL_COLORS[value]
+    else:
+        family, _, shade = value.rpartition('-')
+        if family not in COLORS or shade not in SHADES:
+            return None
+        color = COLORS[family][SHADES.index(shade)]
+    if not alpha:
+        return color
+    if not alpha.isdigit() or int(alpha) > 100 or not color.startswith('#'):
+        return None
+    hex_digits = color[1:] if len(color) == 7 else ''.join(digit * 2 for digit in color[1:])
+    red, green, blue = (int(hex_digits[i:i + 2], 16) for i in (0, 2, 4))
+    return f'rgb({red} {green} {blue} / {int(alpha) / 100:g})'
+
+
+def _sided(prop, sides, value):
+    return '; '.join(f'{prop}{side}: {value}' for side in SIDES[sides])
+
+
+def _margin(match):
+    negative, sides, amount = match.groups()
+    value = _spacing(amount)
+    if value is None or (negative and value == 'auto'):
+        return None
+    return _sided('margin', sides, f'-{value}' if negative and value != '0px' else value)
+
+
+def _padding(match):
+    sides, amount = match.groups()
+    value = _spacing(amount)
+    return _sided('padding', sides, value) if value not in (None, 'auto') else None
+
+
+def _inset(match):
+    negative, prop, amount = match.groups()
+    value = _size(amount, 'vh')
+    if value is None:
+        return None
+    if negative:
+        value = f'-{value}'
+    return '; '.join(f'{side}: {value}' for side in INSETS[prop])
+
+
+def _space(match):
+    axis, amount = match.groups()
+    value = _spacing(amount)
+    if value in (None, 'auto'):
+        return None
+    start, end = ('left', 'right') if axis == 'x' else ('top', 'bottom')
+    return ' > :not([hidden]) ~ :not([hidden])', f'margin-{end}: 0px; margin-{start}: {value}'
+
+
+def _border_width(match):
+    sides, width = match.groups()
+    if width is not None and width not in ('0', '2', '4', '8'):
+        return None
+    return '; '.join(f'border{side}-width: {width or 1}px' for side in SIDES[sides or ''])
+
+
+def _rounded(match):
+    corner, size = match.groups()
+    size = size or ''
+    if size not in RADII:
+        return None
+    corners = {
+        None: ('border-radius',),
+        't': ('border-top-left-radius', 'border-top-right-radius'),
+        'r': ('border-top-right-radius', 'border-bottom-right-radius'),
+        'b': ('border-bottom-right-radius', 'border-bottom-left-radius'),
+        'l': ('border-top-left-radius', 'border-bottom-left-radius'),
+    }[corner]
+    return '; '.join(f'{prop}: {RADII[size]}' for prop in corners)
+
+
+def _colored(prop):
+    def rule(match):
+        color = _color(match.group(1))
+        return f'{prop}: {color}' if color else None
+    return rule
+
+
+def _lookup(table, template):
+    def rule(match):
+        value = table.get(match.group(1) or '')
+        return template.format(value) if value is not None else None
+    return rule
+
+
+def _font_size(match):
+    size = FONT_SIZES.get(match.group(1))
+    return f'font-size: {size[0]}; line-height: {size[1]}' if size else None
+
+
+def _line_clamp(match):
+    return (f'overflow: hidden; display: -webkit-box; -webkit-box-orient: vertical; '
+            f'-webkit-line-clamp: {match.group(1)}')
+
+
+def _grid_cols(match):
+    return f'grid-template-columns: repeat({match.group(1)}, minmax(0, 1fr))'
+
+
+def _col_span(match):
+    return f'grid-column: span {match.group(1)} / span {match.group(1)}'
+
+
+def _gap(match):
+    axis, amount = match.groups()
+    value = _spacing(amount)
+    if value in (None, 'auto'):
+        return None
+    prop = {None: 'gap', 'x': 'column-gap', 'y': 'row-gap'}[axis]
+    return f'{prop}: {value}'
+
+
+def _width(match):
+    value = _size(match.group(1), 'vw')
+    return f'width: {value}' if value else None
+
+
+def _height(match):
+    value = _size(match.group(1), 'vh')
+    return f'height: {value}' if value else None
+
+
+def _scale(match):
+    return f'transform: scale({int(match.group(1)) / 100:g})'
+
+
+def _opacity(match):
+    amount = int(match.group(1))
+    return f'opacity: {amount / 100:g}' if amount <= 100 and amount % 5 == 0 else None
+
+
+def _ring(match):
+    width = match.group(1) or '3'
+    return f'box-shadow: 0 0 0 {width}px var(--tw-ring-color, rgb(59 130 246 / 0.5))'
+
+
+def _transition(match):
+    properties = TRANSITIONS.get(match.group(1) or '')
+    if properties is None:
+        return None
+    return (f'transition-property: {properties}; '
+            f"transition-timing-function: {EASINGS['in-out']}; transition-duration: 150ms")
+
+
+def _duration(match):
+    return f'transition-duration: {match.group(1)}ms'
+
+
+def _underline_offset(match):
+    return f'text-underline-offset: {match.group(1)}px'
+
+
+# (pattern, rule) in Tailwind's output order: later rules win over earlier
+# ones, e.g. `border-b-2` over `border`, `px-4` over `p-2`. A rule returns
+# the declarations, a (selector suffix, declarations) pair, or None.
+RULES = [
+    (r'(sr-only|not-sr-only|pointer-events-none|pointer-events-auto)', lambda m: STATIC[m.group(1)]),
+    (r'(static|fixed|absolute|relative|sticky)', lambda m: STATIC[m.group(1)]),
+    (r'(-?)(inset-x|inset-y|inset|top|right|bottom|left)-(\S+)', _inset),
+    (r'col-span-full', lambda m: STATIC['col-span-full']),
+    (r'col-span-(\d+)', _col_span),
+    (r'(-?)m([xytrbl]?)-(\S+)', _margin),
+    (r'line-clamp-(\d)', _line_clamp),
+    (r'(block|inline-block|inline|flex|inline-flex|grid|inline-grid|table|contents|hidden)',
+     lambda m: f'display: {DISPLAYS[m.group(1)]}'),
+    (r'h-(\S+)', _height),
+    (r'w-(\S+)', _width),
+    (r'max-w-(\S+)', _lookup(MAX_WIDTHS, 'max-width: {}')),
+    (r'(flex-1|flex-auto|flex-none|flex-shrink-0|shrink-0|flex-grow|grow)', lambda m: STATIC[m.group(1)]),
+    (r'scale-(\d+)', _scale),
+    (r'(cursor-pointer|cursor-default)', lambda m: STATIC[m.group(1)]),
+    (r'grid-cols-(\d+)', _grid_cols),
+    (r'(flex-row|flex-col|flex-wrap|flex-nowrap)', lambda m: STATIC[m.group(1)]),
+    (r'items-(\S+)', _lookup(ALIGN_ITEMS, 'align-items: {}')),
+    (r'justify-(\S+)', _lookup(JUSTIFY, 'justify-content: {}')),
+    (r'gap-(?:([xy])-)?(\S+)', _gap),
+    (r'space-([xy])-(\S+)', _space),
+    (r'self-(\S+)', _lookup({**ALIGN_ITEMS, 'auto': 'auto'}, 'align-self: {}')),
+    (r'(overflow-hidden|overflow-auto|overflow-x-auto|truncate|whitespace-nowrap|whitespace-normal|break-words)',
+     lambda m: STATIC[m.group(1)]),
+    (r'rounded(?:-([trbl]))?(?:-(\S+))?', _rounded),
+    (r'border(?:-([xytrbl]))?(?:-(\d+))?', _border_width),
+    (r'border-(\S+)', _colored('border-color')),
+    (r'bg-(\S+)', _colored('background-color')),
+    (r'(fill-current)', lambda m: STATIC[m.group(1)]),
+    (r'(object-cover|object-contain)', lambda m: STATIC[m.group(1)]),
+    (r'p([xytrbl]?)-(\S+)', _padding),
+    (r'(text-left|text-center|text-right)', lambda m: STATIC[m.group(1)]),
+    (r'(align-top|align-middle|align-bottom|align-baseline)', lambda m: STATIC[m.group(1)]),
+    (r'text-(\S+)', _font_size),
+    (r'font-(\S+)', _lookup(FONT_WEIGHTS, 'font-weight: {}')),
+    (r'(uppercase|italic|not-italic)', lambda m: STATIC[m.group(1)]),
+    (r'leading-(\S+)', _lookup(LEADING, 'line-height: {}')),
+    (r'text-(\S+)', _colored('color')),
+    (r'(underline|no-underline|line-through)', lambda m: STATIC[m.group(1)]),
+    (r'underline-offset-(\d)', _underline_offset),
+    (r'opacity-(\d+)', _opacity),
+    (r'shadow(?:-(\S+))?', _lookup(SHADOWS, 'box-shadow: {}')),
+    (r'ring(?:-(\d))?', _ring),
+    (r'ring-(\S+)', _colored('--tw-ring-color')),
+    (r'backdrop-blur(?:-(\S+))?', _lookup(BLURS, 'backdrop-filter: blur({})')),
+    (r'transition(?:-(\S+))?', _transition),
+    (r'duration-(\d+)', _duration),
+    (r'ease-(\S+)', _lookup(EASINGS, 'transition-timing-function: {}')),
+]
+RULES = [(re.compile(pattern), rule) for pattern, rule in RULES]
+
+# Template tags, variables and comments, e.g. {% load static %}, aren't classes.
+TEMPLATE_SYNTAX = re.compile(r'{%.*?%}|{{.*?}}|{#.*?#}', re.DOTALL)
+# Candidate class names: what Tailwind's scanner would consider.
+CANDIDATE = re.compile(r'[a-z0-9][a-z0-9/:.-]*[a-z0-9%]|[a-z]|-[a-z][a-z0-9/:.-]*[a-z0-9]')
+
+
+def utility(name):
+    """
+    Returns (order, selector suffix, declarations) for the utility `name`
+    without variants, or None when it isn't one we can generate.
+    """
+    for order, (pattern, rule) in enumerate(RULES):
+        match = pattern.fullmatch(name)
+        if match is None:
+            continue
+        result = rule(match)
+        if result is None:
+            continue
+        suffix, declarations = result if isinstance(result, tuple) else ('', result)
+        return order, suffix, declarations
+    return None
+
+
+def escape(name):
+    return re.sub(r'([^a-zA-Z0-9_-])', r'\\\1', name)
+
+
+def parse(candidate):
+    """
+    Splits `md:hover:px-4` into (screen, pseudo classes, utility); None
+    when a variant is unknown.
+    """
+    *variants, name = candidate.split(':')
+    screen, pseudo = None, []
+    for variant in variants:
+        if variant in SCREENS and screen is None and not pseudo:
+            screen = variant
+        elif variant in PSEUDO_CLASSES:
+            pseudo.append(PSEUDO_CLASSES[variant])
+        else:
+            return None
+    return screen, pseudo, name
+
+
+def content_files(root=None):
+    root = Path(root or Path(__file__).resolve().parent)
+    files = set()
+    for pattern in CONTENT_GLOBS:
+        files.update(path for path in root.glob(pattern) if path.is_file())
+    return sorted(files)
+
+
+def scan(paths):
+    """
+    Every candidate class name in the files at `paths`.
+    """
+    candidates = set()
+    for path in paths:
+        text = TEMPLATE_SYNTAX.sub(' ', Path(path).read_text(encoding='utf-8'))
+        candidates.update(CANDIDATE.findall(text))
+    return candidates
+
+
+def _container():
+    lines = ['.container { width: 100% }']
+    for width in SCREENS.values():
+        lines.append(f'@media (min-width: {width}px) {{ .container {{ max-width: {width}px }} }}')
+    return lines
+
+
+class UnknownClassError(ValueError):
+    pass
+
+
+def build(paths=None):
+    """
+    Returns (css, classes): the bundle for the utilities used in `paths`
+    (the app's templates by default) and the class names it covers.
+    Raises UnknownClassError if a class attribute uses a class that is
+    neither a utility the generator knows nor in HOOK_CLASSES.
+    """
+    if paths is None:
+        paths = content_files()
+    css, used = _generate(paths)
+    unknown = sorted(class_names(paths) - used - HOOK_CLASSES)
+    if unknown:
+        raise UnknownClassError(f"Classes the CSS bundle can't style: {', '.join(unknown)}")
+    return css, used
+
+
+def _generate(paths):
+    candidates = scan(paths)
+    rules = []
+    used = set()
+    for candidate in candidates:
+        parsed = parse(candidate)
+        if parsed is None:
+            continue
+        screen, pseudo, name = parsed
+        generated = utility(name)
+        if generated is None:
+            continue
+        order, suffix, declarations = generated
+        screen_order = list(SCREENS).index(screen) + 1 if screen else 0
+        selector = f'.{escape(candidate)}{"".join(pseudo)}{suffix}'
+        rules.append(((screen_order, len(pseudo), order, candidate), screen, f'{selector} {{ {declarations} }}'))
+        used.add(candidate)
+
+    lines = [BASE_CSS.read_text(encoding='utf-8').rstrip('\n'), '']
+    if 'container' in candidates:
+        lines.extend(_container())
+        used.add('container')
+    for _, screen, rule in sorted(rules):
+        if screen:
+            rule = f'@media (min-width: {SCREENS[screen]}px) {{ {rule} }}'
+        lines.append(rule)
+    return '\n'.join(lines) + '\n', used
+
+
+def class_names(paths):
+    """
+    Every class used in the `class="..."` attributes of the files at `paths`.
+    """
+    names = set()
+    for path in paths:
+        for attribute in re.findall(r'class="([^"]*)"', Path(path).read_text(encoding='utf-8')):
+            attribute = re.sub(r'{[{%].*?[%}]}', ' ', attribute)
+            names.update(attribute.split())
+    return names
@@ -0,0 +1,63 @@
+# wishes/tags.py
+"""
+Tag resolution shared by WishForm and WishSerializer.
+
+Tag names are resolved in bulk (one IN query, one bulk INSERT for the
+missing ones) and a wish's tags are updated by applying only the
+difference to its current set.
+"""
+from .models import Tag
+
+
+def parse_tag_names(tags_input):
+    """
+    Splits a comma-separated tags string into unique, non-empty names,
+    keeping their first-seen order.
+    """
+    names = (name.strip() for name in (tags_input or '').split(','))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def resolve_tags(names):
+    """
+    Returns a {name: Tag} dict for `names`, creating missing tags.
+    Costs one SELECT, plus one INSERT and one SELECT when some are new.
+    """
+    names = set(names)
+    if not names:
+        return {}
+    tags = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+    missing = names - tags.keys()
+    if missing:
+        # ignore_conflicts: another request may create the same tag concurrently.
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        tags.update((tag.name, tag) for tag in Tag.objects.filter(name__in=missing))
+    return tags
+
+
+def set_wish_tags(wish, names, resolved=None, touch=True):
+    """
+    Makes `wish` carry exactly the tags called `names`, adding and removing
+    only what changed. Nothing is written when the set is unchanged.
+    `resolved` may hold a {name: Tag} dict already fetched for a batch.
+    A tag change bumps the wish's updated_at, unless `touch` is False
+    because the caller saves the wish in the same transaction.
+    """
+    current = {tag.name: tag for tag in wish.tags.all()}
+    wanted = set(names)
+
+    removed = [tag for name, tag in current.items() if name not in wanted]
+    to_add = wanted - current.keys()
+    resolved = resolved or {}
+    added = [resolved[name] for name in to_add if name in resolved]
+    added += resolve_tags(to_add - resolved.keys()).values()
+
+    # Read by the m2m_changed handlers in wishes.signals.
+    wish._touch_on_tags_change = touch
+    try:
+        if removed:
+            wish.tags.remove(*removed)
+        if added:
+            wish.tags.add(*added)
+    finally:
+        del wish._touch_on_tags_change
@@ -0,0 +1,247 @@
+# wishes/tasks.py
+"""
+Background download of wish images given by URL.
+
+`WishForm` only queues an ImageFetchTask; the actual download happens in
+`manage.py process_image_tasks`, which fetches the body through the shared
+HTTP client (wishes.fetching: pooled connections, a response cache and a
+size cap), checks that it really is an image and retries transient
+failures with exponential backoff. With ``--concurrency N`` the worker keeps
+up to N downloads in flight through asyncio (aprocess_pending()).
+"""
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .fetching import ResponseTooLarge, get_client
+from .images import generate_derivatives
+from .models import ImageFetchTask, Wish
+
+logger = logging.getLogger('wishes')
+
+# Leading bytes of the image formats we accept, and the extension to store them under.
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+]
+
+
+class ImageFetchError(Exception):
+    """
+    A download that should not be retried (bad content, too large, 4xx).
+    """
+
+
+def sniff_image_extension(head):
+    """
+    Returns the file extension matching the magic bytes in `head`, or None.
+    """
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+
+def enqueue_image_fetch(wish, url):
+    """
+    Queues a download of `url` into `wish.image` and marks the wish as pending.
+    Any earlier pending download for the same wish is superseded.
+    """
+    cancel_image_fetch(wish)
+    task = ImageFetchTask.objects.create(wish=wish, url=url)
+    wish.image_status, wish.updated_at = Wish.IMAGE_PENDING, timezone.now()
+    Wish.objects.filter(pk=wish.pk).update(image_status=wish.image_status, updated_at=wish.updated_at)
+    logger.debug(f"Queued image download {task.pk} for wish {wish.pk}: {url}")
+    return task
+
+
+def enqueue_image_fetches(pairs):
+    """
+    Queues downloads for many new wishes at once, given (wish, url) pairs:
+    one INSERT for the tasks and one UPDATE marking the wishes pending.
+    Unlike enqueue_image_fetch() nothing is superseded, so only use it for
+    wishes that were just created.
+    """
+    pairs = [(wish, url) for wish, url in pairs if url]
+    if not pairs:
+        return []
+    tasks = ImageFetchTask.objects.bulk_create([ImageFetchTask(wish=wish, url=url) for wish, url in pairs])
+    now = timezone.now()
+    Wish.objects.filter(pk__in=[wish.pk for wish, _ in pairs]).update(image_status=Wish.IMAGE_PENDING, updated_at=now)
+    for wish, _ in pairs:
+        wish.image_status, wish.updated_at = Wish.IMAGE_PENDING, now
+    logger.debug(f"Queued {len(tasks)} image downloads.")
+    return tasks
+
+
+def cancel_image_fetch(wish):
+    ImageFetchTask.objects.filter(
+        wish=wish, status__in=[ImageFetchTask.STATUS_PENDING, ImageFetchTask.STATUS_RUNNING]
+    ).delete()
+
+
+def _check_image_response(content_type, head):
+    if not content_type.startswith('image/') and content_type != 'application/octet-stream':
+        raise ImageFetchError(f"Not an image: {content_type}")
+    if sniff_image_extension(head) is None:
+        raise ImageFetchError("Downloaded data is not a supported image")
+
+
+def download_image(url, max_bytes=None, timeout=None):
+    """
+    Fetches `url` through the shared HTTP client (pooled connections and a
+    response cache, see wishes.fetching), enforcing `max_bytes`.
+    Returns (file, filename); the caller must close the file.
+    Raises ImageFetchError for permanent failures and OSError for transient ones.
+    """
+    max_bytes = max_bytes or settings.WISHES_IMAGE_MAX_BYTES
+    timeout = timeout or settings.WISHES_IMAGE_FETCH_TIMEOUT
+    try:
+        fetched = get_client().fetch(url, timeout=timeout, max_bytes=max_bytes, validate=_check_image_response)
+    except HTTPError as exc:
+        if 400 <= exc.code < 500:
+            raise ImageFetchError(f"HTTP {exc.code}") from exc
+        raise
+    except ResponseTooLarge as exc:
+        raise ImageFetchError(f"Image too large: {exc}") from exc
+
+    ext = sniff_image_extension(fetched.file.read(16))
+    fetched.file.seek(0)
+    if fetched.from_cache:
+        logger.debug(f"Image {url} served from the fetch cache.")
+    base_name = os.path.splitext(os.path.basename(urlsplit(url).path))[0] or 'image'
+    return fetched.file, base_name + ext
+
+
+def claim_tasks(limit):
+    """
+    Atomically marks up to `limit` due tasks as running and returns them.
+    Safe to call from several worker processes at once. Claiming a task
+    counts as an attempt, so a download that crashes the worker still
+    uses up its retries.
+    """
+    now = timezone.now()
+    # Tasks left running by a crashed worker become claimable again, or
+    # fail once they are out of attempts.
+    stale = now - timedelta(seconds=settings.WISHES_IMAGE_FETCH_TIMEOUT * 10)
+    stale_tasks = ImageFetchTask.objects.filter(status=ImageFetchTask.STATUS_RUNNING, locked_at__lt=stale)
+    exhausted = stale_tasks.filter(attempts__gte=settings.WISHES_IMAGE_FETCH_ATTEMPTS)
+    Wish.objects.filter(pk__in=exhausted.values('wish_id')).update(
+        image_status=Wish.IMAGE_FAILED, updated_at=now,
+    )
+    exhausted.update(status=ImageFetchTask.STATUS_FAILED, last_error='The worker stopped during the download')
+    stale_tasks.update(status=ImageFetchTask.STATUS_PENDING)
+
+    candidates = ImageFetchTask.objects.filter(
+        status=ImageFetchTask.STATUS_PENDING, run_after__lte=now
+    ).values_list('pk', flat=True)[:limit]
+
+    claimed = []
+    for pk in candidates:
+        won = ImageFetchTask.objects.filter(pk=pk, status=ImageFetchTask.STATUS_PENDING).update(
+            status=ImageFetchTask.STATUS_RUNNING, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if won:
+            claimed.append(pk)
+    return list(ImageFetchTask.objects.filter(pk__in=claimed))
+
+
+def run_task(task):
+    """
+    Downloads one task's image into its wish, scheduling a retry or marking
+    the task failed on error.
+    """
+    try:
+        tmp, filename = download_image(task.url)
+    except (ImageFetchError, OSError, ValueError) as exc:
+        _record_failure(task, exc)
+        return False
+    return _store_image(task, tmp, filename)
+
+
+def _store_image(task, tmp, filename):
+    with tmp, transaction.atomic():
+        # The download may have been superseded (new upload/URL) or the
+        # wish deleted while we were fetching.
+        if not ImageFetchTask.objects.filter(pk=task.pk, status=ImageFetchTask.STATUS_RUNNING).exists():
+            return False
+        # Reloaded and locked: the owner may have edited the wish during the
+        # download, and the signal handlers count from the saved instance.
+        wish = Wish.objects.select_for_update().filter(pk=task.wish_id).first()
+        if wish is None:
+            return False
+        wish.image.save(filename, File(tmp), save=False)
+        wish.image_status = ''
+        wish.save(update_fields=['image', 'image_status'])
+        task.status = ImageFetchTask.STATUS_DONE
+        task.last_error = ''
+        task.save(update_fields=['status', 'attempts', 'last_error'])
+
+    logger.info(f"Fetched image for wish {wish.pk} from {task.url}.")
+    generate_derivatives(wish)
+    return True
+
+
+async def arun_task(task, semaphore):
+    """
+    Async run_task(): up to `semaphore` downloads overlap; storing the image
+    and bookkeeping go through the (sync) ORM one at a time.
+    """
+    try:
+        async with semaphore:
+            tmp, filename = await asyncio.to_thread(download_image, task.url)
+    except (ImageFetchError, OSError, ValueError) as exc:
+        await sync_to_async(_record_failure)(task, exc)
+        return False
+    return await sync_to_async(_store_image)(task, tmp, filename)
+
+
+def _record_failure(task, exc):
+    # Network errors and 5xx responses are worth retrying; bad URLs and bad content are not.
+    permanent = isinstance(exc, (ImageFetchError, ValueError))
+    task.last_error = f"{type(exc).__name__}: {exc}"
+    if permanent or task.attempts >= settings.WISHES_IMAGE_FETCH_ATTEMPTS:
+        task.status = ImageFetchTask.STATUS_FAILED
+        Wish.objects.filter(pk=task.wish_id).update(image_status=Wish.IMAGE_FAILED, updated_at=timezone.now())
+        logger.warning(f"Giving up on image for wish {task.wish_id} from {task.url}: {task.last_error}")
+    else:
+        delay = settings.WISHES_IMAGE_FETCH_RETRY_DELAY * 2 ** (task.attempts - 1)
+        task.status = ImageFetchTask.STATUS_PENDING
+        task.run_after = timezone.now() + timedelta(seconds=delay)
+        logger.info(f"Retrying image for wish {task.wish_id} in {delay}s: {task.last_error}")
+    task.save(update_fields=['status', 'attempts', 'last_error', 'run_after'])
+
+
+def process_pending(limit=10):
+    """
+    Claims and runs up to `limit` due tasks. Returns how many were processed.
+    """
+    tasks = claim_tasks(limit)
+    for task in tasks:
+        run_task(task)
+    return len(tasks)
+
+
+async def aprocess_pending(limit=10, concurrency=4):
+    """
+    Like process_pending(), but downloads up to `concurrency` images at once,
+    so one slow server doesn't hold up the rest of the batch.
+    """
+    tasks = await sync_to_async(claim_tasks)(limit)
+    semaphore = asyncio.Semaphore(concurrency)
+    await asyncio.gather(*(arun_task(task, semaphore) for task in tasks))
+    return len(tasks)
@@ -0,0 +1,78 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+def card_cache_key(template_digest, wish, options):
+    """
+    The key of `wish`'s card: the card template's source digest (so edited
+    templates don't serve old cards), the tag options, the wish and its
+    owner's username, which the card links to. updated_at changes on every
+    edit of the wish or its tags.
+    """
+    parts = [
+        template_digest, wish.pk, wish.updated_at.isoformat(), wish.user.username,
+        *(f'{name}={value}' for name, value in sorted(options.items())),
+    ]
+    return 'wishes:card:' + hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+class RenderedCards(dict):
+    """
+    {wish pk: card HTML} in the order of the wishes; prints as all the cards.
+    """
+
+    def __html__(self):
+        return ''.join(self.values())
+
+    __str__ = __html__
+
+
+@register.simple_tag(takes_context=True)
+def wish_cards(context, wishes, template_name='wishes/_wish_card.html', **options):
+    """
+    Renders each of `wishes` with `template_name`, caching every card for
+    WISHES_CARD_CACHE_TIMEOUT seconds: one cache get_many() for the whole
+    list, and one tag prefetch and one set_many() for the cards that had to
+    be rendered. Views therefore don't need to prefetch the wishes' tags.
+    The card sees `wish` and the keyword `options`, which are part of the
+    cache key; it must not depend on anything else in the page context.
+
+    Usage: {% wish_cards wishes variant='owner' %}, or, for a page split in
+    sections, render all of them at once and pick each section's cards:
+    {% wish_cards wishes variant='owner' as cards %} ... {{ cards|cards_for:active_wishes }}
+    """
+    card_template = context.template.engine.get_template(template_name)
+    timeout = settings.WISHES_CARD_CACHE_TIMEOUT
+    digest = hashlib.md5(card_template.source.encode()).hexdigest()
+    keys = [card_cache_key(digest, wish, options) for wish in wishes]
+    cached = cache.get_many(keys) if timeout else {}
+
+    # Only the cards rendered now need tags: one query for all of them,
+    # none when every card comes from the cache.
+    prefetch_related_objects([wish for wish, key in zip(wishes, keys) if key not in cached], 'tags')
+
+    cards, rendered = RenderedCards(), {}
+    for wish, key in zip(wishes, keys):
+        card = cached.get(key)
+        if card is None:
+            with context.push(wish=wish, **options):
+                card = rendered[key] = card_template.render(context)
+        cards[wish.pk] = mark_safe(card)
+    if rendered and timeout:
+        cache.set_many(rendered, timeout)
+    return cards
+
+
+@register.filter
+def cards_for(cards, wishes):
+    """
+    The cards of `wishes` out of a {% wish_cards ... as cards %} result.
+    """
+    return mark_safe(''.join(cards[wish.pk] for wish in wishes))
@@ -0,0 +1,36 @@
+from django import template
+from django.utils.html import format_html
+
+from wishes.images import derivative_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def wish_picture(wish, spec, css_class='', alt=None):
+    """
+    Renders `wish.image` at the `spec` derivative size ('thumb' or 'card'),
+    offering WebP and JPEG at 1x/2x density. Falls back to the original
+    image while derivatives haven't been built.
+
+    Usage: {% wish_picture wish 'card' 'w-full h-48 object-cover' %}
+    """
+    if not wish.image:
+        return ''
+    alt = alt or wish.title
+
+    jpeg, jpeg2x = derivative_url(wish, spec), derivative_url(wish, f'{spec}2x')
+    webp, webp2x = derivative_url(wish, spec, 'webp'), derivative_url(wish, f'{spec}2x', 'webp')
+    if not (jpeg and jpeg2x and webp and webp2x):
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy" decoding="async">',
+            wish.image.url, alt, css_class,
+        )
+
+    return format_html(
+        '<picture class="contents">'
+        '<source type="image/webp" srcset="{} 1x, {} 2x">'
+        '<img src="{}" srcset="{} 1x, {} 2x" alt="{}" class="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        webp, webp2x, jpeg, jpeg, jpeg2x, alt, css_class,
+    )
@@ -1,3 +1,1943 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.db import connection, connections
+from django.db.models.functions import Lower
+from django.test import AsyncClient, Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from djmoney.money import Money
+
+from PIL import Image
+
+from . import (
+    benchmarks, blobs, caching, changes, currency, export, facets, fetching, importing, instrumentation, search,
+    seeding, stats, stylesheet, tasks,
+)
+from .models import ImageFetchTask, MediaBlob, Wish, WishlistStats, Tag, TagFacet, WishTombstone
+from .pagination import decode_cursor
+
+try:
+    import boto3
+    from moto.server import ThreadedMotoServer
+    from .s3storage import ContentAddressedS3Storage
+except ImportError:  # optional: pip install django-storages[s3] "moto[server]"
+    ThreadedMotoServer = None
+
+User = get_user_model()
+
+
+class MainFeedPaginationTests(TestCase):
+    """
+    Keyset pagination of the main public feed.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='pw')
+        for i in range(25):
+            Wish.objects.create(user=cls.user, title=f'Wish {i}', image=f'wish_avatars/{i}.jpg')
+        Wish.objects.create(user=cls.user, title='No image')
+        Wish.objects.create(user=cls.user, title='Hidden', image='wish_avatars/p.jpg', private=True)
+
+    def test_has_image_is_denormalized_on_save(self):
+        wish = Wish.objects.get(title='No image')
+        self.assertFalse(wish.has_image)
+        wish.image = 'wish_avatars/new.jpg'
+        wish.save(update_fields=['image'])
+        wish.refresh_from_db()
+        self.assertTrue(wish.has_image)
+
+    def test_first_page_and_load_more_cover_feed_without_overlap(self):
+        response = self.client.get(reverse('main_feed'))
+        first_page = list(response.context['wishes'])
+        self.assertEqual(len(first_page), 20)
+        self.assertIsNotNone(decode_cursor(response.context['next_cursor']))
+
+        response = self.client.get(reverse('main_feed_more'), {'cursor': response.context['next_cursor']})
+        second_page = list(response.context['wishes'])
+        self.assertEqual(len(second_page), 5)
+        self.assertIsNone(response.context['next_cursor'])
+
+        titles = [w.title for w in first_page + second_page]
+        self.assertEqual(titles, [f'Wish {i}' for i in reversed(range(25))])
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('main_feed'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.context['wishes'][0].title, 'Wish 24')
+
+    def test_tag_filter_is_kept_across_pages(self):
+        tag = Tag.objects.create(name='books')
+        for wish in Wish.objects.filter(has_image=True, private=False):
+            wish.tags.add(tag)
+        response = self.client.get(reverse('main_feed'), {'tag': 'books'})
+        self.assertContains(response, 'tag=books')
+
+
+class TagFacetTests(TestCase):
+    """
+    Incremental maintenance of per-scope tag counts.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('bob', password='pw')
+        self.books = Tag.objects.create(name='books')
+        self.games = Tag.objects.create(name='games')
+
+    def counts(self, scope, owner=None):
+        return {t.name: t.wish_count for t in facets.tags_for_scope(scope, owner=owner)}
+
+    def assertMatchesRebuild(self):
+        live = sorted(TagFacet.objects.values_list('scope', 'owner_id', 'tag_id', 'count'))
+        facets.rebuild()
+        rebuilt = sorted(TagFacet.objects.values_list('scope', 'owner_id', 'tag_id', 'count'))
+        self.assertEqual(live, rebuilt)
+
+    def test_counts_follow_tag_and_visibility_changes(self):
+        wish = Wish.objects.create(user=self.user, title='A', image='wish_avatars/a.jpg')
+        wish.tags.add(self.books, self.games)
+        other = Wish.objects.create(user=self.user, title='B', private=True)
+        other.tags.add(self.books)
+
+        self.assertEqual(self.counts(TagFacet.SCOPE_FEED), {'books': 1, 'games': 1})
+        self.assertEqual(self.counts(TagFacet.SCOPE_PRIVATE, self.user), {'books': 2, 'games': 1})
+
+        wish.completed = True
+        wish.save()
+        self.assertEqual(self.counts(TagFacet.SCOPE_FEED), {})
+        self.assertEqual(self.counts(TagFacet.SCOPE_PUBLIC, self.user), {'books': 1, 'games': 1})
+
+        wish.tags.remove(self.games)
+        self.games.wish_set.add(other)
+        self.assertMatchesRebuild()
+
+        self.books.wish_set.clear()
+        other.delete()
+        self.assertEqual(self.counts(TagFacet.SCOPE_PRIVATE, self.user), {})
+        self.assertMatchesRebuild()
+
+    def test_popular_order(self):
+        for i in range(2):
+            Wish.objects.create(user=self.user, title=f'G{i}').tags.add(self.games)
+        Wish.objects.create(user=self.user, title='B').tags.add(self.books)
+        popular = facets.tags_for_scope(TagFacet.SCOPE_PRIVATE, owner=self.user, order='popular')
+        self.assertEqual([t.name for t in popular], ['games', 'books'])
+
+
+class WishlistStatsTests(TestCase):
+    """
+    Per-user wish counts kept by the signal handlers, and their reconciliation.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('bea', password='pw')
+
+    def counts(self, user=None):
+        row = stats.for_user(User.objects.get(pk=(user or self.user).pk))
+        return tuple(getattr(row, counter) for counter in stats.COUNTERS)
+
+    def test_counts_follow_saves_and_deletes(self):
+        self.assertEqual(self.counts(), (0, 0, 0, 0))
+        shown = Wish.objects.create(user=self.user, title='A', image='wish_avatars/a.jpg')
+        hidden = Wish.objects.create(user=self.user, title='B', private=True)
+        self.assertEqual(self.counts(), (2, 0, 1, 0))
+
+        shown.completed = True
+        shown.save()
+        hidden.private = False  # still no image: not on the public list
+        hidden.save(update_fields=['private'])
+        self.assertEqual(self.counts(), (1, 1, 0, 1))
+
+        other = User.objects.create_user('cal', password='pw')
+        hidden.user = other
+        hidden.save()
+        self.assertEqual(self.counts(), (0, 1, 0, 1))
+        self.assertEqual(self.counts(other), (1, 0, 0, 0))
+
+        shown.delete()
+        self.assertEqual(self.counts(), (0, 0, 0, 0))
+        self.assertEqual(stats.reconcile(), 0)
+
+        # The owner's wishes are deleted with them; no row is left behind.
+        other.delete()
+        self.assertFalse(WishlistStats.objects.filter(user_id=other.pk).exists())
+
+    def test_reconcile_corrects_drift(self):
+        Wish.objects.create(user=self.user, title='A', image='wish_avatars/a.jpg')
+        Wish.objects.create(user=self.user, title='B')
+        # Queryset updates send no signals.
+        Wish.objects.filter(title='A').update(completed=True)
+        lost = User.objects.create_user('dan', password='pw')
+        Wish.objects.bulk_create([Wish(user=lost, title='C')])
+
+        out = io.StringIO()
+        call_command('reconcile_wishlist_stats', stdout=out)
+        self.assertIn('Corrected 2 ', out.getvalue())
+        self.assertEqual(self.counts(), (1, 1, 0, 1))
+        self.assertEqual(self.counts(lost), (1, 0, 0, 0))
+        self.assertEqual(stats.reconcile([self.user.pk]), 0)
+
+    def test_bulk_inserts_are_counted(self):
+        stream = io.BytesIO(json.dumps([{'title': 'X'}, {'title': 'Y', 'completed': True}]).encode())
+        importing.import_wishes(self.user, stream, fmt='json')
+        self.assertEqual(self.counts(), (1, 1, 0, 0))
+
+    @override_settings(WISHES_PAGE_CACHE_TIMEOUT=0, WISHES_CARD_CACHE_TIMEOUT=0)
+    def test_pages_show_the_counts(self):
+        for i in range(3):
+            Wish.objects.create(user=self.user, title=f'W{i}', image=f'wish_avatars/{i}.jpg', completed=i == 0)
+        response = self.client.get(reverse('public_wish_list', args=['bea']))
+        self.assertContains(response, '2 wishes, 1 fulfilled')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['stats'].public_total, 3)
+
+
+@override_settings(WISHES_PAGE_CACHE_TIMEOUT=0, WISHES_CARD_CACHE_TIMEOUT=0)
+class PublicWishListQueryTests(TestCase):
+    """
+    public_wish_list runs a fixed number of queries however many wishes it shows.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('carol', password='pw')
+        cls.tags = [Tag.objects.create(name=f'tag{i}') for i in range(3)]
+
+    def add_wishes(self, n):
+        for i in range(n):
+            wish = Wish.objects.create(
+                user=self.owner, title=f'W{i}', image=f'wish_avatars/{i}.jpg', completed=i % 2 == 0,
+            )
+            wish.tags.add(*self.tags)
+
+    def test_query_count_is_independent_of_wish_count(self):
+        url = reverse('public_wish_list', args=[self.owner.username])
+        # owner, wishes, prefetched tags, tag facets
+        self.add_wishes(2)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['active_wishes']), 1)
+        self.assertEqual(len(response.context['completed_wishes']), 1)
+
+        self.add_wishes(10)
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        with self.assertNumQueries(4):
+            self.client.get(url, {'tag': 'tag1'})
+
+
+DB_SESSIONS = 'django.contrib.sessions.backends.db'
+
+
+@override_settings(
+    WISHES_PAGE_CACHE_TIMEOUT=0, WISHES_CARD_CACHE_TIMEOUT=0,
+    SESSION_ENGINE=DB_SESSIONS, WISHES_USER_CACHE_TIMEOUT=0,
+)
+class ViewQueryCountTests(TestCase):
+    """
+    Query-count regression suite for every view in wishes/views.py.
+    List views are exercised with a small and a large data set to prove
+    their cost doesn't grow with the number of wishes rendered.
+    Page and card caching are disabled so the uncached render path is measured,
+    and sessions and users are read from the database (see SessionQueryTests).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('dave', password='pw')
+        cls.tags = [Tag.objects.create(name=f'tag{i}') for i in range(3)]
+        cls.wish = cls.make_wishes(1)[0]
+
+    @classmethod
+    def make_wishes(cls, n):
+        wishes = []
+        for i in range(n):
+            wish = Wish.objects.create(
+                user=cls.owner, title=f'W{i}', image=f'wish_avatars/{i}.jpg', completed=i % 3 == 1,
+            )
+            wish.tags.add(*cls.tags)
+            wishes.append(wish)
+        return wishes
+
+    def login(self):
+        self.client.force_login(self.owner)
+
+    def assertConstantQueries(self, num, url, data=None):
+        with self.assertNumQueries(num):
+            self.client.get(url, data)
+        self.make_wishes(15)
+        with self.assertNumQueries(num):
+            self.client.get(url, data)
+
+    # Anonymous pages
+
+    def test_main_feed(self):
+        # wishes, prefetched tags, tag facets
+        self.assertConstantQueries(3, reverse('main_feed'))
+
+    def test_main_feed_filtered_by_tag(self):
+        self.assertConstantQueries(3, reverse('main_feed'), {'tag': 'tag1'})
+
+    def test_main_feed_more(self):
+        # wishes, prefetched tags
+        self.assertConstantQueries(2, reverse('main_feed_more'))
+
+    def test_public_wish_list(self):
+        # owner, wishes, prefetched tags, tag facets
+        self.assertConstantQueries(4, reverse('public_wish_list', args=[self.owner.username]))
+
+    def test_public_wish_detail(self):
+        # wish with its owner, prefetched tags
+        with self.assertNumQueries(2):
+            self.client.get(reverse('public_wish_detail', args=[self.owner.username, self.wish.pk]))
+
+    def test_register_get(self):
+        with self.assertNumQueries(0):
+            self.client.get(reverse('register'))
+
+    # Authenticated pages: every request starts with session + user lookups
+
+    def test_wish_list(self):
+        self.login()
+        # session, user, wishes, prefetched tags
+        self.assertConstantQueries(4, reverse('wish_list'))
+
+    def test_add_wish_get(self):
+        self.login()
+        with self.assertNumQueries(2):
+            self.client.get(reverse('add_wish'))
+
+    def test_edit_wish_get(self):
+        self.login()
+        # session, user, wish, current tags for the form
+        with self.assertNumQueries(4):
+            self.client.get(reverse('edit_wish', args=[self.wish.pk]))
+
+    def test_delete_wish_get(self):
+        self.login()
+        with self.assertNumQueries(3):
+            self.client.get(reverse('delete_wish', args=[self.wish.pk]))
+
+    def test_profile_get(self):
+        self.login()
+        # session, user, wishlist stats
+        with self.assertNumQueries(3):
+            self.client.get(reverse('profile'))
+
+    def test_add_wish_post(self):
+        self.login()
+        # includes the wishlist stats update and, as TestCase runs inside a
+        # transaction, the savepoints around the view's block and Wish.save()
+        with self.assertNumQueries(20):
+            self.client.post(reverse('add_wish'), {'title': 'New', 'tags_input': 'tag0, fresh'})
+
+    def test_edit_wish_post(self):
+        self.login()
+        # the tag change is covered by the save's updated_at: one wish UPDATE
+        with self.assertNumQueries(17):
+            self.client.post(reverse('edit_wish', args=[self.wish.pk]), {'title': 'Renamed', 'tags_input': 'tag0'})
+
+    def test_delete_wish_post(self):
+        self.login()
+        # includes the change feed's tombstone, the wishlist stats update and
+        # one facet delete and update covering all three scopes
+        with self.assertNumQueries(12):
+            self.client.post(reverse('delete_wish', args=[self.wish.pk]))
+
+    def test_profile_post(self):
+        self.login()
+        # session, user, uniqueness check, old username (page cache invalidation), update
+        with self.assertNumQueries(5):
+            self.client.post(reverse('profile'), {'username': 'dave2'})
+
+    def test_register_post(self):
+        with self.assertNumQueries(10):
+            self.client.post(reverse('register'), {
+                'username': 'erin', 'password1': 'a-Long-pass-123', 'password2': 'a-Long-pass-123',
+            })
+
+
+class PageCacheTests(TestCase):
+    """
+    Versioned caching of anonymous public pages.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('frank', password='pw')
+        self.wish = Wish.objects.create(user=self.owner, title='Kettle', image='wish_avatars/k.jpg')
+        self.list_url = reverse('public_wish_list', args=[self.owner.username])
+
+    def test_repeat_anonymous_request_is_served_from_cache(self):
+        self.client.get(self.list_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url)
+        self.assertContains(response, 'Kettle')
+
+    def test_wish_and_tag_changes_invalidate_pages(self):
+        self.client.get(reverse('main_feed'))
+        self.client.get(self.list_url)
+
+        # Versions are bumped when the write commits.
+        self.wish.title = 'Teapot'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wish.save()
+        self.assertContains(self.client.get(reverse('main_feed')), 'Teapot')
+        self.assertContains(self.client.get(self.list_url), 'Teapot')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wish.tags.add(Tag.objects.create(name='kitchen'))
+        self.assertContains(self.client.get(self.list_url), 'kitchen')
+
+    def test_versions_are_bumped_on_commit(self):
+        versions = [caching.FEED, caching.owner_version(self.owner.username)]
+        before = caching.get_versions(versions)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.wish.title = 'Teapot'
+            self.wish.save()
+            # A page rendered now still shows the old title: it must not be
+            # cached under new versions.
+            self.assertEqual(caching.get_versions(versions), before)
+        for callback in callbacks:
+            callback()
+        after = caching.get_versions(versions)
+        self.assertTrue(all(new > old for new, old in zip(after, before)))
+
+    def test_conditional_request_gets_not_modified(self):
+        response = self.client.get(self.list_url)
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wish.delete()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.get(self.list_url)
+        self.client.force_login(self.owner)
+        response = self.client.get(self.list_url)
+        self.assertTrue(response.context['is_owner'])
+        self.assertNotIn('ETag', response)
+
+
+CACHED_DB_SESSIONS = 'django.contrib.sessions.backends.cached_db'
+SIGNED_COOKIE_SESSIONS = 'django.contrib.sessions.backends.signed_cookies'
+
+
+@override_settings(WISHES_CARD_CACHE_TIMEOUT=0)
+class SessionQueryTests(TestCase):
+    """
+    Session and user lookups under each session engine, with and without the user cache.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('olga', password='pw')
+        Wish.objects.create(user=self.user, title='Lamp', image='wish_avatars/l.jpg')
+
+    def anonymous_client(self):
+        # A visitor whose session holds no login, e.g. one whose login ended.
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session['seen_intro'] = True
+        session.save()
+        client = Client()
+        client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        return client
+
+    def test_anonymous_feed_session_queries(self):
+        url = reverse('main_feed')
+        for engine, expected in ((DB_SESSIONS, 1), (CACHED_DB_SESSIONS, 0), (SIGNED_COOKIE_SESSIONS, 0)):
+            with self.subTest(engine=engine), override_settings(SESSION_ENGINE=engine):
+                client = self.anonymous_client()
+                client.get(url)  # fills the page cache
+                # Only the session lookup is left once the page is cached.
+                with self.assertNumQueries(expected):
+                    response = client.get(url)
+                self.assertContains(response, 'Lamp')
+
+    def test_authenticated_session_and_user_queries(self):
+        url = reverse('wish_list')
+        profiles = (
+            (DB_SESSIONS, 0, 4),  # session, user, wishes, prefetched tags
+            (CACHED_DB_SESSIONS, 300, 2),
+            (SIGNED_COOKIE_SESSIONS, 300, 2),
+        )
+        for engine, user_timeout, expected in profiles:
+            with self.subTest(engine=engine), override_settings(
+                SESSION_ENGINE=engine, WISHES_USER_CACHE_TIMEOUT=user_timeout,
+            ):
+                client = Client()
+                client.force_login(self.user)
+                client.get(url)  # caches the user
+                with self.assertNumQueries(expected):
+                    response = client.get(url)
+                self.assertContains(response, 'Lamp')
+
+    def test_user_changes_are_not_served_from_cache(self):
+        url = reverse('wish_list')
+        self.client.force_login(self.user)
+        self.client.get(url)
+
+        self.user.username = 'olga2'
+        self.user.save()
+        self.assertContains(self.client.get(url), 'olga2')
+
+        # A new password ends the other sessions, cached user or not.
+        self.user.set_password('new-pw')
+        self.user.save()
+        self.assertRedirects(self.client.get(url), f"{reverse('login')}?next={url}")
+
+
+def make_png(size=(8, 8)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ImageServerHandler(BaseHTTPRequestHandler):
+    """
+    Serves canned responses for the image download tests.
+    """
+    routes = {
+        '/ok.png': (200, 'image/png', make_png()),
+        '/page.png': (200, 'text/html', b'<html></html>'),
+        '/fake.png': (200, 'image/png', b'definitely not a png'),
+        '/big.png': (200, 'image/png', make_png((400, 400))),
+        '/down.png': (503, 'text/plain', b'try later'),
+    }
+
+    def do_GET(self):
+        if self.path == '/truncated.png':
+            # A chunked body cut off in the middle of its only chunk.
+            body = make_png()
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write(f'{len(body):x}\r\n'.encode() + body[:20])
+            return
+        if self.path.startswith('/slow'):
+            time.sleep(0.3)
+            self.path = '/ok.png'
+        status, content_type, body = self.routes.get(self.path, (404, 'text/plain', b''))
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalHTTPServerMixin:
+    """
+    Runs ImageServerHandler on a random local port for the test class
+    and points MEDIA_ROOT and the fetch cache at a throwaway directory.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), ImageServerHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(
+            MEDIA_ROOT=cls.media_root, WISHES_FETCH_CACHE_DIR=os.path.join(cls.media_root, 'fetch_cache'),
+        )
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+
+@override_settings(WISHES_IMAGE_MAX_BYTES=1024, WISHES_IMAGE_FETCH_RETRY_DELAY=0)
+class ImageFetchTaskTests(LocalHTTPServerMixin, TestCase):
+    """
+    Background image-by-URL ingestion.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('gina', password='pw')
+        self.client.force_login(self.user)
+
+    def add_wish(self, path):
+        self.client.post(reverse('add_wish'), {'title': 'Lamp', 'image_url': self.base_url + path})
+        return Wish.objects.get(title='Lamp')
+
+    def test_wish_is_saved_pending_and_worker_attaches_image(self):
+        wish = self.add_wish('/ok.png')
+        self.assertEqual(wish.image_status, Wish.IMAGE_PENDING)
+        self.assertFalse(wish.has_image)
+
+        self.assertEqual(tasks.process_pending(), 1)
+        wish.refresh_from_db()
+        self.assertTrue(wish.has_image)
+        self.assertEqual(wish.image_status, '')
+        self.assertRegex(wish.image.name, r'^blobs/.+\.png$')
+        self.assertEqual(wish.image_tasks.get().status, ImageFetchTask.STATUS_DONE)
+        self.assertEqual(set(wish.derivatives), {'thumb', 'thumb2x', 'card', 'card2x'})
+
+    def test_edits_made_during_the_download_are_kept(self):
+        wish = self.add_wish('/ok.png')
+        download = tasks.download_image
+
+        def edit_then_download(url):
+            Wish.objects.filter(pk=wish.pk).update(title='Renamed')
+            edited = Wish.objects.get(pk=wish.pk)
+            edited.private = True
+            edited.save()
+            return download(url)
+
+        with mock.patch.object(tasks, 'download_image', edit_then_download):
+            tasks.process_pending()
+        wish.refresh_from_db()
+        self.assertEqual((wish.title, wish.private, wish.has_image), ('Renamed', True, True))
+        self.assertEqual(stats.reconcile(), 0)  # counted as private
+
+    def test_content_is_sniffed_and_size_capped(self):
+        for path in ['/page.png', '/fake.png', '/big.png']:
+            with self.subTest(path=path):
+                Wish.objects.filter(title='Lamp').delete()
+                wish = self.add_wish(path)
+                tasks.process_pending()
+                wish.refresh_from_db()
+                self.assertEqual(wish.image_status, Wish.IMAGE_FAILED)
+                self.assertEqual(wish.image_tasks.get().status, ImageFetchTask.STATUS_FAILED)
+
+    def test_transient_errors_are_retried_then_given_up(self):
+        wish = self.add_wish('/down.png')
+        for _ in range(3):
+            tasks.process_pending()
+        task = wish.image_tasks.get()
+        self.assertEqual(task.attempts, 3)
+        self.assertEqual(task.status, ImageFetchTask.STATUS_FAILED)
+
+    def test_truncated_responses_are_retried(self):
+        wish = self.add_wish('/truncated.png')
+        self.assertEqual(tasks.process_pending(), 1)
+        task = wish.image_tasks.get()
+        self.assertEqual((task.status, task.attempts), (ImageFetchTask.STATUS_PENDING, 1))
+        self.assertTrue(task.last_error.startswith('ProtocolError: IncompleteRead'))
+
+    def test_claiming_counts_as_an_attempt(self):
+        wish = self.add_wish('/ok.png')
+        # The worker dies during the download, every time.
+        for attempts in range(1, 4):
+            [task] = tasks.claim_tasks(10)
+            self.assertEqual(task.attempts, attempts)
+            ImageFetchTask.objects.filter(pk=task.pk).update(locked_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(tasks.claim_tasks(10), [])
+        self.assertEqual(wish.image_tasks.get().status, ImageFetchTask.STATUS_FAILED)
+        wish.refresh_from_db()
+        self.assertEqual(wish.image_status, Wish.IMAGE_FAILED)
+
+    def test_async_worker_overlaps_downloads(self):
+        for i in range(4):
+            self.client.post(reverse('add_wish'), {'title': f'Slow {i}', 'image_url': f'{self.base_url}/slow{i}.png'})
+        self.client.post(reverse('add_wish'), {'title': 'Broken', 'image_url': f'{self.base_url}/fake.png'})
+
+        start = time.monotonic()
+        self.assertEqual(async_to_sync(tasks.aprocess_pending)(limit=10, concurrency=5), 5)
+        # Four 0.3 s downloads in parallel, not one after another.
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(Wish.objects.filter(title__startswith='Slow', has_image=True).count(), 4)
+        self.assertEqual(Wish.objects.get(title='Broken').image_status, Wish.IMAGE_FAILED)
+
+
+class ImageDerivativeTests(LocalHTTPServerMixin, TestCase):
+    """
+    Thumbnail/WebP derivatives of uploaded images.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('hank', password='pw')
+        self.client.force_login(self.user)
+
+    def upload(self, title, size=(300, 200)):
+        image = SimpleUploadedFile('photo.png', make_png(size), content_type='image/png')
+        self.client.post(reverse('add_wish'), {'title': title, 'image_file': image})
+        return Wish.objects.get(title=title)
+
+    def test_upload_builds_sized_jpeg_and_webp(self):
+        wish = self.upload('Camera')
+        with default_storage.open(wish.derivatives['card']['webp']) as f:
+            derived = Image.open(f)
+            self.assertEqual((derived.format, derived.size), ('WEBP', (480, 360)))
+        with default_storage.open(wish.derivatives['thumb']['jpeg']) as f:
+            self.assertEqual(Image.open(f).size, (64, 64))
+
+    def test_picture_tag_uses_derivatives_with_fallback(self):
+        template = Template("{% load wish_images %}{% wish_picture wish 'thumb' 'avatar' %}")
+        wish = self.upload('Radio')
+        html = template.render(Context({'wish': wish}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(wish.derivatives['thumb2x']['jpeg'].split('/')[-1] + ' 2x', html)
+
+        wish.derivatives = {}
+        html = template.render(Context({'wish': wish}))
+        self.assertIn(f'src="{wish.image.url}"', html)
+
+
+class KeepAliveImageHandler(BaseHTTPRequestHandler):
+    """
+    HTTP/1.1 image server recording each request as (path, client port,
+    If-None-Match) and the peak number of requests served at once.
+    """
+    protocol_version = 'HTTP/1.1'
+    body = make_png()
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.client_address[1], self.headers.get('If-None-Match')))
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            headers = {'Content-Type': 'image/png'}
+            status, body = 200, self.body
+            if self.path.startswith('/slow'):
+                time.sleep(0.2)
+                headers['Cache-Control'] = 'no-store'
+            elif self.path == '/fresh.png':
+                headers['Cache-Control'] = 'max-age=60'
+            elif self.path == '/etag.png':
+                headers.update({'Cache-Control': 'no-cache', 'ETag': '"v1"'})
+                if self.headers.get('If-None-Match') == '"v1"':
+                    status, body = 304, b''
+            elif self.path == '/moved.png':
+                status, body = 302, b''
+                headers['Location'] = '/fresh.png'
+            elif self.path == '/loop.png':
+                status, body = 302, b''
+                headers['Location'] = '/loop.png'
+            elif self.path.startswith('/sized'):
+                headers['Cache-Control'] = 'max-age=60'
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchClientTests(TestCase):
+    """
+    The shared image fetch client: connection reuse, response cache, limits.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveImageHandler)
+        cls.server.lock = threading.Lock()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests, self.server.active, self.server.peak = [], 0, 0
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+    def make_client(self, max_per_host=4, max_bytes=10 ** 6):
+        pool = fetching.ConnectionPool(max_per_host=max_per_host)
+        self.addCleanup(pool.close)
+        return fetching.HTTPClient(pool, fetching.ResponseCache(self.cache_dir, max_bytes))
+
+    def fetch(self, client, path):
+        fetched = client.fetch(self.base_url + path)
+        with fetched.file:
+            return fetched.file.read(), fetched.from_cache
+
+    def test_connections_are_kept_alive(self):
+        client = self.make_client()
+        for i in range(3):
+            self.assertEqual(self.fetch(client, f'/slow{i}.png'), (KeepAliveImageHandler.body, False))
+        self.assertEqual(len({port for _, port, _ in self.server.requests}), 1)
+
+    def test_fresh_responses_are_served_from_the_cache(self):
+        client = self.make_client()
+        self.assertEqual(self.fetch(client, '/fresh.png'), (KeepAliveImageHandler.body, False))
+        self.assertEqual(self.fetch(client, '/fresh.png'), (KeepAliveImageHandler.body, True))
+        # Another process (a new client) finds it on disk.
+        self.assertEqual(self.fetch(self.make_client(), '/fresh.png'), (KeepAliveImageHandler.body, True))
+        self.assertEqual([path for path, _, _ in self.server.requests], ['/fresh.png'])
+
+        # Redirects are followed; the cache is keyed by the requested URL.
+        self.assertEqual(self.fetch(client, '/moved.png'), (KeepAliveImageHandler.body, False))
+        self.assertEqual(self.fetch(client, '/moved.png'), (KeepAliveImageHandler.body, True))
+
+    def test_redirect_loops_are_permanent_errors(self):
+        with self.assertRaises(fetching.TooManyRedirects):
+            self.make_client().fetch(self.base_url + '/loop.png')
+        self.assertEqual(len(self.server.requests), fetching.MAX_REDIRECTS + 1)
+
+        user = User.objects.create_user('rex', password='pw')
+        wish = Wish.objects.create(user=user, title='Loop')
+        tasks.enqueue_image_fetch(wish, f'{self.base_url}/loop.png')
+        with override_settings(WISHES_FETCH_CACHE_DIR=self.cache_dir):
+            tasks.process_pending()
+        self.assertEqual(wish.image_tasks.get().status, ImageFetchTask.STATUS_FAILED)  # not retried
+
+    def test_stale_responses_are_revalidated(self):
+        client = self.make_client()
+        self.assertEqual(self.fetch(client, '/etag.png'), (KeepAliveImageHandler.body, False))
+        self.assertEqual(self.fetch(client, '/etag.png'), (KeepAliveImageHandler.body, True))
+        self.assertEqual(self.server.requests[1][0::2], ('/etag.png', '"v1"'))
+
+    def test_connections_per_host_are_limited(self):
+        client = self.make_client(max_per_host=2)
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            bodies = list(pool.map(lambda i: self.fetch(client, f'/slow{i}.png')[0], range(6)))
+        self.assertEqual(bodies, [KeepAliveImageHandler.body] * 6)
+        self.assertEqual(self.server.peak, 2)
+
+    def test_least_recently_used_entries_are_trimmed(self):
+        size = len(KeepAliveImageHandler.body)
+        # Room for two bodies: storing a third drops the least recently used.
+        client = self.make_client(max_bytes=size * 3 - 1)
+        for path in ['/sized1.png', '/sized2.png', '/sized1.png', '/sized3.png']:
+            self.fetch(client, path)
+            time.sleep(0.01)  # distinct access times
+        self.assertTrue(self.fetch(client, '/sized1.png')[1])
+        self.assertEqual(self.fetch(client, '/sized2.png')[1], False)
+
+    def test_image_tasks_share_the_cache(self):
+        user = User.objects.create_user('otto', password='pw')
+        with override_settings(WISHES_FETCH_CACHE_DIR=self.cache_dir, MEDIA_ROOT=self.cache_dir):
+            for title in ('First', 'Second'):
+                wish = Wish.objects.create(user=user, title=title)
+                tasks.enqueue_image_fetch(wish, f'{self.base_url}/fresh.png')
+            self.assertEqual(tasks.process_pending(), 2)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(Wish.objects.filter(has_image=True).count(), 2)
+
+
+@override_settings(WISHES_BLOB_GRACE_SECONDS=0)
+class MediaStorageTests(LocalHTTPServerMixin, TestCase):
+    """
+    Content-addressed media files: stored once, counted, deleted when unused.
+    """
+
+    def setUp(self):
+        # Files outlive the rolled back MediaBlob rows of earlier tests.
+        shutil.rmtree(os.path.join(self.media_root, 'blobs'), ignore_errors=True)
+        self.user = User.objects.create_user('mona', password='pw')
+        self.client.force_login(self.user)
+
+    def upload(self, title, png):
+        image = SimpleUploadedFile('photo.png', png, content_type='image/png')
+        self.client.post(reverse('add_wish'), {'title': title, 'image_file': image})
+        return Wish.objects.get(title=title)
+
+    def references(self, name):
+        return MediaBlob.objects.get(name=name).references
+
+    def test_same_image_is_stored_once_and_deleted_with_its_last_wish(self):
+        png = make_png((120, 90))
+        first, second = self.upload('Kite', png), self.upload('Kite again', png)
+        fetched = Wish.objects.create(user=self.user, title='Kite by URL')
+        tasks.enqueue_image_fetch(fetched, f'{self.base_url}/ok.png')
+        tasks.process_pending()
+        fetched.refresh_from_db()
+
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(second.derivatives, first.derivatives)
+        self.assertNotEqual(fetched.image.name, name)
+        self.assertEqual(self.references(name), 2)
+        # All three are red rectangles: their derivatives are the same files.
+        thumb = first.derivatives['thumb']['webp']
+        self.assertEqual(fetched.derivatives['thumb']['webp'], thumb)
+        self.assertEqual(self.references(thumb), 3)
+        blob_files = [f for _, _, files in os.walk(os.path.join(self.media_root, 'blobs')) for f in files]
+        # Two originals and 8 derivatives; no temporary files left behind.
+        self.assertEqual(len(blob_files), 10)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('delete_wish', args=[first.pk]))
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self.references(name), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('delete_wish', args=[second.pk]))
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertTrue(default_storage.exists(fetched.image.name))
+        self.assertTrue(default_storage.exists(thumb))
+        self.assertEqual(self.references(thumb), 1)
+
+    def test_replaced_image_is_released(self):
+        wish = self.upload('Vase', make_png((50, 50)))
+        old = wish.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('edit_wish', args=[wish.pk]), {
+                'title': 'Vase', 'image_file': SimpleUploadedFile('new.png', make_png((60, 60))),
+            })
+        wish.refresh_from_db()
+        self.assertNotEqual(wish.image.name, old)
+        self.assertFalse(default_storage.exists(old))
+        self.assertEqual(self.references(wish.image.name), 1)
+
+    def test_recently_used_and_recorded_files_are_kept(self):
+        orphan = default_storage.save('stray.png', ContentFile(make_png((30, 30))))
+        self.assertEqual(blobs.collect_orphans(grace=3600), 0)
+        self.assertEqual(blobs.collect_orphans(), 1)
+        self.assertFalse(default_storage.exists(orphan))
+
+        wish = self.upload('Clock', make_png((40, 40)))
+        wish_count = len(blobs.wish_files(wish.image.name, wish.derivatives))
+        blobs.release([wish.image.name])  # as if the wish had let go of it
+        self.assertEqual(blobs.collect(grace=3600), 0)
+        self.assertEqual(blobs.collect_orphans(), 0)
+        self.assertEqual(blobs.collect(), 1)
+        self.assertEqual(MediaBlob.objects.count(), wish_count - 1)
+
+    def test_files_are_hashed_and_written_in_chunks(self):
+        with tempfile.TemporaryFile() as tmp:
+            chunk = os.urandom(1024 * 1024)
+            for _ in range(8):
+                tmp.write(chunk)
+            tracemalloc.start()
+            name = default_storage.save('big.bin', File(tmp))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        self.assertEqual(default_storage.size(name), 8 * 1024 * 1024)
+        self.assertLess(peak, 2 * 1024 * 1024)
+        self.assertEqual(
+            self.client.get(f'/media/{name}').headers['Cache-Control'], 'public, max-age=31536000, immutable',
+        )
+
+
+@skipIf(ThreadedMotoServer is None, 'needs django-storages[s3] and moto[server]')
+class S3MediaStorageTests(TestCase):
+    """
+    ContentAddressedS3Storage against a local S3-compatible server.
+    """
+    bucket = 'wishes-media'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # moto's request log
+        cls.server = ThreadedMotoServer('127.0.0.1', 0, verbose=False)
+        cls.server.start()
+        host, port = cls.server.get_host_and_port()
+        options = {
+            'endpoint_url': f'http://{host}:{port}', 'region_name': 'us-east-1',
+            'access_key': 'test', 'secret_key': 'test',
+        }
+        cls.client_s3 = boto3.client(
+            's3', endpoint_url=options['endpoint_url'], region_name=options['region_name'],
+            aws_access_key_id='test', aws_secret_access_key='test',
+        )
+        cls.client_s3.create_bucket(Bucket=cls.bucket)
+        cls.storage = ContentAddressedS3Storage(bucket_name=cls.bucket, **options)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def keys(self):
+        return [entry['Key'] for entry in self.client_s3.list_objects(Bucket=self.bucket).get('Contents', [])]
+
+    def test_same_bytes_are_uploaded_once(self):
+        png = make_png((20, 20))
+        name = self.storage.save('wish_avatars/a.png', ContentFile(png))
+        keys = self.keys()
+        modified = self.storage.get_modified_time(name)
+        time.sleep(1.1)  # S3 times have whole seconds
+        self.assertEqual(self.storage.save('elsewhere/b.PNG', ContentFile(png)), name)
+
+        self.assertIn(name, keys)
+        self.assertEqual(self.keys(), keys)
+        head = self.client_s3.head_object(Bucket=self.bucket, Key=name)
+        self.assertEqual(head['CacheControl'], 'public, max-age=31536000, immutable')
+        self.assertEqual(head['ContentType'], 'image/png')
+        # Reuse refreshed the modification time that garbage collection goes by.
+        self.assertGreater(self.storage.get_modified_time(name), modified)
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), png)
+
+    def test_orphans_are_collected(self):
+        kept = self.storage.save('kept.png', ContentFile(make_png((10, 10))))
+        blobs.retain([kept])
+        orphan = self.storage.save('orphan.png', ContentFile(make_png((11, 11))))
+        self.assertEqual(blobs.collect_orphans(grace=0, storage=self.storage), 1)
+        self.assertIn(kept, self.keys())
+        self.assertNotIn(orphan, self.keys())
+
+
+@override_settings(WISHES_USER_CACHE_TIMEOUT=0)
+class TagSavingTests(TestCase):
+    """
+    Bulk tag resolution and diff-based tag updates.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('iris', password='pw')
+        self.client.force_login(self.user)
+
+    def test_tag_count_does_not_change_query_count(self):
+        def post(title, n):
+            names = ', '.join(f'{title}-{i}' for i in range(n))
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post(reverse('add_wish'), {'title': title, 'tags_input': names})
+            return len(ctx)
+
+        post('first', 1)  # the user's first wish also creates their WishlistStats row
+        self.assertEqual(post('few', 2), post('many', 15))
+        self.assertEqual(Wish.objects.get(title='many').tags.count(), 15)
+
+    def test_unchanged_tags_are_not_rewritten(self):
+        wish = Wish.objects.create(user=self.user, title='Mug')
+        wish.tags.add(Tag.objects.create(name='kitchen'), Tag.objects.create(name='gift'))
+        url = reverse('edit_wish', args=[wish.pk])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(url, {'title': 'Mug', 'tags_input': 'gift, kitchen, gift'})
+        self.assertFalse([q for q in ctx.captured_queries if 'wishes_wish_tags' in q['sql'] and 'SELECT' not in q['sql']])
+
+        self.client.post(url, {'title': 'Mug', 'tags_input': 'gift, new'})
+        self.assertEqual(sorted(wish.tags.values_list('name', flat=True)), ['gift', 'new'])
+
+    def test_tags_are_saved_with_the_wish(self):
+        wish = Wish.objects.create(user=self.user, title='Mug')
+        wish.tags.add(Tag.objects.create(name='kitchen'))
+        before = Wish.objects.get(pk=wish.pk).updated_at
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('edit_wish', args=[wish.pk]), {'title': 'Mug', 'tags_input': 'gift'})
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "wishes_wish" ')]
+        self.assertEqual(len(updates), 1)
+        self.assertGreater(Wish.objects.get(pk=wish.pk).updated_at, before)
+        self.assertEqual(list(wish.tags.values_list('name', flat=True)), ['gift'])
+
+
+@override_settings(WISHES_PAGE_CACHE_TIMEOUT=0)
+class WishAPITests(TestCase):
+    """
+    REST API: visibility, cursor pagination, sparse fieldsets and bulk writes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('jack', password='pw')
+        cls.other = User.objects.create_user('kate', password='pw')
+        cls.tag = Tag.objects.create(name='shared')
+        for i in range(5):
+            Wish.objects.create(user=cls.owner, title=f'Public {i}').tags.add(cls.tag)
+        Wish.objects.create(user=cls.owner, title='Secret', private=True)
+
+    def test_list_hides_other_users_private_wishes_and_paginates(self):
+        response = self.client.get('/api/wishes/', {'page_size': 3})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertNotIn('Secret', [w['title'] for w in response.data['results']])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([w['title'] for w in response.data['results']], ['Public 1', 'Public 0'])
+        self.assertIsNone(response.data['next'])
+
+        self.client.force_login(self.owner)
+        response = self.client.get('/api/wishes/', {'mine': 'true'})
+        self.assertIn('Secret', [w['title'] for w in response.data['results']])
+
+    def test_list_runs_constant_queries(self):
+        # wishes (with users), prefetched tags
+        with self.assertNumQueries(2):
+            self.client.get('/api/wishes/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/wishes/', {'fields': 'id,title'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+
+    def test_only_owner_can_modify(self):
+        wish = Wish.objects.get(title='Public 0')
+        self.client.force_login(self.other)
+        response = self.client.patch(f'/api/wishes/{wish.pk}/', {'title': 'Hijacked'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_create_update_delete(self):
+        self.client.force_login(self.other)
+        mine = Wish.objects.create(user=self.other, title='Old')
+        doomed = Wish.objects.create(user=self.other, title='Doomed')
+        not_mine = Wish.objects.filter(user=self.owner).first()
+
+        payload = {
+            'create': [
+                {'title': f'Bulk {i}', 'tags_input': 'shared, bulk', 'price': '9.99', 'price_currency': 'EUR'}
+                for i in range(10)
+            ],
+            'update': [{'id': mine.pk, 'title': 'New', 'tags_input': 'bulk'}],
+            'delete': [doomed.pk, not_mine.pk],
+        }
+        response = self.client.post('/api/wishes/bulk/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(response.data['created']), 10)
+        self.assertEqual(response.data['created'][0]['price_currency'], 'EUR')
+        self.assertEqual(response.data['deleted'], [doomed.pk])
+        self.assertTrue(Wish.objects.filter(pk=not_mine.pk).exists())
+        self.assertEqual(Wish.objects.filter(tags__name='bulk', user=self.other).count(), 11)
+
+        counts = {t.name: t.wish_count for t in facets.tags_for_scope(TagFacet.SCOPE_PRIVATE, owner=self.other)}
+        self.assertEqual(counts, {'shared': 10, 'bulk': 11})
+
+    def test_bulk_is_all_or_nothing(self):
+        self.client.force_login(self.other)
+        payload = {'create': [{'title': 'Fine'}, {'title': ''}], 'update': [{'id': 999999, 'title': 'x'}]}
+        response = self.client.post('/api/wishes/bulk/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'create', 'update'})
+        self.assertFalse(Wish.objects.filter(title='Fine').exists())
+
+
+@override_settings(WISHES_PAGE_CACHE_TIMEOUT=0)
+class SearchTests(TestCase):
+    """
+    Full-text search over titles, descriptions and tag names.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('liam', password='pw')
+        cls.lamp = Wish.objects.create(user=cls.user, title='Desk lamp', image='wish_avatars/l.jpg')
+        cls.book = Wish.objects.create(
+            user=cls.user, title='Cookbook', description='Recipes for a brass lamp dinner', image='wish_avatars/b.jpg'
+        )
+        cls.mug = Wish.objects.create(user=cls.user, title='Mug', image='wish_avatars/m.jpg')
+        cls.mug.tags.add(Tag.objects.create(name='kitchen'))
+        Wish.objects.create(user=cls.user, title='Secret lamp', image='wish_avatars/s.jpg', private=True)
+
+    def feed_titles(self, query, **params):
+        response = self.client.get(reverse('main_feed'), {'q': query, **params})
+        return [wish.title for wish in response.context['wishes']]
+
+    def test_ranks_title_matches_first_and_hides_private(self):
+        self.assertEqual(self.feed_titles('lamp'), ['Desk lamp', 'Cookbook'])
+
+    def test_prefix_and_tag_matches(self):
+        self.assertEqual(self.feed_titles('cookb'), ['Cookbook'])
+        self.assertEqual(self.feed_titles('kitch'), ['Mug'])
+        self.assertEqual(self.feed_titles('lamp" * ('), ['Desk lamp', 'Cookbook'])
+
+    def test_index_follows_edits_tag_renames_and_deletes(self):
+        self.lamp.title = 'Floor light'
+        self.lamp.save()
+        self.assertEqual(self.feed_titles('lamp'), ['Cookbook'])
+
+        Tag.objects.filter(name='kitchen').update(name='x')  # bypasses signals
+        tag = Tag.objects.get(name='x')
+        tag.name = 'pantry'
+        tag.save()
+        self.assertEqual(self.feed_titles('pantry'), ['Mug'])
+
+        self.mug.tags.clear()
+        self.assertEqual(self.feed_titles('pantry'), [])
+        self.book.delete()
+        self.assertEqual(self.feed_titles('lamp'), [])
+
+    def test_results_are_paginated(self):
+        for i in range(25):
+            Wish.objects.create(user=self.user, title=f'Lamp {i}', image='wish_avatars/x.jpg')
+        response = self.client.get(reverse('main_feed'), {'q': 'lamp'})
+        self.assertEqual(len(response.context['wishes']), 20)
+        self.assertEqual(response.context['next_page'], 2)
+
+        response = self.client.get(reverse('main_feed_more'), {'q': 'lamp', 'page': 2})
+        self.assertEqual(len(response.context['wishes']), 7)
+        self.assertIsNone(response.context['next_page'])
+
+    def test_huge_page_numbers_are_capped(self):
+        # An uncapped page would overflow SQLite's OFFSET and fail the query.
+        for page in ['99999999999999999999', '-5']:
+            with self.subTest(page=page):
+                response = self.client.get(reverse('main_feed'), {'q': 'lamp', 'page': page})
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNone(response.context['next_page'])
+
+    def test_public_list_search_uses_fixed_queries(self):
+        url = reverse('public_wish_list', args=['liam'])
+        # owner, tag facets, ranked ids, wishes, prefetched tags
+        with self.assertNumQueries(5):
+            response = self.client.get(url, {'q': 'lamp'})
+        self.assertEqual([w.title for w in response.context['wishes']], ['Desk lamp', 'Cookbook'])
+
+    def test_index_is_scanned_once(self):
+        for i in range(10):
+            Wish.objects.create(user=self.user, title=f'Lamp {i}', image='wish_avatars/x.jpg')
+        with CaptureQueriesContext(connection) as ctx:
+            found, has_more = search.search('lamp', Wish.objects.filter(private=False), limit=5)
+        self.assertEqual(len(found), 5)
+        self.assertTrue(has_more)
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertEqual(sql.count(' MATCH '), 1)
+
+    def test_rebuild_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(self.feed_titles('lamp'), [])
+        self.assertEqual(search.rebuild_index(), 4)
+        self.assertEqual(self.feed_titles('lamp'), ['Desk lamp', 'Cookbook'])
+
+
+@override_settings(WISHES_PAGE_CACHE_TIMEOUT=0, WISHES_CARD_CACHE_TIMEOUT=0)
+class SeedAndBenchmarkTests(TestCase):
+    """
+    The seed_wishes data generator and the view benchmark harness.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(
+            MEDIA_ROOT=cls.media_root, WISHES_FETCH_CACHE_DIR=os.path.join(cls.media_root, 'fetch_cache'),
+        )
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_seed_keeps_denormalized_data_consistent(self):
+        created = seeding.seed(users=3, wishes_per_user=10, tags=8, image_files=2)
+        self.assertEqual((created['users'], created['wishes']), (3, 30))
+        self.assertEqual(Wish.tags.through.objects.count(), created['tag_links'])
+
+        counts = set(TagFacet.objects.values_list('scope', 'owner_id', 'tag_id', 'count'))
+        facets.rebuild()
+        self.assertEqual(set(TagFacet.objects.values_list('scope', 'owner_id', 'tag_id', 'count')), counts)
+
+        wish = Wish.objects.filter(has_image=True).first()
+        self.assertTrue(default_storage.exists(wish.derivatives['thumb']['webp']))
+        self.assertIn(wish, search.search(wish.title, Wish.objects.all(), limit=100)[0])
+
+    def test_benchmark_reports_latency_queries_and_memory(self):
+        seeding.seed(users=2, wishes_per_user=5, tags=4, image_ratio=1, private_ratio=0, image_files=1)
+        user, wish = benchmarks.pick_targets()
+        results = benchmarks.run(
+            benchmarks.default_scenarios(user, wish), iterations=3, only=['main_feed', 'add_wish']
+        )
+        self.assertEqual(set(results), {'main_feed', 'add_wish'})
+        self.assertEqual(results['main_feed']['queries'], 3)
+        self.assertLessEqual(results['main_feed']['p50_ms'], results['main_feed']['p95_ms'])
+        self.assertGreater(results['add_wish']['peak_memory_kb'], 0)
+        # Warm-up, query capture and memory pass, then the timed iterations.
+        self.assertEqual(Wish.objects.filter(title__startswith='Benchmark wish').count(), 3 + 3)
+
+        changes = benchmarks.compare(results, {'main_feed': dict(results['main_feed'], queries=2)})
+        self.assertEqual(changes['main_feed']['queries'], 0.5)
+
+
+@override_settings(
+    WISHES_INSTRUMENTATION=True, WISHES_SERVER_TIMING=True, WISHES_SLOW_REQUEST_MS=10 ** 6,
+    WISHES_PAGE_CACHE_TIMEOUT=600,
+    TEMPLATES=[{**settings.TEMPLATES[0], 'BACKEND': 'wishes.instrumentation.InstrumentedDjangoTemplates'}],
+)
+class InstrumentationTests(TestCase):
+    """
+    Opt-in request instrumentation: Server-Timing, slow-request log and metrics endpoint.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('mona', password='pw', is_staff=True)
+        Wish.objects.create(user=cls.staff, title='Kite', image='wish_avatars/k.jpg')
+
+    def setUp(self):
+        cache.clear()
+        instrumentation.stats.reset()
+
+    def test_server_timing_reports_queries_and_cache(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('main_feed'))
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(ctx)} queries"', timing)
+        self.assertIn('desc="0 hit, 1 miss"', timing)
+        self.assertIn('tpl;dur=', timing)
+
+        response = self.client.get(reverse('main_feed'))
+        self.assertIn('desc="0 queries"', response['Server-Timing'])
+        self.assertIn('desc="1 hit, 0 miss"', response['Server-Timing'])
+
+    def test_async_views_stay_async(self):
+        async def view(request):
+            pass
+
+        self.assertTrue(iscoroutinefunction(instrumentation.InstrumentationMiddleware(view)))
+        response = async_to_sync(AsyncClient().get)(reverse('main_feed'))
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries".*tpl;dur=(?!0\.0;)')
+
+    def test_metrics_are_aggregated_per_url_name_for_staff_only(self):
+        for _ in range(3):
+            self.client.get(reverse('public_wish_list', args=['mona']))
+        self.assertEqual(self.client.get(reverse('instrumentation_metrics')).status_code, 302)
+
+        self.client.force_login(self.staff)
+        views = self.client.get(reverse('instrumentation_metrics')).json()['views']
+        wish_list = views['public_wish_list']
+        self.assertEqual(wish_list['requests'], 3)
+        self.assertEqual((wish_list['cache_hits'], wish_list['cache_misses']), (2, 1))
+        self.assertEqual(sum(wish_list['histogram'].values()), 3)
+
+        self.client.post(reverse('instrumentation_metrics'))
+        # Only the resetting request itself is left.
+        self.assertEqual(list(instrumentation.stats.snapshot()), ['instrumentation_metrics'])
+
+    def test_slow_requests_are_logged(self):
+        with self.settings(WISHES_SLOW_REQUEST_MS=0), self.assertLogs('wishes', 'WARNING') as logs:
+            self.client.get(reverse('register'))
+        self.assertIn('Slow request GET /register/ (register)', logs.output[0])
+
+    def test_disabled_by_default(self):
+        with self.settings(WISHES_INSTRUMENTATION=False):
+            response = Client().get(reverse('register'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class DatabaseTuningTests(TestCase):
+    """
+    SQLite PRAGMAs applied to new connections.
+    """
+
+    def test_new_sqlite_connections_use_wal_and_tuned_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite only")
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        other = connections.create_connection('default')
+        other.settings_dict = {**other.settings_dict, 'NAME': f'{directory}/tuning.sqlite3'}
+        self.addCleanup(other.close)
+
+        with other.cursor() as cursor:
+            values = {}
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size'):
+                cursor.execute(f'PRAGMA {pragma}')
+                values[pragma] = cursor.fetchone()[0]
+        self.assertEqual(values, {
+            'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000, 'mmap_size': 128 * 1024 * 1024,
+        })
+
+
+@override_settings(WISHES_PAGE_CACHE_TIMEOUT=0)
+class AsyncViewTests(TestCase):
+    """
+    The read-heavy pages are async views; they must work under the ASGI handler.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('nina', password='pw')
+        cls.public = Wish.objects.create(user=cls.user, title='Globe', image='wish_avatars/g.jpg')
+        cls.private = Wish.objects.create(user=cls.user, title='Diary', image='wish_avatars/d.jpg', private=True)
+        cls.public.tags.add(Tag.objects.create(name='maps'))
+
+    async def test_pages_render_under_asgi(self):
+        client = AsyncClient()
+        response = await client.get(reverse('main_feed'))
+        self.assertContains(response, 'Globe')
+        response = await client.get(reverse('public_wish_list', args=['nina']), {'q': 'glo'})
+        self.assertEqual([w.title for w in response.context['wishes']], ['Globe'])
+        response = await client.get(reverse('public_wish_detail', args=['nina', self.private.pk]))
+        self.assertEqual(response.status_code, 404)
+        response = await client.get(reverse('public_wish_list', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_owner_sees_private_wish(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.get(reverse('public_wish_detail', args=['nina', self.private.pk]))
+        self.assertContains(response, 'Diary')
+        self.assertTrue(response.context['is_owner'])
+
+
+class ExportTests(TestCase):
+    """
+    Streaming CSV / NDJSON export of wishlists.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('otto', password='pw')
+        tag = Tag.objects.create(name='games')
+        for i in range(5):
+            wish = Wish.objects.create(
+                user=cls.user, title=f'Game {i}', image=f'wish_avatars/{i}.jpg', price=10 + i, price_currency='EUR'
+            )
+            wish.tags.add(tag)
+        Wish.objects.create(user=cls.user, title='=HYPERLINK("x")', private=True)
+
+    def test_own_csv_export_streams_every_wish(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('export_wishes'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="otto-wishes.csv"')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['title'], "'=HYPERLINK(\"x\")")  # formula neutralised
+        self.assertEqual((rows[1]['title'], rows[1]['price'], rows[1]['tags']), ('Game 4', '14.00', 'games'))
+
+    def test_public_ndjson_export_prefetches_tags_per_chunk(self):
+        url = reverse('public_wish_export', args=['otto'])
+        with CaptureQueriesContext(connection) as ctx:
+            with mock.patch.object(export, 'CHUNK_SIZE', 2):
+                response = self.client.get(url, {'format': 'ndjson'})
+                lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['title'] for line in lines], [f'Game {i}' for i in reversed(range(5))])
+        self.assertEqual(json.loads(lines[0])['tags'], ['games'])
+        # Owner lookup, the wishes cursor and one tag query per chunk of 2.
+        self.assertEqual(len([q for q in ctx.captured_queries if 'wishes_tag' in q['sql']]), 3)
+
+    async def test_asgi_export_streams_asynchronously(self):
+        response = await AsyncClient().get(reverse('public_wish_export', args=['otto']), {'format': 'ndjson'})
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertEqual(len(lines), 5)
+
+
+class ImportTests(TestCase):
+    """
+    Bulk import of wishes from CSV / JSON files.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ines', password='pw')
+
+    @staticmethod
+    def _csv(rows):
+        lines = ['title,price,price_currency,tags,image_url,private']
+        lines += [','.join(row) for row in rows]
+        return io.BytesIO('\n'.join(lines).encode())
+
+    def test_export_round_trip(self):
+        owner = User.objects.create_user('otto', password='pw')
+        games = Tag.objects.create(name='games')
+        for i in range(3):
+            Wish.objects.create(user=owner, title=f'Game {i}', image=f'wish_avatars/{i}.jpg', price=10 + i,
+                                price_currency='EUR').tags.add(games)
+        Wish.objects.create(user=owner, title='=HYPERLINK("x")', private=True)
+        self.client.force_login(owner)
+        # A real host name: URLField rejects image URLs on 'testserver'.
+        with self.settings(ALLOWED_HOSTS=['wishes.example.com']):
+            response = self.client.get(reverse('export_wishes'), HTTP_HOST='wishes.example.com')
+            exported = b''.join(response.streaming_content)
+
+        result = importing.import_wishes(self.user, io.BytesIO(exported))
+        self.assertEqual((result.created, result.invalid), (4, 0))
+        imported = {wish.title: wish for wish in Wish.objects.filter(user=self.user).prefetch_related('tags')}
+        self.assertTrue(imported['=HYPERLINK("x")'].private)
+        self.assertEqual(str(imported['Game 2'].price.amount), '12.00')
+        self.assertEqual(str(imported['Game 2'].price_currency), 'EUR')
+        self.assertEqual([tag.name for tag in imported['Game 2'].tags.all()], ['games'])
+        # Images are queued for the worker, not downloaded during the import.
+        self.assertEqual(ImageFetchTask.objects.filter(wish__user=self.user).count(), 3)
+        self.assertEqual(imported['Game 0'].image_status, Wish.IMAGE_PENDING)
+        counts = {t.name: t.wish_count for t in facets.tags_for_scope(TagFacet.SCOPE_PRIVATE, owner=self.user)}
+        self.assertEqual(counts, {'games': 3})
+        found, _ = search.search('game', Wish.objects.filter(user=self.user))
+        self.assertEqual(sorted(wish.title for wish in found), ['Game 0', 'Game 1', 'Game 2'])
+
+    def test_queries_do_not_grow_with_rows(self):
+        def import_rows(count):
+            rows = [(f'Item {i}', '5', 'USD', f'"{count}-t{i % 3}, {count}-common"', '', '') for i in range(count)]
+            with CaptureQueriesContext(connection) as ctx:
+                result = importing.import_wishes(self.user, self._csv(rows))
+            self.assertEqual(result.created, count)
+            return len(ctx)
+
+        import_rows(1)  # the first import also creates the user's WishlistStats row
+        self.assertEqual(import_rows(5), import_rows(50))
+
+    def test_invalid_records_are_reported_and_skipped(self):
+        stream = io.BytesIO(json.dumps([
+            {'title': 'Fine', 'tags': ['a', 'b'], 'completed': True},
+            {'title': ''},
+            {'title': 'Bad image', 'image_url': 'https://example.com/page.html'},
+            'not an object',
+        ]).encode())
+        result = importing.import_wishes(self.user, stream, fmt='json', batch_size=1)
+        self.assertEqual((result.created, result.invalid), (1, 3))
+        self.assertEqual([number for number, _ in result.errors], [2, 3, 4])
+        self.assertIn('image_url', result.errors[1][1])
+        self.assertTrue(Wish.objects.get(user=self.user).completed)
+
+    def test_upload_view(self):
+        self.client.force_login(self.user)
+        csv_file = self._csv([('Lamp', '', '', '', '', 'yes'), ('', '', '', '', '', '')])
+        upload = SimpleUploadedFile('wishes.csv', csv_file.read())
+        response = self.client.post(reverse('import_wishes'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Record 2:')
+        self.assertTrue(Wish.objects.get(user=self.user, title='Lamp').private)
+
+        upload = SimpleUploadedFile('wishes.json', b'{"title": "Mug"}\n{"title": "Pen"}\n')
+        response = self.client.post(reverse('import_wishes'), {'file': upload})
+        self.assertRedirects(response, reverse('wish_list'))
+        self.assertEqual(Wish.objects.filter(user=self.user).count(), 3)
+
+
+class CurrencyTests(TestCase):
+    """
+    Base-currency prices: offline rates, refresh on update, sorting and filtering.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.addCleanup(currency.clear_cache)
+        currency.clear_cache()
+        self.rates_file = f'{self.tmpdir}/rates.json'
+        self.write_rates({'EUR': '0.8', 'RUB': '100'})
+        self.user = User.objects.create_user('uma', password='pw')
+
+    def write_rates(self, rates):
+        with open(self.rates_file, 'w') as f:
+            json.dump({'base': 'USD', 'rates': rates}, f)
+
+    def update_rates(self):
+        with self.settings(WISHES_RATES_FILE=self.rates_file):
+            currency.FileExchangeBackend().update_rates()
+
+    def make(self, title, amount, code, **kwargs):
+        return Wish.objects.create(user=self.user, title=title, price=amount, price_currency=code,
+                                   image='wish_avatars/x.jpg', **kwargs)
+
+    def test_update_rates_refreshes_existing_prices(self):
+        euro = self.make('Euro', 40, 'EUR')
+        dollar = self.make('Dollar', 40, 'USD')
+        self.assertIsNone(euro.price_base)  # no rates yet
+        self.assertEqual(dollar.price_base, Decimal('40.00'))
+
+        self.update_rates()
+        self.assertEqual(Wish.objects.get(pk=euro.pk).price_base, Decimal('50.00'))
+
+        self.write_rates({'EUR': '0.5'})
+        self.update_rates()
+        self.assertEqual(Wish.objects.get(pk=euro.pk).price_base, Decimal('80.00'))
+
+    def test_unchanged_prices_are_left_alone(self):
+        self.update_rates()
+        euro = self.make('Euro', 40, 'EUR')
+        dollar = self.make('Dollar', 40, 'USD')
+        stamps = dict(Wish.objects.values_list('pk', 'updated_at'))
+        with self.settings(WISHES_RATES_FILE=self.rates_file):
+            self.assertEqual(currency.refresh_base_prices(), 0)
+
+        self.write_rates({'EUR': '0.5', 'RUB': '100'})
+        self.update_rates()
+        after = dict(Wish.objects.values_list('pk', 'updated_at'))
+        self.assertGreater(after[euro.pk], stamps[euro.pk])
+        self.assertEqual(after[dollar.pk], stamps[dollar.pk])
+
+    def test_rates_are_cached_in_process(self):
+        self.update_rates()
+        self.assertEqual(currency.to_base(Money(250, 'RUB')), Decimal('2.50'))
+        with self.assertNumQueries(0):
+            self.assertEqual(currency.to_base(Money(10, 'EUR')), Decimal('12.50'))
+            self.assertIsNone(currency.to_base(Money(10, 'JPY')))
+        wish = self.make('Rouble', 500, 'RUB')
+        wish.price = Money(1000, 'RUB')
+        wish.save(update_fields=['price'])
+        self.assertEqual(Wish.objects.get(pk=wish.pk).price_base, Decimal('10.00'))
+
+    def test_feed_and_list_sort_and_filter_by_base_price(self):
+        self.update_rates()
+        self.make('Ten dollars', 10, 'USD')
+        self.make('Twenty euros', 20, 'EUR')  # 25 USD
+        self.make('Thousand roubles', 1000, 'RUB')  # 10 USD
+        self.make('Priceless', None, 'USD')
+
+        response = self.client.get(reverse('main_feed'), {'sort': '-price'})
+        titles = [wish.title for wish in response.context['wishes']]
+        self.assertEqual(titles[0], 'Twenty euros')
+        self.assertEqual(titles[-1], 'Priceless')
+
+        response = self.client.get(reverse('main_feed'), {'sort': 'price', 'min_price': '11', 'max_price': 'abc'})
+        self.assertEqual([wish.title for wish in response.context['wishes']], ['Twenty euros'])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('wish_list'), {'max_price': '10', 'sort': 'price'})
+        self.assertEqual([wish.title for wish in response.context['active_wishes']],
+                         ['Ten dollars', 'Thousand roubles'])
+
+    def test_price_sort_caps_huge_page_numbers(self):
+        self.make('Ten dollars', 10, 'USD')
+        response = self.client.get(reverse('main_feed'), {'sort': 'price', 'page': '99999999999999999999'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['wishes'], [])
+        self.assertIsNone(response.context['next_page'])
+
+    def test_price_sort_uses_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plan check is SQLite-specific.")
+        from .views import PRICE_SORTS, _public_feed_queryset
+        plan = _public_feed_queryset().filter(price_base__gte=5).order_by(*PRICE_SORTS['price'])[:21].explain()
+        self.assertIn('wish_public_price_idx', plan)
+
+
+@override_settings(WISHES_PAGE_CACHE_TIMEOUT=0, WISHES_CARD_CACHE_TIMEOUT=3600)
+class CardCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cards', password='pw')
+        cls.tag = Tag.objects.create(name='lego')
+        cls.wishes = []
+        for i in range(3):
+            wish = Wish.objects.create(user=cls.user, title=f'Card {i}', completed=i == 2)
+            wish.tags.add(cls.tag)
+            cls.wishes.append(wish)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_warm_cache_skips_tag_queries_and_matches_uncached_output(self):
+        url = reverse('wish_list')
+        with override_settings(WISHES_CARD_CACHE_TIMEOUT=0):
+            uncached = self.client.get(url).content
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(url)
+        cold_sql = [query['sql'] for query in cold]
+        with CaptureQueriesContext(connection) as warm:
+            cached = self.client.get(url).content
+        warm_sql = [query['sql'] for query in warm]
+        # One tag query for both sections when cold, none when warm.
+        self.assertEqual(sum('wishes_wish_tags' in sql for sql in cold_sql), 1)
+        self.assertEqual(len(warm_sql), len(cold_sql) - 1)
+        self.assertEqual(cached, uncached)
+        self.assertContains(self.client.get(url), '<span class="tag">lego</span>', html=True)
+
+    def test_edits_refresh_the_card(self):
+        url = reverse('wish_list')
+        self.client.get(url)
+        wish = self.wishes[0]
+
+        # Writes that bypass save() don't invalidate the card...
+        Wish.objects.filter(pk=wish.pk).update(title='Renamed quietly')
+        self.assertNotContains(self.client.get(url), 'Renamed quietly')
+
+        # ...but save() and tag changes do.
+        wish.title = 'Renamed'
+        wish.save(update_fields=['title'])
+        self.assertContains(self.client.get(url), 'Renamed')
+
+        wish.tags.add(Tag.objects.create(name='technic'))
+        self.assertContains(self.client.get(url), '<span class="tag">technic</span>', html=True)
+        Tag.objects.get(name='technic').wish_set.clear()
+        self.assertNotContains(self.client.get(url), '<span class="tag">technic</span>', html=True)
+
+    def test_sections_are_picked_from_one_render(self):
+        template = Template(
+            "{% load wish_cards %}{% wish_cards wishes variant='public' as cards %}"
+            "[{{ cards|cards_for:active }}][{{ cards|cards_for:done }}]"
+        )
+        wishes = list(Wish.objects.filter(user=self.user).select_related('user').order_by('pk'))
+        output = template.render(Context({'wishes': wishes, 'active': wishes[:2], 'done': wishes[2:]}))
+        active, done = output[1:-1].split('][')
+        self.assertIn('Card 0', active)
+        self.assertIn('Card 1', active)
+        self.assertNotIn('Card 2', active)
+        self.assertIn('Card 2', done)
+
+
+@override_settings(WISHES_PAGE_CACHE_TIMEOUT=0)
+class PublicWishDetailTests(TestCase):
+    """
+    public_wish_detail: one query for the wish and its owner, and a cached body.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('Kirill', password='pw')
+        cls.wish = Wish.objects.create(user=cls.owner, title='Globe', description='Antique')
+        cls.wish.tags.add(Tag.objects.create(name='maps'))
+        cls.secret = Wish.objects.create(user=cls.owner, title='Secret', private=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def url(self, wish, username='Kirill'):
+        return reverse('public_wish_detail', args=[username, wish.pk])
+
+    def test_username_is_matched_case_insensitively_through_an_index(self):
+        self.assertContains(self.client.get(self.url(self.wish, 'kIRILL')), 'Globe')
+        self.assertEqual(self.client.get(self.url(self.wish, 'someone')).status_code, 404)
+        if connection.vendor == 'sqlite':
+            plan = User.objects.alias(name=Lower('username')).filter(name='kirill').explain()
+            self.assertIn('user_username_lower_idx', plan)
+
+    def test_private_wishes_are_only_shown_to_their_owner(self):
+        self.assertEqual(self.client.get(self.url(self.secret)).status_code, 404)
+        self.client.force_login(User.objects.create_user('guest', password='pw'))
+        self.assertEqual(self.client.get(self.url(self.secret)).status_code, 404)
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url(self.secret))
+        self.assertContains(response, 'Secret')
+        self.assertContains(response, 'Edit Wish')
+
+    def test_body_is_cached_until_the_wish_changes(self):
+        url = self.url(self.wish)
+        self.client.get(url)
+        with self.assertNumQueries(1):  # the wish and its owner; tags come with the cached body
+            response = self.client.get(url)
+        self.assertContains(response, 'maps')
+
+        self.wish.description = 'Restored'
+        self.wish.save()
+        self.assertContains(self.client.get(url), 'Restored')
+        # The owner's view has its own copy, with the owner-only parts.
+        self.client.force_login(self.owner)
+        self.assertContains(self.client.get(url), 'Edit Wish')
+
+
+@override_settings(WISHES_CHANGES_LAG_SECONDS=0, WISHES_TOMBSTONE_DAYS=30)
+class ChangeFeedTests(TestCase):
+    url = '/api/wishes/changes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('liam', password='pw')
+        cls.tag = Tag.objects.create(name='sync')
+        cls.wishes = []
+        for i in range(3):
+            wish = Wish.objects.create(user=cls.owner, title=f'Synced {i}')
+            wish.tags.add(cls.tag)
+            cls.wishes.append(wish)
+        Wish.objects.create(user=cls.owner, title='Secret', private=True)
+
+    def feed(self, since=None, **params):
+        if since:
+            params['since'] = since
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    @staticmethod
+    def ops(data):
+        return [(change['op'], change.get('wish', {}).get('title', change['id'])) for change in data['changes']]
+
+    def test_public_feed_returns_only_new_changes_in_order(self):
+        data = self.feed()
+        self.assertEqual(self.ops(data), [('upsert', 'Synced 0'), ('upsert', 'Synced 1'), ('upsert', 'Synced 2')])
+        self.assertEqual(data['changes'][0]['wish']['tags'], [{'id': self.tag.pk, 'name': 'sync'}])
+        self.assertFalse(data['more'])
+        since = data['since']
+        self.assertEqual(self.feed(since)['changes'], [])
+
+        first, second, third = self.wishes
+        second.title = 'Renamed'
+        second.save()
+        third.private = True
+        third.save()
+        deleted_pk = first.pk
+        first.delete()
+
+        data = self.feed(since)
+        self.assertEqual(self.ops(data), [('upsert', 'Renamed'), ('delete', third.pk), ('delete', deleted_pk)])
+        self.assertEqual(self.feed(data['since'])['changes'], [])
+
+        # Making it public again brings it back.
+        third.private = False
+        third.save(update_fields=['private'])
+        self.assertEqual(self.ops(self.feed(data['since'])), [('upsert', 'Synced 2')])
+
+    def test_owner_feed_includes_private_wishes(self):
+        self.client.force_login(self.owner)
+        since = self.feed(mine='true')['since']
+        secret = Wish.objects.get(title='Secret')
+        self.assertIn(('upsert', 'Secret'), self.ops(self.feed(mine='true')))
+
+        self.wishes[0].private = True
+        self.wishes[0].save()
+        secret_pk = secret.pk
+        secret.delete()
+        self.assertEqual(self.ops(self.feed(since, mine='true')), [('upsert', 'Synced 0'), ('delete', secret_pk)])
+
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url, {'mine': 'true'}).status_code, 403)
+
+    def test_pages_with_constant_queries(self):
+        expected = sorted(wish.pk for wish in self.wishes)
+        for wish in self.wishes[:2]:
+            wish.delete()
+        # owner, wishes (with users), tombstones, prefetched tags
+        with self.assertNumQueries(4):
+            data = self.feed(limit=2, user='liam')
+        self.assertEqual(len(data['changes']), 2)
+        self.assertTrue(data['more'])
+        seen = [change['id'] for change in data['changes']]
+        while data['more']:
+            data = self.feed(data['since'], limit=2, user='liam')
+            seen += [change['id'] for change in data['changes']]
+        self.assertEqual(sorted(seen), expected)
+
+        with self.assertNumQueries(2):
+            self.feed(fields='id,title')
+
+    def test_bad_or_expired_since(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'user': 'nobody'}).status_code, 404)
+        old = (timezone.now() - timedelta(days=31)).isoformat()
+        self.assertEqual(self.client.get(self.url, {'since': old}).status_code, 410)
+
+        self.wishes[0].delete()
+        WishTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=31))
+        self.assertEqual(changes.purge_tombstones(), 1)
+        self.assertFalse(WishTombstone.objects.exists())
+
+    def test_public_feed_uses_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plan check is SQLite-specific.")
+        position = (timezone.now() - timedelta(hours=1), 0)
+        plan = changes._after(
+            Wish.objects.filter(private=False), 'updated_at', 'id', position, timezone.now(),
+        )[:201].explain()
+        self.assertIn('wish_public_changes_idx', plan)
+
+
+@override_settings(WISHES_PAGE_CACHE_TIMEOUT=0)
+class StaticPipelineTests(TestCase):
+    """
+    CSS bundle, hashed and precompressed collectstatic output, and file serving.
+    """
+
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root, True)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+    def test_css_bundle_is_built_and_linked(self):
+        css, used = stylesheet.build()
+        self.assertEqual(stylesheet.OUTPUT.read_text(encoding='utf-8'), css,
+                         "The CSS bundle is stale: run python manage.py build_css.")
+        self.assertIn('md:grid-cols-3', used)
+        self.assertIn('.bg-white\\/80 { background-color: rgb(255 255 255 / 0.8) }', css)
+        self.assertNotIn('text-fuchsia-500', used)
+
+        page = self.client.get(reverse('main_feed')).content.decode()
+        self.assertNotIn('cdn.tailwindcss.com', page)
+        self.assertIn('/static/wishes/css/app.css', page)
+
+    def test_every_template_class_is_styled_or_a_hook(self):
+        paths = stylesheet.content_files()
+        _, used = stylesheet.build(paths)
+        self.assertEqual(sorted(stylesheet.class_names(paths) - used - stylesheet.HOOK_CLASSES), [])
+
+        template = Path(self.static_root) / 'bad.html'
+        template.write_text('<p class="text-gray-600 text-fuchsia-500 {% if x %}hover:wobble-3{% endif %}">x</p>')
+        with self.assertRaisesMessage(stylesheet.UnknownClassError, 'hover:wobble-3, text-fuchsia-500'):
+            stylesheet.build([template])
+
+    def test_collectstatic_writes_hashed_compressed_files_served_as_immutable(self):
+        storages = {
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'wishes.staticfiles.CompressedManifestStaticFilesStorage'},
+        }
+        with self.settings(STATIC_ROOT=self.static_root, STORAGES=storages):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            page = self.client.get(reverse('main_feed')).content.decode()
+            url = re.search(r'/static/wishes/css/app\.[0-9a-f]{12}\.css', page).group()
+            self.assertTrue(os.path.exists(os.path.join(self.static_root, url[len('/static/'):] + '.gz')))
+
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+            self.assertIn('Accept-Encoding', response['Vary'])
+            self.assertTrue(response['Content-Type'].startswith('text/css'))
+            body = gzip.decompress(b''.join(response.streaming_content))
+            self.assertEqual(body, stylesheet.OUTPUT.read_bytes())
+
+            response = self.client.get(url)
+            self.assertNotIn('Content-Encoding', response)
+            self.assertEqual(b''.join(response.streaming_content), body)
+
+            response = self.client.get('/static/wishes/css/app.css')
+            self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+    def test_media_answers_conditional_and_range_requests(self):
+        data = bytes(range(256)) * 4
+        os.makedirs(os.path.join(self.media_root, 'wish_avatars'))
+        with open(os.path.join(self.media_root, 'wish_avatars', 'a.jpg'), 'wb') as handle:
+            handle.write(data)
+        url = '/media/wish_avatars/a.jpg'
+        with self.settings(MEDIA_ROOT=self.media_root):
+            response = self.client.get(url)
+            self.assertEqual(b''.join(response.streaming_content), data)
+            self.assertEqual(response['Accept-Ranges'], 'bytes')
+            self.assertEqual(response['Content-Type'], 'image/jpeg')
+            etag = response['ETag']
+
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+            response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+            self.assertEqual(b''.join(response.streaming_content), data[10:20])
+            response = self.client.get(url, HTTP_RANGE='bytes=-4', HTTP_IF_RANGE=etag)
+            self.assertEqual(b''.join(response.streaming_content), data[-4:])
+
+            # A changed file (stale If-Range) or an odd range gets the whole file.
+            self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"').status_code, 200)
+            self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=0-1,5-6').status_code, 200)
+            response = self.client.get(url, HTTP_RANGE='bytes=2000-')
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+            self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+            self.assertEqual(self.client.get('/media/wish_avatars/').status_code, 404)
+            self.assertEqual(self.client.post(url).status_code, 405)
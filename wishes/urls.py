@@ -1,13 +1,28 @@
 from django.urls import path, include
-from . import views
+from rest_framework.routers import DefaultRouter
+from . import api, views
+
+# REST API (see wishes/api.py)
+router = DefaultRouter()
+router.register('wishes', api.WishViewSet, basename='api-wish')
+router.register('tags', api.TagViewSet, basename='api-tag')
 
 urlpatterns = [
     # Main public feed
     path('', views.main_feed, name='main_feed'),
 
+    # Next page of the main feed ("Load more"), addressed by cursor
+    path('feed/more/', views.main_feed_more, name='main_feed_more'),
+
     # User's private wishlist page
     path('my-wishes/', views.wish_list, name='wish_list'),
 
+    # Download of the user's own wishes (?format=csv|ndjson)
+    path('my-wishes/export/', views.export_wishes, name='export_wishes'),
+
+    # Upload of a CSV/JSON file of wishes
+    path('my-wishes/import/', views.import_wishes, name='import_wishes'),
+
     # Add a new wish page
     path('add/', views.add_wish, name='add_wish'),
 
@@ -26,7 +41,16 @@ urlpatterns = [
     # Public wishlist for a specific user
     path("wisher/<str:username>/", views.public_wish_list, name="public_wish_list"),
 
+    # Download of a user's public wishes (?format=csv|ndjson)
+    path("wisher/<str:username>/export/", views.public_wish_export, name="public_wish_export"),
+
     # Public wish detail page for a specific user's wish
     # This URL now correctly includes both the username and the wish's primary key
     path("wisher/<str:username>/<int:pk>/", views.public_wish_detail, name="public_wish_detail"),
+
+    # Request timing/query metrics for staff (see wishes/instrumentation.py)
+    path('metrics/', views.instrumentation_metrics, name='instrumentation_metrics'),
+
+    # REST API for wishes and tags
+    path('api/', include(router.urls)),
 ]
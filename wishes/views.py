@@ -1,21 +1,50 @@
 import re
 import logging
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse
 from django.contrib import messages
 from django import forms as forms
 from django.contrib.auth import get_user_model
-from .models import Wish, Tag, User
-from .forms import WishForm, ProfileForm
-from django.db.models import Q
+from . import caching, export, facets, importing, instrumentation, search, stats
+from .models import Wish, Tag, TagFacet, User
+from .forms import ImportForm, WishForm, ProfileForm
+from .pagination import apaginate_by_cursor
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.conf import settings
 # Initialize logger for the wishes app
 logger = logging.getLogger('wishes')
 
 # Get the custom User model
 User = get_user_model()
 
+# Number of wish cards per main feed page / "Load more" request
+FEED_PAGE_SIZE = 20
+
+# Number of ranked results per search page
+SEARCH_PAGE_SIZE = 20
+
+# Highest `?page=` served for numbered (search and price-sorted) pages; a
+# larger number would overflow the query's OFFSET.
+MAX_PAGE = 1000
+
+# `?sort=` orderings by the base-currency price; wishes without one go last.
+PRICE_SORTS = {
+    'price': (F('price_base').asc(nulls_last=True), 'id'),
+    '-price': (F('price_base').desc(nulls_last=True), '-id'),
+}
+
+# Query parameters carried over to the next page of the main feed
+FEED_FILTERS = ('tag', 'q', 'sort', 'min_price', 'max_price')
+
 
 # New form for user registration with custom validation
 class CustomUserCreationForm(UserCreationForm):
@@ -32,38 +61,181 @@ class CustomUserCreationForm(UserCreationForm):
         return username
 
 
-def main_feed(request):
+def _tag_sort(request):
+    """
+    Tag filter bar ordering requested via `?tag_sort=popular`; alphabetical by default.
+    """
+    return 'popular' if request.GET.get('tag_sort') == 'popular' else 'name'
+
+
+def _price_filters(request, queryset):
+    """
+    Applies `?min_price=` / `?max_price=` (in the base currency) to `queryset`
+    and reads `?sort=`. Invalid values are ignored.
+    Returns (queryset, sort, context for the filter form).
+    """
+    bounds = {}
+    for param, lookup in (('min_price', 'price_base__gte'), ('max_price', 'price_base__lte')):
+        try:
+            bounds[param] = Decimal(request.GET.get(param, '').strip())
+        except InvalidOperation:
+            continue
+        if bounds[param].is_finite():
+            queryset = queryset.filter(**{lookup: bounds[param]})
+        else:
+            del bounds[param]
+    sort = request.GET.get('sort') if request.GET.get('sort') in PRICE_SORTS else ''
+    context = {
+        'sort': sort,
+        'min_price': bounds.get('min_price', ''),
+        'max_price': bounds.get('max_price', ''),
+        'base_currency': settings.BASE_CURRENCY,
+    }
+    return queryset, sort, context
+
+
+def _filter_query(request, *params):
+    """
+    The non-empty `params` of the current query string, urlencoded for
+    links to further pages.
+    """
+    return urlencode([(param, request.GET[param]) for param in params if request.GET.get(param, '').strip()])
+
+
+def _page_number(request):
+    """
+    The `?page=` requested, between 1 and MAX_PAGE.
+    """
+    try:
+        return min(max(int(request.GET.get('page', 1)), 1), MAX_PAGE)
+    except ValueError:
+        return 1
+
+
+async def _aget_or_404(queryset):
+    try:
+        return await queryset.aget()
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+def _public_feed_queryset(selected_tag=None):
+    """
+    Public, non-completed wishes that have an image, served by the
+    `wish_public_feed_idx` partial index. Tags are fetched by {% wish_cards %}
+    for the cards it doesn't have cached.
+    """
+    qs = Wish.objects.filter(private=False, completed=False, has_image=True).select_related('user')
+    if selected_tag:
+        qs = qs.filter(tags__name=selected_tag)
+    return qs
+
+
+async def _search_page(request, queryset):
+    """
+    Runs the `?q=` search over `queryset` for the `?page=` requested.
+    Ranked results can't use the created_at cursor, so pages are numbered.
+    Returns (wishes, next_page); next_page is None on the last page.
+    """
+    page = _page_number(request)
+    wishes, has_more = await sync_to_async(search.search)(
+        request.GET['q'], queryset, limit=SEARCH_PAGE_SIZE, offset=(page - 1) * SEARCH_PAGE_SIZE
+    )
+    return wishes, page + 1 if has_more and page < MAX_PAGE else None
+
+
+async def _sorted_page(request, queryset):
+    """
+    The `?page=` requested of `queryset` in its own order, served by the
+    price indexes. Like search results, these pages are numbered.
+    Returns (wishes, next_page).
+    """
+    page = _page_number(request)
+    offset = (page - 1) * FEED_PAGE_SIZE
+    wishes = [wish async for wish in queryset[offset:offset + FEED_PAGE_SIZE + 1]]
+    has_more = len(wishes) > FEED_PAGE_SIZE and page < MAX_PAGE
+    return wishes[:FEED_PAGE_SIZE], page + 1 if has_more else None
+
+
+async def _feed_page(request, selected_tag):
+    """
+    One page of the main feed: search results when `?q=` is given, wishes
+    ordered by price for `?sort=price|-price`, otherwise the newest wishes
+    after `?cursor=`. `?min_price=`/`?max_price=` narrow all three.
+    Returns (wishes, next_cursor, next_page, price filter context).
+    """
+    queryset, sort, price_context = _price_filters(request, _public_feed_queryset(selected_tag))
+    if request.GET.get('q', '').strip():
+        wishes, next_page = await _search_page(request, queryset)
+        return wishes, None, next_page, price_context
+    if sort:
+        wishes, next_page = await _sorted_page(request, queryset.order_by(*PRICE_SORTS[sort]))
+        return wishes, None, next_page, price_context
+    wishes, next_cursor = await apaginate_by_cursor(
+        queryset, cursor=request.GET.get('cursor'), page_size=FEED_PAGE_SIZE
+    )
+    return wishes, next_cursor, None, price_context
+
+
+async def _arender(request, template_name, context):
+    """
+    Renders a template from an async view. Everything the template shows must
+    already be fetched; rendering itself runs in the sync thread because
+    context processors (user, messages) may still touch the session.
+    """
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@caching.versioned_page('main_feed', lambda request: [caching.FEED])
+async def main_feed(request):
     """
     Renders the main public feed of wishes.
     Only shows public, non-completed wishes that have an image.
+    Async: the queries are awaited instead of holding a worker thread.
     """
     logger.debug("Accessing main feed.")
     selected_tag = request.GET.get('tag')
 
-    # Exclude private and completed wishes, and those without an image.
-    # The `|` operator is used for an OR condition within a Q object.
-    all_public_wishes_query = Wish.objects.filter(
-        private=False, completed=False
-    ).exclude(
-        Q(image__isnull=True) | Q(image='')
-    )
-
-    tags = Tag.objects.filter(
-        wish__in=all_public_wishes_query
-    ).distinct()
+    tag_sort = _tag_sort(request)
+    tags = [tag async for tag in facets.tags_for_scope(TagFacet.SCOPE_FEED, order=tag_sort)]
 
     if selected_tag:
-        all_public_wishes_query = all_public_wishes_query.filter(tags__name=selected_tag)
         logger.debug(f"Main feed filtered by tag: '{selected_tag}'.")
 
-    all_public_wishes = all_public_wishes_query.order_by('-created_at')[:20]
+    wishes, next_cursor, next_page, price_context = await _feed_page(request, selected_tag)
 
     context = {
-        'wishes': all_public_wishes,
+        'wishes': wishes,
         'tags': tags,
+        'tag_sort': tag_sort,
+        'selected_tag': selected_tag,
+        'query': request.GET.get('q', '').strip(),
+        'next_cursor': next_cursor,
+        'next_page': next_page,
+        'filter_query': _filter_query(request, *FEED_FILTERS),
+        **price_context,
+    }
+    return await _arender(request, 'wishes/main_feed.html', context)
+
+
+@caching.versioned_page('main_feed_more', lambda request: [caching.FEED])
+async def main_feed_more(request):
+    """
+    Returns the next page of main feed cards as an HTML fragment
+    for the "Load more" button.
+    """
+    selected_tag = request.GET.get('tag')
+    wishes, next_cursor, next_page, price_context = await _feed_page(request, selected_tag)
+    context = {
+        'wishes': wishes,
         'selected_tag': selected_tag,
+        'query': request.GET.get('q', '').strip(),
+        'next_cursor': next_cursor,
+        'next_page': next_page,
+        'filter_query': _filter_query(request, *FEED_FILTERS),
+        **price_context,
     }
-    return render(request, 'wishes/main_feed.html', context)
+    return await _arender(request, 'wishes/_feed_page.html', context)
 
 
 @login_required
@@ -73,26 +245,69 @@ def wish_list(request):
     base_qs = (
         Wish.objects.filter(user=request.user)
         .select_related("user")
-        .prefetch_related("tags")
         .order_by("-created_at")
     )
 
     if selected_tag:
         base_qs = base_qs.filter(tags__name=selected_tag)
+    base_qs, sort, price_context = _price_filters(request, base_qs)
+    if sort:
+        base_qs = base_qs.order_by(*PRICE_SORTS[sort])
+
+    # One query for both sections; {% wish_cards %} renders the cards of
+    # both at once, prefetching the tags of those not in the cache.
+    wishes = list(base_qs)
 
     context = {
-        "active_wishes": base_qs.filter(completed=False),
-        "completed_wishes": base_qs.filter(completed=True),
-        "tags": (
-            Tag.objects.filter(wish__user=request.user)
-            .distinct()
-            .order_by("name")
+        "wishes": wishes,
+        "active_wishes": [wish for wish in wishes if not wish.completed],
+        "completed_wishes": [wish for wish in wishes if wish.completed],
+        "tags": facets.tags_for_scope(
+            TagFacet.SCOPE_PRIVATE, owner=request.user, order=_tag_sort(request)
         ),
         "selected_tag": selected_tag,
+        **price_context,
     }
     return render(request, "wishes/wish_list.html", context)
 
 
+@login_required
+def export_wishes(request):
+    """
+    Streams all of the user's wishes as a CSV (default) or `?format=ndjson` download.
+    """
+    logger.info(f"Wishlist export by {request.user.username}.")
+    return export.export_response(
+        request, Wish.objects.filter(user=request.user),
+        filename=f'{request.user.username}-wishes', fmt=request.GET.get('format', 'csv'),
+    )
+
+
+@login_required
+def import_wishes(request):
+    """
+    Creates wishes from an uploaded CSV or JSON file. Valid records are
+    imported, invalid ones are listed with their errors.
+    """
+    result = None
+    if request.method == 'POST':
+        form = ImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = importing.import_wishes(request.user, upload, fmt=importing.guess_format(upload.name))
+            except importing.ImportFormatError as exc:
+                form.add_error('file', str(exc))
+            else:
+                messages.success(request, f"Imported {result.created} wishes.")
+                if not result.invalid:
+                    return redirect('wish_list')
+    else:
+        form = ImportForm()
+
+    return render(request, 'wishes/import_wishes.html', {'form': form, 'result': result})
+
+
 @login_required
 def add_wish(request):
     """
@@ -103,8 +318,9 @@ def add_wish(request):
         if form.is_valid():
             wish = form.save(commit=False)
             wish.user = request.user
-            wish.save()
-            form._save_tags(wish)  # Call the custom tag-saving method
+            with transaction.atomic():
+                wish.save()
+                form.save_m2m()  # Saves tags and queues an image download, if any
             logger.info(f"New wish '{wish.title}' added by {request.user.username}.")
             return redirect('public_wish_detail', username=request.user.username, pk=wish.pk)
     else:
@@ -118,14 +334,17 @@ def edit_wish(request, pk):
     """
     Handles editing an existing wish.
     """
-    wish = get_object_or_404(Wish, pk=pk, user=request.user)
+    wish = get_object_or_404(
+        Wish.objects.select_related('user').prefetch_related('tags'), pk=pk, user=request.user
+    )
     if request.method == 'POST':
         form = WishForm(request.POST, request.FILES, instance=wish)
         if form.is_valid():
             wish = form.save(commit=False)
             wish.user = request.user
-            wish.save()
-            form._save_tags(wish)  # Call the custom tag-saving method
+            with transaction.atomic():
+                wish.save()
+                form.save_m2m()  # Saves tags and queues an image download, if any
             logger.info(f"Wish '{wish.title}' (ID: {pk}) updated by {request.user.username}.")
             return redirect('public_wish_detail', username=wish.user.username, pk=wish.pk)
     else:
@@ -139,7 +358,7 @@ def delete_wish(request, pk):
     """
     Handles deleting a wish.
     """
-    wish = get_object_or_404(Wish, pk=pk, user=request.user)
+    wish = get_object_or_404(Wish.objects.select_related('user'), pk=pk, user=request.user)
     if request.method == 'POST':
         wish_title = wish.title
         wish.delete()
@@ -183,87 +402,118 @@ def profile(request):
     else:
         form = ProfileForm(instance=request.user)
 
-    return render(request, 'wishes/profile.html', {'form': form})
+    context = {'form': form, 'stats': stats.for_user(request.user)}
+    return render(request, 'wishes/profile.html', context)
 
 
-def public_wish_list(request, username):
+@caching.versioned_page(
+    'public_wish_list', lambda request, username: [caching.owner_version(username)]
+)
+async def public_wish_list(request, username):
     """
     Renders a public wishlist page for a specific user.
+    The owner's visible wishes are fetched once and split into
+    active/completed in Python; the header's totals come from the owner's
+    WishlistStats, joined to the owner. {% wish_cards %} fetches tags for the
+    cards it has to render. With `?q=` only ranked search
+    matches are shown, a page at a time.
     """
     logger.info(f"Accessing public wishlist for user: {username}.")
-    owner = get_object_or_404(User, username=username)
+    owner = await _aget_or_404(User.objects.filter(username=username).select_related('wishlist_stats'))
+    owner_stats = stats.for_user(owner)
     selected_tag = request.GET.get('tag')
 
-    all_wishes_query = Wish.objects.filter(
-        user=owner, private=False
-    ).exclude(
-        Q(image__isnull=True) | Q(image='')
-    )
-    active_wishes_query = Wish.objects.filter(
-        user=owner, private=False, completed=False
-    ).exclude(
-        Q(image__isnull=True) | Q(image='')
-    )
-    completed_wishes_query = Wish.objects.filter(
-        user=owner, private=False, completed=True
-    ).exclude(
-        Q(image__isnull=True) | Q(image='')
-    )
+    wishes_query = Wish.objects.filter(user=owner, private=False, has_image=True).select_related('user')
 
-    tags = Tag.objects.filter(
-        wish__in=all_wishes_query
-    ).distinct()
+    tag_sort = _tag_sort(request)
+    tags = [tag async for tag in facets.tags_for_scope(TagFacet.SCOPE_PUBLIC, owner=owner, order=tag_sort)]
 
     if selected_tag:
-        all_wishes_query = all_wishes_query.filter(tags__name=selected_tag)
-        active_wishes_query = active_wishes_query.filter(tags__name=selected_tag)
-        completed_wishes_query = completed_wishes_query.filter(tags__name=selected_tag)
+        wishes_query = wishes_query.filter(tags__name=selected_tag)
         logger.debug(f"Public wishlist filtered by tag: '{selected_tag}'.")
 
+    query = request.GET.get('q', '').strip()
+    next_page = None
+    if query:
+        wishes, next_page = await _search_page(request, wishes_query)
+    else:
+        wishes = [wish async for wish in wishes_query]
+    active_wishes = [wish for wish in wishes if not wish.completed]
+    completed_wishes = [wish for wish in wishes if wish.completed]
+
     context = {
-        'wishes': all_wishes_query,
-        'active_wishes': active_wishes_query,
-        'completed_wishes': completed_wishes_query,
+        'wishes': wishes,
+        'active_wishes': active_wishes,
+        'completed_wishes': completed_wishes,
         'owner': owner,
-        'is_owner': request.user == owner,
+        'owner_stats': owner_stats,
+        'is_owner': await request.auser() == owner,
         'tags': tags,
+        'tag_sort': tag_sort,
         'selected_tag': selected_tag,
+        'query': query,
+        'next_page': next_page,
     }
     logger.info(
-        f"Found {active_wishes_query.count()} active and {completed_wishes_query.count()} completed wishes for user {username}.")
-    return render(request, 'wishes/public_wish_list.html', context)
-
+        f"User {username} has {owner_stats.public_active} active and {owner_stats.public_completed} "
+        f"completed public wishes; showing {len(wishes)}.")
+    return await _arender(request, 'wishes/public_wish_list.html', context)
 
-def public_wish_detail(request, username, pk):
-    owner = get_object_or_404(User, username__iexact=username)
-    is_owner = request.user.is_authenticated and request.user == owner
 
-    # Start with the wish owned by the user
-    qs = (
-        Wish.objects.select_related("user")
-        .prefetch_related("tags")
-        .filter(user=owner, pk=pk)
+def public_wish_export(request, username):
+    """
+    Streams the wishes shown on a user's public wishlist as CSV or NDJSON.
+    """
+    owner = get_object_or_404(User, username=username)
+    return export.export_response(
+        request, Wish.objects.filter(user=owner, private=False, has_image=True),
+        filename=f'{owner.username}-public-wishes', fmt=request.GET.get('format', 'csv'),
     )
 
-    # If not the owner, restrict to public visibility
-    if not is_owner:
-        field_names = {f.name for f in Wish._meta.get_fields()}
-        if "is_public" in field_names:
-            qs = qs.filter(is_public=True)
-        elif "private" in field_names:
-            qs = qs.filter(private=False)
-        else:
-            # If no visibility field exists, treat as public by default
-            pass
 
-    wish = get_object_or_404(qs)
+@caching.versioned_page(
+    'public_wish_detail', lambda request, username, pk: [caching.owner_version(username)]
+)
+async def public_wish_detail(request, username, pk):
+    """
+    Renders one wish of `username` (matched case-insensitively). The wish
+    and its owner come from one query on the wish's primary key; private
+    wishes are only shown to their owner. The wish itself is a cached
+    fragment (see {% wish_cards %}), so tags are only fetched on a miss.
+    """
+    wish = await _aget_or_404(
+        Wish.objects.select_related('user')
+        .alias(owner_username=Lower('user__username'))
+        .filter(pk=pk, owner_username=username.lower())
+    )
+    user = await request.auser()
+    is_owner = user.is_authenticated and user.pk == wish.user_id
+    if wish.private and not is_owner:
+        raise Http404("No Wish matches the given query.")
 
-    return render(
+    return await _arender(
         request,
         "wishes/public_wish_detail.html",
         {
             "wish": wish,
-            "owner": owner,
+            "wishes": [wish],
+            "owner": wish.user,
             "is_owner": is_owner,
         },
     )
+
+
+@staff_member_required
+def instrumentation_metrics(request):
+    """
+    Per-URL-name request timings, query counts and latency histograms
+    collected by InstrumentationMiddleware in this process, as JSON.
+    POST clears them.
+    """
+    if request.method == 'POST':
+        instrumentation.stats.reset()
+        logger.info(f"Instrumentation metrics reset by {request.user.username}.")
+    return JsonResponse({
+        'enabled': getattr(settings, 'WISHES_INSTRUMENTATION', False),
+        'views': instrumentation.stats.snapshot(),
+    })